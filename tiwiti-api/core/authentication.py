@@ -0,0 +1,80 @@
+"""Token authentication backed by the cache, so authenticated requests skip the token query"""
+import hashlib
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+from tiwiti_api.caches import is_process_local
+from tiwiti_api.routers import set_user
+
+
+# What a cached lookup keeps of the user, enough for the permission checks.
+# The rest (password hash included) is left deferred and read on access.
+CACHED_USER_FIELDS = ("id", "is_active", "is_staff", "is_superuser")
+
+
+def get_cache():
+    return caches[getattr(settings, "AUTH_TOKEN_CACHE_ALIAS", "default")]
+
+
+def cache_timeout(cache):
+    """
+    AUTH_TOKEN_CACHE_TIMEOUT on a shared cache. Evictions can't reach the
+    other workers' copies in a per-process one, so those only live for
+    AUTH_TOKEN_LOCAL_CACHE_TIMEOUT.
+    """
+    timeout = getattr(settings, "AUTH_TOKEN_CACHE_TIMEOUT", 60)
+    if is_process_local(cache):
+        return min(timeout, getattr(settings, "AUTH_TOKEN_LOCAL_CACHE_TIMEOUT", 5))
+    return timeout
+
+
+def _cache_key(key):
+    # Token keys are credentials, keep them out of the (possibly shared) cache
+    return "auth-token:" + hashlib.sha256(key.encode()).hexdigest()
+
+
+def invalidate_token(key):
+    get_cache().delete(_cache_key(key))
+
+
+def invalidate_user_tokens(user):
+    """Drop the cached lookups of every token the user has"""
+    model = CachedTokenAuthentication().get_model()
+    keys = model.objects.filter(user=user).values_list("key", flat=True)
+    get_cache().delete_many([_cache_key(key) for key in keys])
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Drop-in replacement for TokenAuthentication that keeps token -> user
+    lookups in the cache (see cache_timeout()). Entries are dropped when
+    the token is deleted or its user is saved (password change,
+    deactivation, ...). Queryset update()s skip save(), call
+    invalidate_user_tokens() after them or the entries live until they
+    expire. An entry only holds CACHED_USER_FIELDS, never the token or
+    the password.
+    """
+
+    def authenticate_credentials(self, key):
+        cache = get_cache()
+        cache_key = _cache_key(key)
+        cached = cache.get(cache_key)
+        if cached is None:
+            # Inactive users and unknown tokens raise here and are never cached
+            user, token = super().authenticate_credentials(key)
+            cached = {field: getattr(user, field) for field in CACHED_USER_FIELDS}
+            cache.set(cache_key, cached, cache_timeout(cache))
+        else:
+            if not cached["is_active"]:
+                raise exceptions.AuthenticationFailed(_("User inactive or deleted."))
+            user = get_user_model().from_db(DEFAULT_DB_ALIAS, list(cached), list(cached.values()))
+            token = self.get_model().from_db(DEFAULT_DB_ALIAS, ["key", "user_id"], [key, user.pk])
+            token.user = user
+        set_user(user.pk)
+        return user, token
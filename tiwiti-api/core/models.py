@@ -1,6 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
 from django.conf import settings
+from .authentication import invalidate_user_tokens
 
 
 """The models for my fund management system"""
@@ -11,6 +12,16 @@ class CustomUser(AbstractUser):
 
     def __str__(self):
         return self.username
+
+    def save(self, *args, **kwargs):
+        """
+        Drop cached token lookups whenever the user changes (password,
+        deactivation, permissions), recording a login doesn't count
+        """
+        adding = self._state.adding
+        super().save(*args, **kwargs)
+        if not adding and set(kwargs.get("update_fields") or ()) != {"last_login"}:
+            invalidate_user_tokens(self)
     
     
 
@@ -0,0 +1,109 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache, caches
+from django.core.cache.backends.filebased import FileBasedCache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+from rest_framework import status
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from django.test import SimpleTestCase, override_settings
+from transactions.models import Balance
+from .authentication import _cache_key, cache_timeout
+
+User = get_user_model()
+
+class CachedTokenAuthenticationTestCase(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="authuser", password="testpassword")
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+        self.profile_url = reverse("profile")
+
+    def test_cached_token_saves_the_auth_query(self):
+        """
+        The first request looks the token up, later ones authenticate from the
+        cache. The profile itself is still read from the database, so both
+        requests run one query and only the token SELECT tells them apart.
+        """
+        with CaptureQueriesContext(connection) as cold:
+            response = self.client.get(self.profile_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(any("authtoken_token" in q["sql"] for q in cold))
+
+        with CaptureQueriesContext(connection) as warm:
+            response = self.client.get(self.profile_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(warm), len(cold))
+        self.assertEqual([q["sql"] for q in warm if "authtoken_token" in q["sql"]], [])
+        self.assertEqual(response.data["username"], "authuser")
+
+    def test_cached_token_drops_a_query_from_the_balance(self):
+        """A past balance is never cached, the token lookup is the only query saved"""
+        Balance.objects.create(user=self.user)
+        url = reverse("balance")
+        with self.assertNumQueries(2):
+            response = self.client.get(url, {"as_of": "2030-01-01T00:00:00Z"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        with self.assertNumQueries(1):
+            response = self.client.get(url, {"as_of": "2030-01-01T00:00:00Z"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_cache_holds_no_credentials(self):
+        self.client.get(self.profile_url)
+        cached = cache.get(_cache_key(self.token.key))
+        self.assertEqual(cached, {"id": self.user.pk, "is_active": True, "is_staff": False, "is_superuser": False})
+        self.assertNotIn(self.token.key, repr(cached))
+        self.assertNotIn(self.user.password, repr(cached))
+
+    def test_profile_update_from_a_cached_user(self):
+        self.client.get(self.profile_url)
+        response = self.client.patch(self.profile_url, {"email": "auth@example.com"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.email, "auth@example.com")
+        self.assertTrue(self.user.check_password("testpassword"))
+
+    def test_invalid_token_is_rejected(self):
+        self.client.credentials(HTTP_AUTHORIZATION="Token not-a-real-token")
+        response = self.client.get(self.profile_url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deleted_token_stops_working(self):
+        self.client.get(self.profile_url)
+        self.token.delete()
+
+        response = self.client.get(self.profile_url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivated_user_stops_working(self):
+        self.client.get(self.profile_url)
+        self.user.is_active = False
+        self.user.save()
+
+        response = self.client.get(self.profile_url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_password_change_drops_the_cached_lookup(self):
+        self.client.get(self.profile_url)
+        self.user.set_password("newpassword")
+        self.user.save()
+
+        # Token still valid, but the user is read again from the database
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(self.profile_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(captured), 1)
+        self.assertIn("authtoken_token", captured[0]["sql"])
+
+
+class TokenCacheTimeoutTestCase(SimpleTestCase):
+
+    @override_settings(AUTH_TOKEN_CACHE_TIMEOUT=60, AUTH_TOKEN_LOCAL_CACHE_TIMEOUT=5)
+    def test_per_process_cache_keeps_lookups_briefly(self):
+        """A revocation only evicts this worker's copy of a per-process cache"""
+        self.assertEqual(cache_timeout(caches["default"]), 5)
+        self.assertEqual(cache_timeout(FileBasedCache("/tmp/tiwiti-token-cache", {})), 60)
@@ -48,4 +48,7 @@ class UserProfileView(generics.RetrieveUpdateAPIView):
     serializer_class = UserSerializer
 
     def get_object(self):
+        # A user authenticated from the token cache only has the permission fields loaded
+        if self.request.user.get_deferred_fields():
+            return self.get_queryset().get(pk=self.request.user.pk)
         return self.request.user
@@ -0,0 +1,35 @@
+"""
+The default cache. Cached balances, ledger versions (ETags), token lookups
+and replica pins live there and are invalidated by whichever process
+wrote, so every worker has to share it: CACHE_URL (a redis:// URL) is
+required unless DEBUG is on. Local development and the tests run on an
+in-process LocMemCache.
+"""
+import os
+
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+
+LOCAL_CACHE = {
+    "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    "LOCATION": "tiwiti",
+    "OPTIONS": {"MAX_ENTRIES": 10000},
+}
+
+
+def default_cache(debug, env=os.environ):
+    """The `default` CACHES entry, refuses a per-process cache outside DEBUG"""
+    if env.get("CACHE_URL"):
+        return {"BACKEND": "django.core.cache.backends.redis.RedisCache", "LOCATION": env["CACHE_URL"]}
+    if not debug:
+        raise ImproperlyConfigured(
+            "Set CACHE_URL to a shared cache, with a per-process one the other "
+            "workers keep serving balances and tokens invalidated by a write"
+        )
+    return LOCAL_CACHE
+
+
+def is_process_local(cache):
+    """True when deleting an entry here leaves the other workers' copies in place"""
+    return isinstance(cache, (LocMemCache, DummyCache))
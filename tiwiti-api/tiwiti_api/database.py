@@ -0,0 +1,81 @@
+"""
+Database profiles, picked with DATABASE_PROFILE:
+
+  sqlite           (default) WAL journal, busy timeout, relaxed fsync, a larger
+                   page cache and persistent connections, writers take the
+                   lock at BEGIN
+  sqlite-plain     SQLite with Django's defaults, what this project used to run
+  postgres         persistent connections (CONN_MAX_AGE) with health checks
+  postgres-pooled  psycopg 3 connection pool (needs psycopg[pool])
+
+SQLite reads SQLITE_PATH, Postgres POSTGRES_DB/USER/PASSWORD/HOST/PORT, both
+DATABASE_CONN_MAX_AGE (seconds a connection is kept, 0 closes it per request).
+"""
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+
+# Applied on every new SQLite connection. WAL lets readers run next to the
+# writer, NORMAL only fsyncs at checkpoints (still safe from corruption),
+# cache_size is in KiB when negative.
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 20000,
+    "cache_size": -64000,
+    "temp_store": "MEMORY",
+    "foreign_keys": "ON",
+}
+
+
+def sqlite(name, tuned=True, conn_max_age=60):
+    config = {"ENGINE": "django.db.backends.sqlite3", "NAME": name}
+    if tuned:
+        # Connections are kept between requests, the pragmas run once per connection
+        config["CONN_MAX_AGE"] = conn_max_age
+        config["CONN_HEALTH_CHECKS"] = True
+        config["OPTIONS"] = {
+            "init_command": ";".join(f"PRAGMA {pragma}={value}" for pragma, value in SQLITE_PRAGMAS.items()),
+            # BEGIN IMMEDIATE, a write transaction can't fail half way upgrading its read lock
+            "transaction_mode": "IMMEDIATE",
+            "timeout": SQLITE_PRAGMAS["busy_timeout"] / 1000,
+        }
+    return config
+
+
+def postgres(env, pooled=False):
+    config = {
+        "ENGINE": "django.db.backends.postgresql",
+        "NAME": env.get("POSTGRES_DB", "tiwiti"),
+        "USER": env.get("POSTGRES_USER", "tiwiti"),
+        "PASSWORD": env.get("POSTGRES_PASSWORD", ""),
+        "HOST": env.get("POSTGRES_HOST", "localhost"),
+        "PORT": env.get("POSTGRES_PORT", "5432"),
+        "CONN_MAX_AGE": int(env.get("DATABASE_CONN_MAX_AGE", 60)),
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": {},
+    }
+    if pooled:
+        # The pool keeps the connections, Django refuses persistent ones on top of it
+        config["CONN_MAX_AGE"] = 0
+        config["OPTIONS"]["pool"] = {
+            "min_size": int(env.get("DATABASE_POOL_MIN", 4)),
+            "max_size": int(env.get("DATABASE_POOL_MAX", 32)),
+            "timeout": float(env.get("DATABASE_POOL_TIMEOUT", 10)),
+        }
+    return config
+
+
+def database_profile(base_dir, env=os.environ):
+    """The `default` DATABASES entry for the DATABASE_PROFILE in env"""
+    profile = env.get("DATABASE_PROFILE", "sqlite")
+    sqlite_path = env.get("SQLITE_PATH", base_dir / "db.sqlite3")
+    if profile == "sqlite":
+        return sqlite(sqlite_path, conn_max_age=int(env.get("DATABASE_CONN_MAX_AGE", 60)))
+    if profile == "sqlite-plain":
+        return sqlite(sqlite_path, tuned=False)
+    if profile == "postgres":
+        return postgres(env)
+    if profile == "postgres-pooled":
+        return postgres(env, pooled=True)
+    raise ImproperlyConfigured(f"Unknown DATABASE_PROFILE {profile!r}")
@@ -0,0 +1,365 @@
+"""
+Counters, gauges and fixed-bucket histograms, exposed in the Prometheus
+text format to admins at admin/metrics/.
+
+Values live in this process. With METRICS_DIR set every process writes
+its own values into an mmap'd file there (one writer per file, no
+locking between processes) and the exposition adds up the files of every
+process. Counters and histograms keep the counts of processes that have
+exited, gauges only report live processes. Empty METRICS_DIR on deploy.
+"""
+import json
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+from django.http import HttpResponse
+from rest_framework import permissions
+from rest_framework.views import APIView
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Seconds, for request latencies
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+REGISTRY = {}
+
+
+class LocalStore:
+    """Values of this process only"""
+
+    def __init__(self):
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, key, amount):
+        with self.lock:
+            self.values[key] = self.values.get(key, 0.0) + amount
+
+    def set(self, key, value):
+        with self.lock:
+            self.values[key] = value
+
+    def get(self, key):
+        return self.values.get(key, 0.0)
+
+    def collect(self):
+        with self.lock:
+            return [(os.getpid(), dict(self.values))]
+
+
+class FileStore:
+    """
+    Values of this process in METRICS_DIR/metrics_<pid>.db. The file is an
+    8 byte used length followed by entries of [key length (4 bytes), key
+    padded to 8 bytes, value (double)]. An entry is written before the
+    used length covers it, so readers never see half of one.
+    """
+    INITIAL_SIZE = 64 * 1024
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.lock = threading.Lock()
+        self.open()
+
+    def open(self):
+        self.path = os.path.join(self.directory, f"metrics_{os.getpid()}.db")
+        self.file = open(self.path, "a+b")
+        if os.fstat(self.file.fileno()).st_size == 0:
+            self.file.truncate(self.INITIAL_SIZE)
+        self.map = mmap.mmap(self.file.fileno(), 0)
+        self.offsets = {}
+        self.used = struct.unpack_from("q", self.map, 0)[0] or 8
+        for key, offset in _entries(self.map, self.used):
+            self.offsets[key] = offset
+
+    def _offset(self, key):
+        offset = self.offsets.get(key)
+        if offset is None:
+            encoded = key.encode()
+            entry = struct.pack("i", len(encoded)) + encoded
+            entry += b" " * (-len(entry) % 8)
+            if self.used + len(entry) + 8 > len(self.map):
+                self.map.close()
+                self.file.truncate(max(2 * os.fstat(self.file.fileno()).st_size, self.used + len(entry) + 8))
+                self.map = mmap.mmap(self.file.fileno(), 0)
+            self.map[self.used:self.used + len(entry) + 8] = entry + struct.pack("d", 0.0)
+            offset = self.used + len(entry)
+            self.used += len(entry) + 8
+            struct.pack_into("q", self.map, 0, self.used)
+            self.offsets[key] = offset
+        return offset
+
+    def inc(self, key, amount):
+        with self.lock:
+            offset = self._offset(key)
+            struct.pack_into("d", self.map, offset, struct.unpack_from("d", self.map, offset)[0] + amount)
+
+    def set(self, key, value):
+        with self.lock:
+            struct.pack_into("d", self.map, self._offset(key), value)
+
+    def get(self, key):
+        with self.lock:
+            offset = self.offsets.get(key)
+            return 0.0 if offset is None else struct.unpack_from("d", self.map, offset)[0]
+
+    def collect(self):
+        processes = []
+        for name in os.listdir(self.directory):
+            if not (name.startswith("metrics_") and name.endswith(".db")):
+                continue
+            with open(os.path.join(self.directory, name), "rb") as f:
+                data = f.read()
+            if len(data) < 8:
+                continue
+            used = min(struct.unpack_from("q", data, 0)[0], len(data))
+            values = {key: struct.unpack_from("d", data, offset)[0] for key, offset in _entries(data, used)}
+            processes.append((int(name[len("metrics_"):-len(".db")]), values))
+        return processes
+
+
+def _entries(data, used):
+    """(key, value offset) of the entries in a store file"""
+    position = 8
+    while position < used:
+        length = struct.unpack_from("i", data, position)[0]
+        key = bytes(data[position + 4:position + 4 + length]).decode()
+        position += 4 + length + (-(4 + length) % 8)
+        yield key, position
+        position += 8
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                directory = getattr(settings, "METRICS_DIR", None)
+                _store = FileStore(directory) if directory else LocalStore()
+    return _store
+
+
+def _reset_after_fork():
+    # A forked worker writes its own file, starting from zero
+    global _store
+    if isinstance(_store, FileStore):
+        _store = FileStore(_store.directory)
+    elif _store is not None:
+        _store = LocalStore()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, documentation, labels=()):
+        if name in REGISTRY:
+            raise ValueError(f"Metric {name} is already registered")
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._keys = {}
+        REGISTRY[name] = self
+
+    def _key(self, labels, suffix="", extra=()):
+        cache_key = (suffix, extra, *(labels.get(name) for name in self.label_names))
+        key = self._keys.get(cache_key)
+        if key is None:
+            if set(labels) != set(self.label_names):
+                raise ValueError(f"{self.name} takes the labels {', '.join(self.label_names) or 'none'}")
+            pairs = [[name, str(labels[name])] for name in self.label_names] + [list(pair) for pair in extra]
+            key = self._keys[cache_key] = json.dumps([self.name + suffix, pairs])
+        return key
+
+    def value(self, **labels):
+        """This process's value, for tests and debugging"""
+        return get_store().get(self._key(labels, self._value_suffix))
+
+    _value_suffix = ""
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        if amount < 0:
+            raise ValueError("Counters only go up")
+        get_store().inc(self._key(labels), amount)
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def set(self, value, **labels):
+        get_store().set(self._key(labels), value)
+
+    def inc(self, amount=1, **labels):
+        get_store().inc(self._key(labels), amount)
+
+    def dec(self, amount=1, **labels):
+        get_store().inc(self._key(labels), -amount)
+
+
+class Histogram(Metric):
+    type = "histogram"
+    _value_suffix = "_count"
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        store = get_store()
+        bound = self.buckets[bisect_left(self.buckets, value)]
+        store.inc(self._key(labels, "_bucket", (("le", _format(bound)),)), 1)
+        store.inc(self._key(labels, "_sum"), value)
+        store.inc(self._key(labels, "_count"), 1)
+
+    def time(self, **labels):
+        return _Timer(self, labels)
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+
+
+def _format(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value))
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(pairs):
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def collect():
+    """{(sample name, label pairs): value} added up over the processes"""
+    samples = {}
+    for pid, values in get_store().collect():
+        live = None
+        for key, value in values.items():
+            name, pairs = json.loads(key)
+            metric = REGISTRY.get(_base_name(name))
+            if metric is None:
+                continue
+            if metric.type == "gauge":
+                live = _alive(pid) if live is None else live
+                if not live:
+                    continue
+            sample = (name, tuple(tuple(pair) for pair in pairs))
+            samples[sample] = samples.get(sample, 0.0) + value
+    return samples
+
+
+def _base_name(name):
+    for suffix in ("_bucket", "_sum", "_count"):
+        if name.endswith(suffix) and name[:-len(suffix)] in REGISTRY:
+            return name[:-len(suffix)]
+    return name
+
+
+def render():
+    """Every registered metric in the Prometheus text exposition format"""
+    samples = collect()
+    by_metric = {}
+    for (name, pairs), value in samples.items():
+        by_metric.setdefault(_base_name(name), []).append((name, pairs, value))
+
+    lines = []
+    for name, metric in sorted(REGISTRY.items()):
+        lines.append(f"# HELP {name} {_escape(metric.documentation)}")
+        lines.append(f"# TYPE {name} {metric.type}")
+        entries = by_metric.get(name, [])
+        if metric.type != "histogram":
+            for sample, pairs, value in sorted(entries):
+                lines.append(f"{sample}{_labels(pairs)} {_format(value)}")
+            continue
+
+        series = {}
+        for sample, pairs, value in entries:
+            labels = tuple(pair for pair in pairs if pair[0] != "le")
+            series.setdefault(labels, {"buckets": {}, "_sum": 0.0, "_count": 0.0})
+            if sample.endswith("_bucket"):
+                series[labels]["buckets"][dict(pairs)["le"]] = value
+            else:
+                series[labels][sample[len(name):]] = value
+        for labels, values in sorted(series.items()):
+            cumulative = 0.0
+            for bound in metric.buckets:
+                cumulative += values["buckets"].get(_format(bound), 0.0)
+                lines.append(f"{name}_bucket{_labels(labels + (('le', _format(bound)),))} {_format(cumulative)}")
+            lines.append(f"{name}_sum{_labels(labels)} {_format(values['_sum'])}")
+            lines.append(f"{name}_count{_labels(labels)} {_format(values['_count'])}")
+    return "\n".join(lines) + "\n"
+
+
+REQUEST_DURATION = Histogram(
+    "tiwiti_http_request_duration_seconds", "Time spent in each API view", labels=("view", "method", "status")
+)
+
+
+class MetricsMiddleware:
+    """Times every DRF view into tiwiti_http_request_duration_seconds"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        response = self.get_response(request)
+        view = getattr(request, "_metrics_view", None)
+        if view is not None:
+            REQUEST_DURATION.observe(
+                time.perf_counter() - started, view=view, method=request.method, status=response.status_code
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # DRF's as_view() keeps the view class on the function
+        view_class = getattr(view_func, "cls", None)
+        if view_class is not None:
+            request._metrics_view = view_class.__name__
+
+
+class MetricsAPIView(APIView):
+    """Prometheus scrape target, admins only"""
+    permission_classes = [permissions.IsAdminUser, permissions.IsAuthenticated]
+
+    def get(self, request):
+        return HttpResponse(render(), content_type=CONTENT_TYPE)
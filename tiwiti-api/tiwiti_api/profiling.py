@@ -0,0 +1,142 @@
+"""
+Per-request SQL profiling, on with SQL_PROFILING=1.
+
+SQLProfilingMiddleware counts the queries of every request, their total
+time and the statements run more than once (same SQL, any parameters,
+the usual sign of an N+1). The numbers go out as X-DB-* response headers
+and into a rolling in-memory report of the last SQL_PROFILING_HISTORY
+requests, served to admins by SQLProfileAPIView.
+"""
+import re
+import threading
+import time
+from collections import Counter, defaultdict, deque
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.urls import Resolver404, resolve
+from rest_framework import permissions
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+# "IN (%s, %s, %s)" and "VALUES (%s, %s), (%s, %s)" differ by batch size only
+_PLACEHOLDERS = re.compile(r"\((?:\s*%s\s*,?)+\)(?:\s*,\s*\((?:\s*%s\s*,?)+\))*")
+_WHITESPACE = re.compile(r"\s+")
+
+_lock = threading.Lock()
+_history = deque(maxlen=getattr(settings, "SQL_PROFILING_HISTORY", 500))
+
+
+def fingerprint(sql):
+    """The statement with its parameter lists collapsed"""
+    return _WHITESPACE.sub(" ", _PLACEHOLDERS.sub("(...)", sql)).strip()
+
+
+class QueryRecorder:
+    """execute_wrapper collecting (fingerprint, milliseconds) of every query on every connection"""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((fingerprint(sql), (time.perf_counter() - started) * 1000))
+
+    def __enter__(self):
+        self.wrapped = [connection.execute_wrapper(self) for connection in connections.all()]
+        for wrapper in self.wrapped:
+            wrapper.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        for wrapper in reversed(self.wrapped):
+            wrapper.__exit__(*exc_info)
+
+    @property
+    def time(self):
+        return sum(ms for _, ms in self.queries)
+
+    def duplicates(self):
+        """{fingerprint: times run} of the statements run more than once"""
+        return {sql: count for sql, count in Counter(sql for sql, _ in self.queries).items() if count > 1}
+
+
+def url_name(request):
+    try:
+        return resolve(request.path_info).url_name or request.path_info
+    except Resolver404:
+        return request.path_info
+
+
+class SQLProfilingMiddleware:
+
+    def __init__(self, get_response):
+        if not getattr(settings, "SQL_PROFILING", False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with QueryRecorder() as recorder:
+            response = self.get_response(request)
+
+        duplicates = recorder.duplicates()
+        response["X-DB-Queries"] = str(len(recorder.queries))
+        response["X-DB-Time-Ms"] = f"{recorder.time:.2f}"
+        response["X-DB-Duplicate-Queries"] = str(sum(count - 1 for count in duplicates.values()))
+        with _lock:
+            _history.append({
+                "url_name": url_name(request),
+                "method": request.method,
+                "status": response.status_code,
+                "queries": len(recorder.queries),
+                "db_ms": recorder.time,
+                "duplicates": duplicates,
+            })
+        return response
+
+
+def report():
+    """Per URL name and method: requests, queries and DB time (avg and max), the most repeated statements"""
+    with _lock:
+        entries = list(_history)
+    grouped = defaultdict(list)
+    for entry in entries:
+        grouped[(entry["url_name"], entry["method"])].append(entry)
+
+    endpoints = []
+    for (name, method), group in sorted(grouped.items()):
+        repeated = Counter()
+        for entry in group:
+            repeated.update(entry["duplicates"])
+        endpoints.append({
+            "url_name": name,
+            "method": method,
+            "requests": len(group),
+            "avg_queries": round(sum(entry["queries"] for entry in group) / len(group), 2),
+            "max_queries": max(entry["queries"] for entry in group),
+            "avg_db_ms": round(sum(entry["db_ms"] for entry in group) / len(group), 3),
+            "max_db_ms": round(max(entry["db_ms"] for entry in group), 3),
+            "duplicates": [{"sql": sql, "count": count} for sql, count in repeated.most_common(10)],
+        })
+    return {"requests": len(entries), "endpoints": endpoints}
+
+
+def clear():
+    with _lock:
+        _history.clear()
+
+
+class SQLProfileAPIView(APIView):
+    """Admin view of the SQL profile of the recent requests, DELETE starts over"""
+    permission_classes = [permissions.IsAdminUser, permissions.IsAuthenticated]
+
+    def get(self, request):
+        return Response({"enabled": getattr(settings, "SQL_PROFILING", False), **report()})
+
+    def delete(self, request):
+        clear()
+        return Response(status=204)
@@ -0,0 +1,74 @@
+"""
+Response renderers. ORJSONRenderer writes the same bytes as DRF's
+JSONRenderer through orjson for serializer output, MessagePackRenderer answers
+`Accept: application/msgpack` (service-to-service callers, needs msgpack).
+Both write Decimals as exact fixed-point strings, never floats: serializer
+output already holds them as strings, a raw Decimal in the response data is
+where they part ways with DRF's encoder, which writes a float.
+"""
+import decimal
+
+from rest_framework import renderers
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+_encoder = encoders.JSONEncoder()
+
+
+def encode_default(obj):
+    """
+    Types neither orjson nor msgpack know, the way DRF's encoder writes them
+    except Decimals, which stay exact strings where DRF writes a float
+    """
+    if isinstance(obj, decimal.Decimal):
+        return f"{obj:f}"
+    return _encoder.default(obj)
+
+
+class ORJSONRenderer(renderers.JSONRenderer):
+    """
+    JSONRenderer on orjson. Pretty printing (?indent=, the browsable API)
+    and anything orjson refuses, such as ints over 64 bits, go through
+    DRF's encoder as before. NaN and infinities come out as null where
+    DRF's strict encoder raised.
+    """
+    # Datetimes, dates and times are handed to encode_default so they come out exactly as DRF writes them
+    options = 0 if orjson is None else orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        if (
+            orjson is None or self.ensure_ascii or not self.compact
+            or self.get_indent(accepted_media_type, renderer_context or {}) is not None
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=encode_default, option=self.options)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        # Escaped like DRF does, so the output stays a strict javascript subset
+        if b"\xe2\x80\xa8" in ret or b"\xe2\x80\xa9" in ret:
+            ret = ret.replace(b"\xe2\x80\xa8", b"\\u2028").replace(b"\xe2\x80\xa9", b"\\u2029")
+        return ret
+
+
+class MessagePackRenderer(renderers.BaseRenderer):
+    media_type = "application/msgpack"
+    format = "msgpack"
+    charset = None
+    render_style = "binary"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        return msgpack.packb(data, default=encode_default, use_bin_type=True, datetime=False)
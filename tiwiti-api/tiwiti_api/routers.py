@@ -0,0 +1,130 @@
+"""
+Read replica routing with read-your-writes.
+
+Writes, and every read inside a transaction, go to the primary ("default").
+Other reads go to one of settings.DATABASE_REPLICAS. A request that isn't
+a safe method reads from the primary throughout, and once it has written,
+its user keeps reading from the primary for REPLICA_PIN_SECONDS so they
+see their own deposit even while the replicas lag behind.
+"""
+import contextvars
+import random
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# Read right after being written by another request (login hands out a token), kept off the replicas
+PRIMARY_MODELS = {"authtoken.token"}
+
+
+@dataclass
+class _State:
+    primary: bool = False
+    wrote: bool = False
+    user_id: int = None
+
+
+_state = contextvars.ContextVar("db_routing", default=None)
+
+
+def replicas():
+    return getattr(settings, "DATABASE_REPLICAS", [])
+
+
+def _pin_key(user_id):
+    return f"db-pin:{user_id}"
+
+
+def pin_user(user_id):
+    """Send the user's reads to the primary for the next REPLICA_PIN_SECONDS"""
+    caches["default"].set(_pin_key(user_id), True, getattr(settings, "REPLICA_PIN_SECONDS", 5))
+
+
+def is_pinned(user_id):
+    return bool(caches["default"].get(_pin_key(user_id)))
+
+
+def set_user(user_id):
+    """Called once the request's user is known, a recent writer's reads stay on the primary"""
+    state = _state.get()
+    if state is None or not replicas():
+        return
+    state.user_id = user_id
+    if not state.primary and is_pinned(user_id):
+        state.primary = True
+
+
+@contextmanager
+def use_primary():
+    """Send every read inside the block to the primary"""
+    state = _state.get()
+    if state is None:
+        token = _state.set(_State(primary=True))
+        try:
+            yield
+        finally:
+            _state.reset(token)
+        return
+    # Inside a request, keep its state so a write in the block still pins the user
+    primary, state.primary = state.primary, True
+    try:
+        yield
+    finally:
+        state.primary = primary
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        if not replicas():
+            return DEFAULT_DB_ALIAS
+        state = _state.get()
+        if (state is not None and state.primary) or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        if model._meta.label_lower in PRIMARY_MODELS:
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas())
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get the schema from the primary
+        if db in replicas():
+            return False
+        return None
+
+
+class ReadYourWritesMiddleware:
+    """Tracks each request's routing state and pins users who wrote to the primary"""
+
+    SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        state = _State(primary=request.method not in self.SAFE_METHODS)
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        if state.wrote and replicas():
+            user = getattr(request, "user", None)
+            user_id = state.user_id or (user.pk if user is not None and user.is_authenticated else None)
+            if user_id is not None:
+                pin_user(user_id)
+        return response
@@ -10,8 +10,13 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import importlib.util
+import os
 from pathlib import Path
 
+from .caches import default_cache
+from .database import database_profile, sqlite
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -47,10 +52,13 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'tiwiti_api.metrics.MetricsMiddleware',
+    'tiwiti_api.profiling.SQLProfilingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'tiwiti_api.routers.ReadYourWritesMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -79,13 +87,53 @@ WSGI_APPLICATION = 'tiwiti_api.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
+# DATABASE_PROFILE picks SQLite (WAL tuned, or plain) or Postgres (persistent
+# or pooled connections), see tiwiti_api/database.py for the variables each reads
+
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': database_profile(BASE_DIR),
+}
+
+
+# Read replicas: reads outside a transaction go to one of DATABASE_REPLICAS,
+# writes and a user's reads for REPLICA_PIN_SECONDS after they wrote go to
+# "default". REPLICA_SQLITE_PATH points a local second SQLite file at it,
+# refreshed from db.sqlite3 with `python manage.py sync_replica`.
+if os.environ.get('REPLICA_SQLITE_PATH'):
+    DATABASES['replica'] = {**sqlite(os.environ['REPLICA_SQLITE_PATH']), 'TEST': {'MIRROR': 'default'}}
+
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['tiwiti_api.routers.ReplicaRouter']
+REPLICA_PIN_SECONDS = 5
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# Shared between the workers through CACHE_URL (redis://), in-process only
+# with DEBUG on, see tiwiti_api/caches.py
+
+CACHES = {
+    'default': default_cache(DEBUG),
 }
 
+# Per-user balance cache used by BalanceAPIView, entries expire after the timeout (seconds)
+BALANCE_CACHE_ALIAS = 'default'
+BALANCE_CACHE_TIMEOUT = 300
+
+# Token -> user lookups cached by core.authentication.CachedTokenAuthentication,
+# only for AUTH_TOKEN_LOCAL_CACHE_TIMEOUT seconds when the cache is per-process
+AUTH_TOKEN_CACHE_ALIAS = 'default'
+AUTH_TOKEN_CACHE_TIMEOUT = 60
+AUTH_TOKEN_LOCAL_CACHE_TIMEOUT = 5
+
+# Idempotency-Key handling on the money-moving endpoints (seconds): how long a key
+# and its response are kept, how often expired keys are evicted in the background,
+# how long a duplicate waits for the original request to finish and after how
+# long an unfinished request counts as abandoned and its key goes to a retry
+IDEMPOTENCY_KEY_TTL = 24 * 60 * 60
+IDEMPOTENCY_SWEEP_INTERVAL = 300
+IDEMPOTENCY_WAIT_TIMEOUT = 10
+IDEMPOTENCY_LOCK_TIMEOUT = 3 * IDEMPOTENCY_WAIT_TIMEOUT
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -129,14 +177,74 @@ STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 AUTH_USER_MODEL = "core.CustomUser"
 
+# Rows the admin TotalBalance is spread over, more shards means less write
+# contention on the totals and a slightly larger sum when reading them
+TOTAL_BALANCE_SHARDS = 16
+
 REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': "rest_framework.pagination.PageNumberPagination",
     'PAGE_SIZE': 10,
 
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.TokenAuthentication',
+        'core.authentication.CachedTokenAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
+
+    # JSON through orjson, byte for byte what DRF's JSONRenderer writes for serializer output
+    # (raw Decimals come out as exact strings, DRF would write floats)
+    'DEFAULT_RENDERER_CLASSES': [
+        'tiwiti_api.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'tiwiti_api.parsers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }
+
+# Internal services can speak MessagePack (Accept/Content-Type: application/msgpack)
+# once msgpack is installed
+if importlib.util.find_spec('msgpack'):
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'].append('tiwiti_api.renderers.MessagePackRenderer')
+    REST_FRAMEWORK['DEFAULT_PARSER_CLASSES'].append('tiwiti_api.parsers.MessagePackParser')
+
+# Where user balances live: "balance" updates Balance.amount in place on every
+# write, "journal" only appends to TransactionLog and reads a balance as the
+# latest BalanceSnapshot plus the entries after it. A snapshot is taken once
+# that tail reaches JOURNAL_SNAPSHOT_EVERY entries or the snapshot is older
+# than JOURNAL_SNAPSHOT_INTERVAL seconds. Run snapshot_balances when switching.
+LEDGER_MODE = os.environ.get('LEDGER_MODE', 'balance')
+JOURNAL_SNAPSHOT_EVERY = 100
+JOURNAL_SNAPSHOT_INTERVAL = 15 * 60
+
+# Deposits and withdrawals checkpoint a user's balance (a BalanceSnapshot) about
+# every BALANCE_CHECKPOINT_EVERY entries, balance ?as_of= queries only sum the
+# entries between two checkpoints. None turns the write path checkpoints off.
+BALANCE_CHECKPOINT_EVERY = 100
+
+# Write-behind transaction log: with TRANSACTION_LOG_OUTBOX=1 deposits and
+# withdrawals queue their log entry after commit and a background thread
+# writes them in batches (not with LEDGER_MODE=journal). Writers wait up to
+# PUT_TIMEOUT seconds on a full queue, then write their entry themselves.
+# Entries a crashed process never wrote are rebuilt from the last
+# RECOVERY_WINDOW seconds on startup, or all of them with recover_outbox.
+TRANSACTION_LOG_OUTBOX = os.environ.get('TRANSACTION_LOG_OUTBOX') == '1'
+TRANSACTION_LOG_OUTBOX_BATCH_SIZE = 500
+TRANSACTION_LOG_OUTBOX_FLUSH_INTERVAL = 0.05
+TRANSACTION_LOG_OUTBOX_QUEUE_SIZE = 10000
+TRANSACTION_LOG_OUTBOX_PUT_TIMEOUT = 1.0
+TRANSACTION_LOG_OUTBOX_RECOVERY_WINDOW = 60 * 60
+
+# Per-request SQL profiling (query count, DB time and repeated statements) in
+# X-DB-* response headers and the admin sql-profile report of the last
+# SQL_PROFILING_HISTORY requests. Off unless SQL_PROFILING=1.
+SQL_PROFILING = os.environ.get('SQL_PROFILING') == '1'
+SQL_PROFILING_HISTORY = 500
+
+# Prometheus metrics at admin/metrics/. Kept per process unless METRICS_DIR
+# names a directory the worker processes share (emptied on every deploy),
+# then each writes its own file there and a scrape adds them up.
+METRICS_DIR = os.environ.get('METRICS_DIR')
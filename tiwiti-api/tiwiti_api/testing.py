@@ -0,0 +1,33 @@
+"""Test helpers shared by the apps"""
+from contextlib import contextmanager
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.utils import CaptureQueriesContext
+
+from .profiling import fingerprint
+
+
+class QueryBudgetMixin:
+    """
+    Holds endpoints to a query budget. Test cases declare
+    query_budgets = {url name: max queries} and wrap the request:
+
+        with self.assertQueryBudget("deposit"):
+            self.client.post(reverse("deposit"), ...)
+
+    A failure lists the queries with the repeated ones marked.
+    """
+    query_budgets = {}
+
+    @contextmanager
+    def assertQueryBudget(self, url_name, using=DEFAULT_DB_ALIAS):
+        budget = self.query_budgets[url_name]
+        with CaptureQueriesContext(connections[using]) as captured:
+            yield captured
+        if len(captured) > budget:
+            fingerprints = [fingerprint(query["sql"]) for query in captured.captured_queries]
+            lines = [
+                f"{index}. {'[repeated] ' if fingerprints.count(sql) > 1 else ''}{query['sql']}"
+                for index, (sql, query) in enumerate(zip(fingerprints, captured.captured_queries), 1)
+            ]
+            self.fail(f"{url_name} ran {len(captured)} queries, its budget is {budget}:\n" + "\n".join(lines))
@@ -17,9 +17,14 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 
+from .metrics import MetricsAPIView
+from .profiling import SQLProfileAPIView
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/tiwitifunds/', include("core.urls")),
     path('api/tiwitifunds/', include("transactions.urls")),
+    path('api/tiwitifunds/admin/sql-profile/', SQLProfileAPIView.as_view(), name="sql-profile"),
+    path('api/tiwitifunds/admin/metrics/', MetricsAPIView.as_view(), name="metrics"),
     # path("tiwitifundsapi-auth/", include("rest_framework.urls"))
 ]
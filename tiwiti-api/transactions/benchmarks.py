@@ -0,0 +1,111 @@
+"""Helpers shared by the bench_* management commands"""
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import connections
+from django.test import RequestFactory
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+# Connection settings a database profile (tiwiti_api/database.py) may change, and Django's defaults
+PROFILE_DEFAULTS = {"OPTIONS": {}, "CONN_MAX_AGE": 0, "CONN_HEALTH_CHECKS": False}
+
+
+@contextmanager
+def benchmark_database(alias="default", verbosity=0, profile=None):
+    """
+    Run the body against a throwaway, fully migrated copy of the database
+    so benchmarks never touch real data. SQLite gets a file (not :memory:)
+    so that every worker thread sees the same database. The test environment
+    is set up as well, so the test client can be used to drive the API.
+    A profile (a DATABASES entry) replaces the connection settings.
+    """
+    connection = connections[alias]
+    settings_dict = connection.settings_dict
+    saved_test = dict(settings_dict.get("TEST", {}))
+    saved = {key: settings_dict[key] for key in PROFILE_DEFAULTS if key in settings_dict}
+    tmpdir = None
+
+    if profile is not None:
+        settings_dict.update({key: profile.get(key, default) for key, default in PROFILE_DEFAULTS.items()})
+    if connection.vendor == "sqlite":
+        tmpdir = tempfile.mkdtemp(prefix="tiwiti-bench-")
+        settings_dict["TEST"] = {**saved_test, "NAME": os.path.join(tmpdir, "bench.sqlite3")}
+        if profile is None:
+            # Writers queue on the database lock instead of failing straight away
+            settings_dict["OPTIONS"] = {"timeout": 60, "transaction_mode": "IMMEDIATE", **saved.get("OPTIONS", {})}
+
+    setup_test_environment(debug=False)
+    old_name = connection.creation.create_test_db(verbosity=verbosity, autoclobber=True, serialize=False)
+    try:
+        yield connection
+    finally:
+        connections.close_all()
+        connection.creation.destroy_test_db(old_name, verbosity=verbosity)
+        teardown_test_environment()
+        settings_dict["TEST"] = saved_test
+        settings_dict.update(saved)
+        if tmpdir:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+def run_concurrently(worker, count):
+    """
+    Start `count` threads running worker(index) at the same moment and
+    return (elapsed seconds, list of worker results)
+    """
+    barrier = threading.Barrier(count + 1)
+    results = [None] * count
+
+    def target(index):
+        barrier.wait()
+        try:
+            results[index] = worker(index)
+        finally:
+            connections.close_all()
+
+    threads = [threading.Thread(target=target, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+
+    barrier.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - started, results
+
+
+class WSGIClient:
+    """
+    Sends requests through the WSGI handler the way a server does. Unlike
+    the test client the request signals fire, so connections are closed or
+    kept between requests according to CONN_MAX_AGE.
+    """
+
+    def __init__(self, token=None, handler=None):
+        self.handler = handler or WSGIHandler()
+        self.factory = RequestFactory()
+        self.headers = {"HTTP_AUTHORIZATION": f"Token {token}"} if token else {}
+
+    def request(self, method, path, data=None):
+        """Return (status code, body)"""
+        if data is None:
+            request = self.factory.generic(method, path, **self.headers)
+        else:
+            request = self.factory.generic(method, path, json.dumps(data), "application/json", **self.headers)
+        statuses = []
+
+        def start_response(status, headers, exc_info=None):
+            statuses.append(int(status.split()[0]))
+
+        response = self.handler(request.environ, start_response)
+        try:
+            body = b"".join(response)
+        finally:
+            response.close()
+        return statuses[0], body
@@ -0,0 +1,214 @@
+"""Batched ingestion of deposit/withdrawal operations (settlement files)"""
+import csv
+import io
+import json
+from decimal import Decimal, InvalidOperation
+
+from django.contrib.auth import get_user_model
+from django.db import DatabaseError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import metrics
+from .cache import invalidate_balance
+from .models import (
+    Deposit,
+    Withdrawal,
+    Balance,
+    BalanceSnapshot,
+    TotalBalance,
+    TransactionLog,
+    UserStats,
+    balance_ledger,
+    journal_mode
+)
+
+User = get_user_model()
+
+OPERATION_TYPES = ("deposit", "withdrawal")
+DEFAULT_CHUNK_SIZE = 1000
+CENT = Decimal("0.01")
+
+
+def read_operations(stream, format):
+    """
+    Parse a settlement file into operation dicts.
+    `format` is "csv" (header: user,type,amount), "json" (a list) or "ndjson".
+    """
+    content = stream.read()
+    if isinstance(content, bytes):
+        content = content.decode("utf-8")
+    if format == "csv":
+        return list(csv.DictReader(io.StringIO(content)))
+    if format == "json":
+        return json.loads(content)
+    if format == "ndjson":
+        return [json.loads(line) for line in content.splitlines() if line.strip()]
+    raise ValueError(f"Unsupported format: {format}")
+
+
+def parse_operation(operation):
+    """Validate one operation, returns (user_id, type, amount) or raises ValueError"""
+    if not isinstance(operation, dict):
+        raise ValueError("Operation must be an object")
+
+    try:
+        user_id = int(operation.get("user"))
+    except (TypeError, ValueError):
+        raise ValueError("A valid user id is required")
+
+    kind = operation.get("type")
+    if kind not in OPERATION_TYPES:
+        raise ValueError(f"type must be one of {', '.join(OPERATION_TYPES)}")
+
+    try:
+        amount = Decimal(str(operation.get("amount")))
+    except InvalidOperation:
+        raise ValueError("A valid amount is required")
+    if not amount.is_finite() or amount <= 0:
+        raise ValueError("amount must be greater than zero")
+    if amount != amount.quantize(CENT):
+        raise ValueError("amount can't have more than 2 decimal places")
+
+    return user_id, kind, amount
+
+
+def ingest_operations(operations, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Apply operations in chunks, each chunk in its own transaction.
+    Returns one result dict per operation, in input order.
+    """
+    results = []
+    chunk = []
+    for index, operation in enumerate(operations):
+        chunk.append((index, operation))
+        if len(chunk) >= chunk_size:
+            results.extend(_ingest_chunk(chunk))
+            chunk = []
+    if chunk:
+        results.extend(_ingest_chunk(chunk))
+    return results
+
+
+def _failed(index, error):
+    return {"index": index, "status": "failed", "error": error}
+
+
+def _ingest_chunk(chunk):
+    results = {}
+    parsed = []
+    for index, operation in chunk:
+        try:
+            parsed.append((index, *parse_operation(operation)))
+        except ValueError as e:
+            results[index] = _failed(index, str(e))
+
+    try:
+        with transaction.atomic():
+            results.update(_apply_chunk(parsed))
+    except DatabaseError as e:
+        # The whole chunk was rolled back, none of its valid items went through
+        for index, *_ in parsed:
+            results[index] = _failed(index, f"Chunk rolled back: {e}")
+
+    return [results[index] for index, _ in chunk]
+
+
+def _apply_chunk(parsed):
+    """
+    Insert every row of the chunk with bulk_create, move each affected
+    balance with one aggregated UPDATE and the totals with one more
+    """
+    results = {}
+    user_ids = {user_id for _, user_id, _, _ in parsed}
+    known_users = set(User.objects.filter(pk__in=user_ids).values_list("pk", flat=True))
+
+    # Lock the balances we are about to move so the running checks below hold
+    opening = balance_ledger().balances(known_users)
+    running = dict(opening)
+
+    accepted = []
+    for index, user_id, kind, amount in parsed:
+        if user_id not in known_users:
+            results[index] = _failed(index, "User not found")
+            continue
+
+        if kind == "withdrawal":
+            available = running.get(user_id)
+            if available is None:
+                metrics.REJECTED_WITHDRAWALS.inc(reason="no_balance", source="bulk")
+                results[index] = _failed(index, "No Balance Record found for this user")
+                continue
+            if available < amount:
+                metrics.REJECTED_WITHDRAWALS.inc(reason="insufficient_balance", source="bulk")
+                results[index] = _failed(index, "Insufficient Balance")
+                continue
+            running[user_id] = available - amount
+        else:
+            running[user_id] = running.get(user_id, Decimal("0.00")) + amount
+
+        model = Deposit if kind == "deposit" else Withdrawal
+        accepted.append((index, kind, model(user_id=user_id, amount=amount)))
+
+    # bulk_create skips the per-row save() hooks, the balances are moved below instead
+    Deposit.objects.bulk_create([obj for _, kind, obj in accepted if kind == "deposit"])
+    Withdrawal.objects.bulk_create([obj for _, kind, obj in accepted if kind == "withdrawal"])
+    TransactionLog.objects.bulk_create([
+        TransactionLog(
+            type=kind,
+            user_id=obj.user_id,
+            amount=obj.amount,
+            deposit_transaction=obj if kind == "deposit" else None,
+            withdrawal_transaction=obj if kind == "withdrawal" else None,
+            status="successful",
+        )
+        for _, kind, obj in accepted
+    ])
+
+    # Every user with an accepted entry has a new history and stats, even where the
+    # balance nets out, so their ledger version (cache.py, etags.py) has to move
+    for user_id in {obj.user_id for _, _, obj in accepted}:
+        invalidate_balance(user_id)
+
+    # In journal mode the journal rows above are the balance change
+    if not journal_mode():
+        now = timezone.now()
+        for user_id, amount in running.items():
+            if user_id not in opening:
+                Balance.objects.credit(user_id, amount)
+            elif amount != opening[user_id]:
+                Balance.objects.filter(user_id=user_id).update(
+                    amount=F("amount") + (amount - opening[user_id]), updated_at=now
+                )
+
+    for kind in OPERATION_TYPES:
+        amounts = [obj.amount for _, accepted_kind, obj in accepted if accepted_kind == kind]
+        if amounts:
+            metrics.committed(kind, sum(amounts, Decimal("0.00")), count=len(amounts), source="bulk")
+    if accepted:
+        TotalBalance.apply_delta(
+            deposits=sum((obj.amount for _, kind, obj in accepted if kind == "deposit"), Decimal("0.00")),
+            withdrawals=sum((obj.amount for _, kind, obj in accepted if kind == "withdrawal"), Decimal("0.00")),
+        )
+
+    # One stats UPDATE per user for the whole chunk
+    stats = {}
+    for _, kind, obj in accepted:
+        row = stats.setdefault(obj.user_id, {
+            "deposits": Decimal("0.00"), "withdrawals": Decimal("0.00"), "count": 0,
+            "largest": Decimal("0.00"), "at": obj.created_at, "last": obj.created_at,
+        })
+        row["deposits" if kind == "deposit" else "withdrawals"] += obj.amount
+        row["count"] += 1
+        row["largest"] = max(row["largest"], obj.amount)
+        row["at"], row["last"] = min(row["at"], obj.created_at), max(row["last"], obj.created_at)
+    for user_id, row in stats.items():
+        UserStats.objects.record(user_id, **row)
+
+    entries = {user_id: row["count"] for user_id, row in stats.items()}
+    for user_id, count in entries.items():
+        BalanceSnapshot.objects.maybe_checkpoint(user_id, entries=count)
+
+    for index, kind, obj in accepted:
+        results[index] = {"index": index, "status": "successful", "type": kind, "id": obj.pk}
+    return results
@@ -0,0 +1,85 @@
+"""
+Per-user balance cache on Django's cache framework.
+
+Every user has a ledger version number in the cache and cached balances
+are keyed by (user, version). A write bumps the version once it commits,
+so a reader can never pick up a balance cached before that write, even
+if it raced the write and stored an old value under the old version.
+The version changes with the user's transaction log too, and the admin
+totals have a version of their own (TOTALS), etags.py builds on both.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from tiwiti_api.routers import use_primary
+
+# Version counters outlive the cached balances, re-seeding one just drops that user's entries
+VERSION_TIMEOUT = 24 * 60 * 60
+# Version owner of the TotalBalance totals
+TOTALS = "totals"
+
+
+def get_cache():
+    return caches[getattr(settings, "BALANCE_CACHE_ALIAS", "default")]
+
+
+def _version_key(user_id):
+    return f"ledger-version:{user_id}"
+
+
+def ledger_version(user_id):
+    """
+    The user's (or TOTALS') current ledger version, changes after every
+    committed balance or transaction log write
+    """
+    cache = get_cache()
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        # Seeded from the clock so an evicted counter can't come back to a version used before
+        cache.add(key, time.time_ns(), timeout=VERSION_TIMEOUT)
+        version = cache.get(key)
+    return version
+
+
+def _bump_version(user_id):
+    cache = get_cache()
+    try:
+        cache.incr(_version_key(user_id))
+    except ValueError:
+        cache.set(_version_key(user_id), time.time_ns(), timeout=VERSION_TIMEOUT)
+
+
+def invalidate_balance(user_id):
+    """
+    Call wherever a balance changes. The version is bumped now and again
+    after commit, the second bump drops anything cached from the old row
+    while the write was still in flight.
+    """
+    _bump_version(user_id)
+    transaction.on_commit(lambda: _bump_version(user_id))
+
+
+def invalidate_totals():
+    """Call wherever the TotalBalance totals change"""
+    invalidate_balance(TOTALS)
+
+
+def cached_balance(user_id, load):
+    """Return the cached balance data of the user, calling load() on a miss"""
+    cache = get_cache()
+    version = ledger_version(user_id)
+    if version is None:
+        # Counter evicted straight away, don't cache under a version that can't be bumped
+        return load()
+    key = f"balance:{user_id}:{version}"
+    data = cache.get(key)
+    if data is None:
+        # A lagging replica would store a balance older than the version it is filed under
+        with use_primary():
+            data = load()
+        cache.set(key, data, getattr(settings, "BALANCE_CACHE_TIMEOUT", 300))
+    return data
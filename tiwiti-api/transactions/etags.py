@@ -0,0 +1,66 @@
+"""
+Strong ETags for the endpoints clients poll. An ETag is a hash of the
+cached ledger version (cache.py) and what picks the representation
+(view, query string, negotiated media type), so a matching If-None-Match
+gets its 304 from the cache alone: no query, no serializer.
+"""
+import hashlib
+from contextlib import nullcontext
+
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+from tiwiti_api.routers import use_primary
+
+from .cache import ledger_version
+
+
+def make_etag(*parts):
+    digest = hashlib.blake2b("\0".join(str(part) for part in parts).encode(), digest_size=16)
+    return f'"{digest.hexdigest()}"'
+
+
+def etag_matches(etag, if_none_match):
+    """If-None-Match uses the weak comparison, W/"x" matches "x" """
+    etags = parse_etags(if_none_match)
+    return "*" in etags or etag in (tag.removeprefix("W/") for tag in etags)
+
+
+class LedgerETagMixin:
+    """
+    ETag / If-None-Match on GET for views whose output only changes with a
+    ledger version. Views pick the version owner with etag_owner(), None
+    answers that request without an ETag.
+    """
+
+    def etag_owner(self, request):
+        return request.user.pk
+
+    def get_etag(self, request):
+        owner = self.etag_owner(request)
+        if owner is None:
+            return None
+        # Read before the response is built, a write racing it can only make the ETag older than the body
+        version = ledger_version(owner)
+        if version is None:
+            return None
+        return make_etag(type(self).__name__, owner, version, request.accepted_media_type, request.GET.urlencode())
+
+    def get(self, request, *args, **kwargs):
+        etag = self.get_etag(request)
+        if etag is not None and etag_matches(etag, request.headers.get("If-None-Match", "")):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            # The body goes out under the current version, a lagging replica would pair it with older data
+            with use_primary() if etag is not None else nullcontext():
+                response = super().get(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+        if etag is not None:
+            response["ETag"] = etag
+            # Per user data, always revalidated
+            patch_cache_control(response, private=True, no_cache=True)
+            patch_vary_headers(response, ("Accept", "Authorization"))
+        return response
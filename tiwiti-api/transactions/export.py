@@ -0,0 +1,94 @@
+"""Streaming CSV/NDJSON export of the transaction log"""
+import csv
+import io
+import json
+
+from rest_framework import renderers
+
+# Same fields as TransactionLogSerializer, plus the entry id
+EXPORT_COLUMNS = (
+    "id",
+    "type",
+    "user",
+    "amount",
+    "deposit_transaction",
+    "withdrawal_transaction",
+    "status",
+    "updated_at",
+)
+VALUE_FIELDS = (
+    "id",
+    "type",
+    "user_id",
+    "amount",
+    "deposit_transaction_id",
+    "withdrawal_transaction_id",
+    "status",
+    "updated_at",
+)
+CHUNK_SIZE = 2000
+
+
+def _timestamp(value):
+    # Formatted like DRF's DateTimeField
+    value = value.isoformat()
+    return value[:-6] + "Z" if value.endswith("+00:00") else value
+
+
+def _csv_chunks(rows, chunk_size):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for count, row in enumerate(rows, start=1):
+        writer.writerow((*row[:-1], _timestamp(row[-1])))
+        if count % chunk_size == 0:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode()
+
+
+def _ndjson_chunks(rows, chunk_size):
+    lines = []
+    for row in rows:
+        entry = dict(zip(EXPORT_COLUMNS, row))
+        entry["amount"] = str(entry["amount"])
+        entry["updated_at"] = _timestamp(entry["updated_at"])
+        lines.append(json.dumps(entry, separators=(",", ":")))
+        if len(lines) >= chunk_size:
+            yield ("\n".join(lines) + "\n").encode()
+            lines = []
+    if lines:
+        yield ("\n".join(lines) + "\n").encode()
+
+
+def export_chunks(queryset, format, chunk_size=CHUNK_SIZE):
+    """
+    Encode the log entries of queryset oldest first, chunk_size rows per
+    yielded bytes chunk. Rows come from a chunked server-side iterator over
+    values_list(), no model instances are built and memory stays flat.
+    """
+    rows = queryset.order_by("updated_at", "id").values_list(*VALUE_FIELDS).iterator(chunk_size=chunk_size)
+    if format == "csv":
+        return _csv_chunks(rows, chunk_size)
+    if format == "ndjson":
+        return _ndjson_chunks(rows, chunk_size)
+    raise ValueError(f"Unsupported format: {format}")
+
+
+class _ExportRenderer(renderers.BaseRenderer):
+    """Selects the export format (?format= or Accept), errors are still rendered as JSON"""
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return renderers.JSONRenderer().render(data)
+
+
+class CSVExportRenderer(_ExportRenderer):
+    media_type = "text/csv"
+    format = "csv"
+
+
+class NDJSONExportRenderer(_ExportRenderer):
+    media_type = "application/x-ndjson"
+    format = "ndjson"
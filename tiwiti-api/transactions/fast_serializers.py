@@ -0,0 +1,145 @@
+"""
+Read-only fast path for the list endpoints. Rows come from values_list()
+and go through converters compiled once per serializer class, instead of
+a model instance and a field graph walk per row. The output is the same
+as the ModelSerializer's, test_fast_serializers.py compares the bytes.
+"""
+import decimal
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+
+class _PerCall:
+    """A converter that depends on request state, built at the start of each serialize()"""
+
+    def __init__(self, build):
+        self.build = build
+
+
+def _decimal_converter(field):
+    coerce_to_string = getattr(field, "coerce_to_string", api_settings.COERCE_DECIMAL_TO_STRING)
+    if field.decimal_places is None or field.normalize_output or field.localize or not coerce_to_string:
+        return field.to_representation
+    quantum = decimal.Decimal(".1") ** field.decimal_places
+    rounding = field.rounding
+    context = decimal.getcontext().copy()
+    if field.max_digits is not None:
+        context.prec = field.max_digits
+
+    def convert(value):
+        return f"{value.quantize(quantum, rounding=rounding, context=context):f}"
+
+    return convert
+
+
+def _datetime_converter(field):
+    output_format = getattr(field, "format", api_settings.DATETIME_FORMAT)
+    if not settings.USE_TZ or hasattr(field, "timezone") or output_format is None or output_format.lower() != ISO_8601:
+        return field.to_representation
+
+    def bind(current_timezone):
+        def convert(value):
+            value = value.astimezone(current_timezone).isoformat()
+            return value[:-6] + "Z" if value.endswith("+00:00") else value
+        return convert
+
+    # The current timezone can be switched per request, it's read once per serialize() call
+    return _PerCall(lambda: bind(timezone.get_current_timezone()))
+
+
+def _converter(field):
+    if isinstance(field, serializers.DecimalField):
+        return _decimal_converter(field)
+    if isinstance(field, serializers.DateTimeField):
+        return _datetime_converter(field)
+    if isinstance(field, serializers.PrimaryKeyRelatedField) and field.pk_field is None:
+        return None
+    if isinstance(field, serializers.ChoiceField):
+        return None if all(str(key) == key for key in field.choices) else field.to_representation
+    if isinstance(field, serializers.CharField):
+        return str
+    if isinstance(field, serializers.IntegerField):
+        return int
+    if isinstance(field, (serializers.BooleanField, serializers.ReadOnlyField)):
+        return field.to_representation
+    raise ImproperlyConfigured(f"{type(field).__name__} {field.field_name!r} has no fast path")
+
+
+class FastSerializer:
+    """
+    Serializes values_list() rows of a model serializer's fields. Use
+    columns() for the values_list() arguments (extra columns, e.g. the
+    pagination keys, go after the serializer's) and serialize() on the rows.
+    """
+
+    def __init__(self, serializer_class):
+        model = serializer_class.Meta.model
+        self.fields = []
+        self.sources = []
+        self.converters = []
+        for name, field in serializer_class().fields.items():
+            if field.write_only:
+                continue
+            if "." in field.source or field.source == "*":
+                raise ImproperlyConfigured(f"{name} reads {field.source!r}, only plain model fields have a fast path")
+            model_field = model._meta.get_field(field.source)
+            self.fields.append(name)
+            # values_list("user") is the user id, what PrimaryKeyRelatedField outputs
+            self.sources.append(model_field.name)
+            self.converters.append(_converter(field))
+
+    def columns(self, *extra):
+        return [*self.sources, *(column for column in extra if column not in self.sources)]
+
+    def serialize(self, rows):
+        fields = self.fields
+        converters = [
+            (index, convert.build() if isinstance(convert, _PerCall) else convert)
+            for index, convert in enumerate(self.converters)
+        ]
+        data = []
+        for row in rows:
+            item = {}
+            for index, convert in converters:
+                value = row[index]
+                item[fields[index]] = value if value is None or convert is None else convert(value)
+            data.append(item)
+        return data
+
+
+_compiled = {}
+
+
+def fast_serializer(serializer_class):
+    """The FastSerializer of serializer_class, compiled on first use"""
+    if serializer_class not in _compiled:
+        _compiled[serializer_class] = FastSerializer(serializer_class)
+    return _compiled[serializer_class]
+
+
+class FastListMixin:
+    """
+    List with fast_serializer(serializer_class) on values_list() rows.
+    Writes (and the response of a create) still go through the serializer.
+    Views set fast_list = False to opt out.
+    """
+    fast_list = True
+
+    def list(self, request, *args, **kwargs):
+        if not self.fast_list:
+            return super().list(request, *args, **kwargs)
+        fast = fast_serializer(self.get_serializer_class())
+        queryset = self.filter_queryset(self.get_queryset())
+        ordering = [field.lstrip("-") for field in getattr(self, "keyset_ordering", ())]
+        # Named rows, keyset pagination reads its position off the last row by attribute
+        rows = queryset.values_list(*fast.columns(*ordering), named=True)
+
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(fast.serialize(page))
+        return Response(fast.serialize(rows))
@@ -0,0 +1,182 @@
+"""Idempotency-Key support for the endpoints that move money"""
+import hashlib
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, connections, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+_sweep_lock = threading.Lock()
+_last_sweep = time.monotonic()
+
+
+def key_ttl():
+    return timedelta(seconds=getattr(settings, "IDEMPOTENCY_KEY_TTL", 24 * 60 * 60))
+
+
+def lock_timeout():
+    """How long an in-progress key is held before a retry may take it over"""
+    wait = getattr(settings, "IDEMPOTENCY_WAIT_TIMEOUT", 10)
+    return timedelta(seconds=getattr(settings, "IDEMPOTENCY_LOCK_TIMEOUT", 3 * wait))
+
+
+def purge_expired_keys():
+    """Delete the keys older than IDEMPOTENCY_KEY_TTL, returns how many went"""
+    deleted, _ = IdempotencyKey.objects.filter(created_at__lt=timezone.now() - key_ttl()).delete()
+    return deleted
+
+
+def _sweep():
+    try:
+        purge_expired_keys()
+    except DatabaseError:
+        # Best effort, the next sweep (or the purge command) picks it up
+        pass
+    finally:
+        connections.close_all()
+
+
+def schedule_sweep():
+    """Evict expired keys in a background thread, at most every IDEMPOTENCY_SWEEP_INTERVAL seconds"""
+    global _last_sweep
+    interval = getattr(settings, "IDEMPOTENCY_SWEEP_INTERVAL", 300)
+    if interval is None:
+        return
+    with _sweep_lock:
+        if time.monotonic() - _last_sweep < interval:
+            return
+        _last_sweep = time.monotonic()
+    threading.Thread(target=_sweep, daemon=True).start()
+
+
+def fingerprint(request):
+    """Identifies what was asked for, a key reused for a different request is refused"""
+    digest = hashlib.sha256()
+    for part in (request.method, request.path, request.body):
+        digest.update(part if isinstance(part, bytes) else part.encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def _replay(record):
+    response = Response(record.response, status=record.status_code)
+    response[REPLAYED_HEADER] = "true"
+    return response
+
+
+def _error(message, code):
+    return Response({"Message": message}, status=code)
+
+
+def _claim(user, key, request_fingerprint):
+    """
+    Insert the in-progress row for this key. Returns (record, None) when
+    this request owns the key, or (None, response) for a duplicate.
+    Duplicates wait for the first request to finish instead of racing it,
+    a request in progress for longer than IDEMPOTENCY_LOCK_TIMEOUT is taken
+    to be abandoned and its key is handed to the retry.
+    """
+    deadline = time.monotonic() + getattr(settings, "IDEMPOTENCY_WAIT_TIMEOUT", 10)
+    delay = 0.01
+
+    while True:
+        try:
+            with transaction.atomic():
+                return IdempotencyKey.objects.create(user=user, key=key, fingerprint=request_fingerprint), None
+        except IntegrityError:
+            pass
+
+        record = IdempotencyKey.objects.filter(user=user, key=key).first()
+        if record is None:
+            # The first request failed and released the key, take it over
+            continue
+        if record.created_at < timezone.now() - key_ttl():
+            record.delete()
+            continue
+        if record.fingerprint != request_fingerprint:
+            return None, _error(
+                f"This {HEADER} was already used for a different request",
+                status.HTTP_422_UNPROCESSABLE_ENTITY
+            )
+        if record.status_code is not None:
+            return None, _replay(record)
+        now = timezone.now()
+        if record.created_at < now - lock_timeout():
+            # Conditional on created_at, of two retries only one takes it over
+            taken = IdempotencyKey.objects.filter(
+                pk=record.pk, created_at=record.created_at, status_code__isnull=True
+            ).update(created_at=now)
+            if taken:
+                record.created_at = now
+                return record, None
+            continue
+        if time.monotonic() >= deadline:
+            return None, _error(f"A request with this {HEADER} is still in progress", status.HTTP_409_CONFLICT)
+
+        time.sleep(delay)
+        delay = min(delay * 2, 0.2)
+
+
+def run_idempotent(request, handler):
+    """
+    Run handler() at most once per (user, Idempotency-Key). The response is
+    stored in the same transaction as the ledger write, a failed request
+    releases the key so it can be retried. A request whose key was taken
+    over by a retry meanwhile is rolled back.
+    """
+    key = request.headers.get(HEADER)
+    if not key:
+        return handler()
+    if len(key) > IdempotencyKey._meta.get_field("key").max_length:
+        return _error(f"{HEADER} is too long", status.HTTP_400_BAD_REQUEST)
+
+    schedule_sweep()
+    record, response = _claim(request.user, key, fingerprint(request))
+    if response is not None:
+        return response
+
+    try:
+        with transaction.atomic():
+            response = handler()
+            if not status.is_success(response.status_code):
+                raise _Unsuccessful(response)
+            # Only while the claim is still ours, a retry may have taken it over
+            stored = _owned(record).update(status_code=response.status_code, response=response.data)
+            if not stored:
+                raise _Unsuccessful(_error(
+                    f"A retry with this {HEADER} took over the request", status.HTTP_409_CONFLICT
+                ))
+    except _Unsuccessful as e:
+        _owned(record).delete()
+        return e.response
+    except BaseException:
+        _owned(record).delete()
+        raise
+    return response
+
+
+def _owned(record):
+    return IdempotencyKey.objects.filter(pk=record.pk, created_at=record.created_at)
+
+
+class _Unsuccessful(Exception):
+    """Rolls back a handler that answered with an error instead of raising"""
+
+    def __init__(self, response):
+        self.response = response
+
+
+class IdempotencyMixin:
+    """Honour the Idempotency-Key header on POST"""
+
+    def post(self, request, *args, **kwargs):
+        return run_idempotent(request, lambda: super(IdempotencyMixin, self).post(request, *args, **kwargs))
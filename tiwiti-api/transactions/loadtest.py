@@ -0,0 +1,129 @@
+"""
+Load test driver behind the loadtest command. Model imports stay inside
+the functions, process workers import this module before Django is set up.
+"""
+import random
+import time
+from collections import defaultdict
+
+from django.test.utils import setup_test_environment
+
+from .benchmarks import WSGIClient, run_concurrently
+from .workers import init_worker
+
+# name -> (method, url name, body)
+ENDPOINTS = {
+    "deposit": ("POST", "deposit", {"amount": "1.00"}),
+    "withdraw": ("POST", "withdrawal", {"amount": "0.50"}),
+    "balance": ("GET", "balance", None),
+    "history": ("GET", "transaction-history", None),
+}
+DEFAULT_MIX = "deposit=20,withdraw=10,balance=50,history=20"
+# Seeded balances, large enough that no withdrawal is refused
+OPENING_BALANCE = "1000000.00"
+
+
+def parse_mix(value):
+    """'deposit=20,balance=80' -> {"deposit": 20, "balance": 80}"""
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise ValueError(f"Unknown endpoint {name!r}, choose from {', '.join(ENDPOINTS)}")
+        try:
+            mix[name] = int(weight)
+        except ValueError:
+            raise ValueError(f"{part!r} needs an integer weight, like {name}=10")
+        if mix[name] < 0:
+            raise ValueError(f"{name} has a negative weight")
+    if not sum(mix.values()):
+        raise ValueError("The mix has no requests in it")
+    return mix
+
+
+def seed(count):
+    """Create count users with a balance and a token, returns their token keys"""
+    from decimal import Decimal
+
+    from django.contrib.auth import get_user_model
+    from rest_framework.authtoken.models import Token
+
+    from .models import Balance
+
+    User = get_user_model()
+    users = User.objects.bulk_create([User(username=f"load{i}") for i in range(count)], batch_size=1000)
+    Balance.objects.bulk_create([Balance(user=user, amount=Decimal(OPENING_BALANCE)) for user in users], batch_size=1000)
+    tokens = Token.objects.bulk_create([Token(user=user, key=Token.generate_key()) for user in users], batch_size=1000)
+    return [token.key for token in tokens]
+
+
+def run_client(token, mix, requests, rng):
+    """Send `requests` requests picked from the mix, returns {endpoint: [(ms, status)]}"""
+    from django.urls import reverse
+
+    client = WSGIClient(token)
+    names, weights = list(mix), list(mix.values())
+    paths = {name: reverse(ENDPOINTS[name][1]) for name in names}
+    samples = defaultdict(list)
+    for name in rng.choices(names, weights, k=requests):
+        method, _, body = ENDPOINTS[name]
+        started = time.perf_counter()
+        status, _ = client.request(method, paths[name], body)
+        samples[name].append(((time.perf_counter() - started) * 1000, status))
+    return samples
+
+
+def run_clients(tokens, mix, requests, seed_value):
+    """
+    One client thread per token. Returns (started, finished, samples), the
+    wall clock times let the parent add up runs from several processes.
+    """
+    def worker(index):
+        return run_client(tokens[index], mix, requests, random.Random(f"{seed_value}:{index}:{tokens[index]}"))
+
+    elapsed, results = run_concurrently(worker, len(tokens))
+    finished = time.time()
+    return finished - elapsed, finished, merge(results)
+
+
+def merge(results):
+    samples = defaultdict(list)
+    for result in results:
+        for name, timings in result.items():
+            samples[name].extend(timings)
+    return dict(samples)
+
+
+def init_process(databases):
+    """Process pool initializer, the workers answer as the test server like the parent"""
+    init_worker(databases)
+    try:
+        setup_test_environment(debug=False)
+    except RuntimeError:
+        # Forked workers inherit the parent's
+        pass
+
+
+def percentile(timings, fraction):
+    """timings sorted ascending"""
+    return timings[min(len(timings) - 1, int(len(timings) * fraction))]
+
+
+def summarize(samples, elapsed):
+    """Per endpoint and overall: requests, errors, req/s and latency percentiles (ms)"""
+    def stats(entries):
+        timings = sorted(ms for ms, _ in entries)
+        return {
+            "requests": len(entries),
+            "errors": sum(status >= 400 for _, status in entries),
+            "throughput": round(len(entries) / elapsed, 1),
+            "p50": round(percentile(timings, 0.50), 2),
+            "p95": round(percentile(timings, 0.95), 2),
+            "p99": round(percentile(timings, 0.99), 2),
+            "max": round(timings[-1], 2),
+        }
+
+    summary = {name: stats(entries) for name, entries in sorted(samples.items()) if entries}
+    summary["all"] = stats([entry for entries in samples.values() for entry in entries])
+    return summary
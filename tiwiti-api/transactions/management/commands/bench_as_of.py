@@ -0,0 +1,93 @@
+import random
+import statistics
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db.models import Sum
+from django.test import override_settings
+from django.utils import timezone
+
+from transactions.benchmarks import benchmark_database
+from transactions.models import Balance, BalanceSnapshot, TransactionLog
+
+User = get_user_model()
+
+CHECKPOINT_EVERY = 100
+
+
+@contextmanager
+def explicit_timestamps():
+    """Let the seeding set updated_at / created_at itself instead of auto_now(_add)"""
+    fields = [TransactionLog._meta.get_field("updated_at"), BalanceSnapshot._meta.get_field("created_at")]
+    saved = [(field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, (auto_now, auto_now_add) in zip(fields, saved):
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class Command(BaseCommand):
+    help = "Time balance ?as_of= lookups on accounts of growing history, the latency should stay flat"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000], help="Entries per account")
+        parser.add_argument("--queries", type=int, default=200, help="Lookups per account, at random times")
+
+    def seed(self, user, size, start):
+        """One entry a minute from start, a checkpoint every CHECKPOINT_EVERY entries"""
+        with explicit_timestamps():
+            logs = TransactionLog.objects.bulk_create([
+                TransactionLog(
+                    type="deposit" if i % 3 else "withdrawal", user=user, amount=Decimal("10.00") if i % 3 else Decimal("5.00"),
+                    status="successful", updated_at=start + timedelta(minutes=i)
+                )
+                for i in range(size)
+            ], batch_size=5000)
+
+            running = Decimal("0.00")
+            snapshots = []
+            for i, log in enumerate(logs, start=1):
+                running += log.amount if log.type == "deposit" else -log.amount
+                if i % CHECKPOINT_EVERY == 0:
+                    snapshots.append(BalanceSnapshot(
+                        user=user, amount=running, last_entry_id=log.pk, created_at=log.updated_at + timedelta(seconds=1)
+                    ))
+            BalanceSnapshot.objects.bulk_create(snapshots, batch_size=5000)
+        Balance.objects.bulk_create([Balance(user=user, amount=running)])
+
+    def handle(self, *args, **options):
+        with benchmark_database(), override_settings(BALANCE_CHECKPOINT_EVERY=CHECKPOINT_EVERY):
+            for size in options["sizes"]:
+                user = User.objects.create_user(username=f"bench{size}", password="bench")
+                start = timezone.now() - timedelta(minutes=size + 1)
+                self.seed(user, size, start)
+
+                timings = []
+                wrong = 0
+                for query in range(options["queries"]):
+                    moment = start + timedelta(minutes=random.uniform(0, size))
+                    started = time.perf_counter()
+                    amount = BalanceSnapshot.objects.balance_at(user.pk, moment)
+                    timings.append((time.perf_counter() - started) * 1000)
+
+                    # Replay the whole history for a few of them
+                    if query < 5:
+                        replayed = TransactionLog.objects.journal().filter(user=user, updated_at__lte=moment).aggregate(
+                            total=Sum(TransactionLog.signed_amount())
+                        )["total"] or Decimal("0.00")
+                        wrong += amount != replayed
+
+                timings.sort()
+                self.stdout.write(
+                    f"{size:9d} entries: median {statistics.median(timings):6.2f}ms  "
+                    f"p95 {timings[int(len(timings) * 0.95) - 1]:6.2f}ms"
+                )
+                if wrong:
+                    self.stderr.write(self.style.ERROR(f"{wrong} balances differ from a full replay"))
@@ -0,0 +1,53 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from transactions.benchmarks import benchmark_database
+from transactions.bulk import DEFAULT_CHUNK_SIZE, ingest_operations
+from transactions.models import Deposit
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Compare posting deposits one by one through DepositAPIView with the bulk ingestion path"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--operations", type=int, default=2000, help="Deposits to post in each mode")
+        parser.add_argument("--users", type=int, default=50)
+        parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        count, user_count = options["operations"], options["users"]
+
+        with benchmark_database():
+            users = [User.objects.create_user(username=f"bench{i}", password="bench") for i in range(user_count)]
+            clients = []
+            for user in users:
+                client = APIClient()
+                client.credentials(HTTP_AUTHORIZATION=f"Token {Token.objects.create(user=user).key}")
+                clients.append(client)
+
+            url = reverse("deposit")
+            started = time.perf_counter()
+            for i in range(count):
+                clients[i % user_count].post(url, {"amount": "10.00"})
+            per_item = time.perf_counter() - started
+
+            operations = [
+                {"user": users[i % user_count].pk, "type": "deposit", "amount": "10.00"} for i in range(count)
+            ]
+            started = time.perf_counter()
+            results = ingest_operations(operations, chunk_size=options["chunk_size"])
+            bulk = time.perf_counter() - started
+
+            assert all(result["status"] == "successful" for result in results)
+            assert Deposit.objects.count() == 2 * count
+
+        self.stdout.write(f"per-item endpoint: {count / per_item:10.1f} deposits/s ({per_item:.3f}s)")
+        self.stdout.write(f"bulk ingestion:    {count / bulk:10.1f} deposits/s ({bulk:.3f}s)")
+        self.stdout.write(self.style.SUCCESS(f"speedup: {per_item / bulk:.1f}x"))
@@ -0,0 +1,88 @@
+import logging
+import os
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+
+from tiwiti_api.database import postgres, sqlite
+from transactions.benchmarks import WSGIClient, benchmark_database, run_concurrently
+from transactions.models import Balance
+
+User = get_user_model()
+
+
+def profiles(vendor):
+    """The profiles to compare on the configured database engine"""
+    if vendor == "sqlite":
+        return {"sqlite-plain": sqlite(None, tuned=False), "sqlite": sqlite(None)}
+    if vendor == "postgresql":
+        return {
+            "postgres-fresh": {**postgres(os.environ), "CONN_MAX_AGE": 0, "CONN_HEALTH_CHECKS": False},
+            "postgres": postgres(os.environ),
+            "postgres-pooled": postgres(os.environ, pooled=True),
+        }
+    raise CommandError(f"No profiles for {vendor}")
+
+
+class Command(BaseCommand):
+    help = "Compare API throughput across the database profiles with concurrent clients going through WSGI"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--clients", type=int, default=32)
+        parser.add_argument("--ops", type=int, default=50, help="Requests per client, one in four a deposit")
+        parser.add_argument("--profiles", nargs="+", help="Subset of the profiles to run")
+
+    def handle(self, *args, **options):
+        clients, ops = options["clients"], options["ops"]
+        available = profiles(connections["default"].vendor)
+        selected = options["profiles"] or list(available)
+        unknown = set(selected) - set(available)
+        if unknown:
+            raise CommandError(f"Unknown profiles {', '.join(sorted(unknown))}, choose from {', '.join(available)}")
+
+        # Failed requests are counted, not logged one by one
+        logging.getLogger("django.request").setLevel(logging.CRITICAL)
+
+        for name in selected:
+            with benchmark_database(profile=available[name]):
+                users = User.objects.bulk_create([User(username=f"bench{i}") for i in range(clients)])
+                Balance.objects.bulk_create([Balance(user=user) for user in users])
+                tokens = Token.objects.bulk_create([Token(user=user, key=Token.generate_key()) for user in users])
+                connections.close_all()
+
+                opened = []
+                record = lambda sender, connection, **kwargs: opened.append(connection.alias)
+                connection_created.connect(record)
+
+                def worker(index):
+                    client = WSGIClient(tokens[index].key)
+                    deposits = failed = 0
+                    for op in range(ops):
+                        if op % 4 == 0:
+                            status, _ = client.request("POST", reverse("deposit"), {"amount": "1.00"})
+                            deposits += status == 201
+                        else:
+                            status, _ = client.request("GET", reverse("balance"))
+                        failed += status >= 400
+                    return deposits, failed
+
+                try:
+                    elapsed, results = run_concurrently(worker, clients)
+                finally:
+                    connection_created.disconnect(record)
+
+                deposited = sum(deposits for deposits, _ in results)
+                failed = sum(failed for _, failed in results)
+                total = sum(Balance.objects.values_list("amount", flat=True), Decimal("0"))
+
+            self.stdout.write(
+                f"{name:16s} {clients * ops / elapsed:9.1f} req/s  {failed:5d} failed  "
+                f"{len(opened):5d} connects  ({elapsed:.2f}s)"
+            )
+            if total != deposited:
+                self.stderr.write(self.style.ERROR(f"{name}: balances add up to {total}, {deposited} deposits succeeded"))
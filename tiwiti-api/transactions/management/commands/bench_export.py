@@ -0,0 +1,73 @@
+import time
+import tracemalloc
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from transactions.benchmarks import benchmark_database
+from transactions.models import TransactionLog
+
+User = get_user_model()
+
+BATCH = 50000
+
+
+class Command(BaseCommand):
+    help = "Stream a large transaction export through the admin endpoint and report throughput and peak memory"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=5000000)
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--format", choices=["csv", "ndjson"], default="csv")
+
+    def seed(self, rows, user_count):
+        users = User.objects.bulk_create([User(username=f"export{i}") for i in range(user_count)])
+        for start in range(0, rows, BATCH):
+            TransactionLog.objects.bulk_create([
+                TransactionLog(
+                    type="deposit" if i % 3 else "withdrawal", user=users[i % user_count],
+                    amount=Decimal("10.00") if i % 3 else Decimal("5.00"), status="successful"
+                )
+                for i in range(start, min(start + BATCH, rows))
+            ])
+            self.stdout.write(f"\rseeded {min(start + BATCH, rows)} rows", ending="")
+            self.stdout.flush()
+        self.stdout.write("")
+
+    def handle(self, *args, **options):
+        rows = options["rows"]
+
+        with benchmark_database():
+            self.seed(rows, options["users"])
+            admin = User.objects.create_superuser(username="export-admin", password="export")
+            client = APIClient()
+            client.credentials(HTTP_AUTHORIZATION=f"Token {Token.objects.create(user=admin).key}")
+
+            tracemalloc.start()
+            started = time.perf_counter()
+            response = client.get(reverse("transaction-export-all"), {"format": options["format"]})
+            if response.status_code != 200:
+                raise CommandError(f"Export returned {response.status_code}")
+
+            size = lines = 0
+            early_peak = None
+            for chunk in response.streaming_content:
+                size += len(chunk)
+                lines += chunk.count(b"\n")
+                if early_peak is None and lines >= rows // 10:
+                    early_peak = tracemalloc.get_traced_memory()[1]
+            elapsed = time.perf_counter() - started
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+        exported = lines - (options["format"] == "csv")
+        self.stdout.write(f"rows:        {exported} of {rows}")
+        self.stdout.write(f"size:        {size / 2**20:.1f} MiB {options['format']}")
+        self.stdout.write(f"elapsed:     {elapsed:.2f}s ({exported / elapsed:.0f} rows/s, traced)")
+        self.stdout.write(f"peak memory: {(early_peak or peak) / 2**20:.2f} MiB after 10% of the rows, {peak / 2**20:.2f} MiB at the end")
+        if exported != rows:
+            raise CommandError("The export is missing rows")
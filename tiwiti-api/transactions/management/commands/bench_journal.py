@@ -0,0 +1,96 @@
+import time
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError
+from django.test import override_settings
+
+from transactions.benchmarks import benchmark_database, run_concurrently
+from transactions.models import (
+    Balance,
+    BalanceSnapshot,
+    Deposit,
+    TotalBalance,
+    TransactionLog,
+    Withdrawal,
+    InsufficientFundsError,
+    balance_ledger
+)
+
+User = get_user_model()
+
+DEPOSIT = Decimal("10.00")
+WITHDRAWAL = Decimal("5.00")
+
+
+class Command(BaseCommand):
+    help = "Compare write throughput of the insert-only journal ledger with the update-in-place balance ledger"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--writers", type=int, default=16, help="Concurrent writer threads")
+        parser.add_argument("--ops", type=int, default=100, help="Operations per writer")
+        parser.add_argument("--users", type=int, default=4, help="Accounts the writers share")
+        parser.add_argument("--withdraw-every", type=int, default=4, help="Every Nth operation is a withdrawal")
+        parser.add_argument("--modes", nargs="+", default=["balance", "journal"], choices=["balance", "journal"])
+
+    def handle(self, *args, **options):
+        writers, ops, user_count = options["writers"], options["ops"], options["users"]
+        every = max(1, options["withdraw_every"])
+        failed = False
+
+        with benchmark_database() as connection:
+            if connection.vendor == "sqlite":
+                self.stdout.write(self.style.WARNING(
+                    "SQLite locks the whole database per write, run this against Postgres/MySQL "
+                    "to see row lock contention go away"
+                ))
+            users = [User.objects.create_user(username=f"bench{i}", password="bench") for i in range(user_count)]
+
+            for mode in options["modes"]:
+                for model in (TransactionLog, Deposit, Withdrawal, BalanceSnapshot, Balance, TotalBalance):
+                    model.objects.all().delete()
+
+                with override_settings(LEDGER_MODE=mode):
+                    for user in users:
+                        Balance.objects.create(user=user, amount=Decimal("0.00"))
+
+                    def worker(index):
+                        user = users[index % user_count]
+                        moved = Decimal("0.00")
+                        errors = 0
+                        for op in range(ops):
+                            try:
+                                if op % every == every - 1:
+                                    Withdrawal.objects.create(user=user, amount=WITHDRAWAL)
+                                    moved -= WITHDRAWAL
+                                else:
+                                    Deposit.objects.create(user=user, amount=DEPOSIT)
+                                    moved += DEPOSIT
+                            except (InsufficientFundsError, DatabaseError):
+                                errors += 1
+                        return user.pk, moved, errors
+
+                    elapsed, results = run_concurrently(worker, writers)
+
+                    expected = {user.pk: Decimal("0.00") for user in users}
+                    for user_id, moved, _ in results:
+                        expected[user_id] += moved
+
+                    started = time.perf_counter()
+                    actual = {user.pk: balance_ledger().current(user).amount for user in users}
+                    read_ms = (time.perf_counter() - started) * 1000 / user_count
+
+                errors = sum(r[2] for r in results)
+                lost = sum(abs(expected[pk] - actual[pk]) for pk in expected)
+                self.stdout.write(
+                    f"{mode:8s} {(writers * ops - errors) / elapsed:10.1f} ops/s  ({elapsed:.3f}s, "
+                    f"{errors} failed, balance read {read_ms:.2f}ms, "
+                    f"{BalanceSnapshot.objects.count()} snapshots, lost {lost})"
+                )
+                failed |= bool(lost)
+
+        if failed:
+            self.stderr.write(self.style.ERROR("Balances don't match the operations that went through"))
+        else:
+            self.stdout.write(self.style.SUCCESS("Every balance matches its operations"))
@@ -0,0 +1,93 @@
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError
+
+from transactions.benchmarks import benchmark_database, run_concurrently
+from transactions.models import Balance, Deposit, Withdrawal, InsufficientFundsError
+
+User = get_user_model()
+
+DEPOSIT = Decimal("10.00")
+WITHDRAWAL = Decimal("5.00")
+
+
+def legacy_deposit(user, amount):
+    """The old read-modify-write deposit path, kept for comparison"""
+    balance, _ = Balance.objects.get_or_create(user=user)
+    balance.amount += amount
+    balance.save()
+
+
+def legacy_withdrawal(user, amount):
+    balance = Balance.objects.filter(user=user).first()
+    if not balance or balance.amount < amount:
+        raise InsufficientFundsError("Insufficient Balance")
+    balance.amount -= amount
+    balance.save()
+
+
+class Command(BaseCommand):
+    help = "Hammer deposits/withdrawals from many threads and check that no balance update is lost"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--writers", type=int, default=50, help="Concurrent writer threads")
+        parser.add_argument("--ops", type=int, default=20, help="Operations per writer")
+        parser.add_argument("--users", type=int, default=1, help="Accounts the writers share (1 = one hot row)")
+        parser.add_argument("--legacy", action="store_true", help="Use the old read-modify-write balance path")
+
+    def handle(self, *args, **options):
+        writers, ops, user_count = options["writers"], options["ops"], options["users"]
+
+        with benchmark_database():
+            users = [User.objects.create_user(username=f"bench{i}", password="bench") for i in range(user_count)]
+            opening = DEPOSIT * ops * writers
+            for user in users:
+                Balance.objects.create(user=user, amount=opening)
+
+            def worker(index):
+                user = users[index % user_count]
+                moved = Decimal("0.00")
+                rejected = errors = 0
+                for op in range(ops):
+                    try:
+                        if op % 2 == 0:
+                            if options["legacy"]:
+                                legacy_deposit(user, DEPOSIT)
+                            else:
+                                Deposit.objects.create(user=user, amount=DEPOSIT)
+                            moved += DEPOSIT
+                        else:
+                            if options["legacy"]:
+                                legacy_withdrawal(user, WITHDRAWAL)
+                            else:
+                                Withdrawal.objects.create(user=user, amount=WITHDRAWAL)
+                            moved -= WITHDRAWAL
+                    except InsufficientFundsError:
+                        rejected += 1
+                    except DatabaseError:
+                        errors += 1
+                return user.pk, moved, rejected, errors
+
+            elapsed, results = run_concurrently(worker, writers)
+
+            expected = {user.pk: opening for user in users}
+            for user_id, moved, _, _ in results:
+                expected[user_id] += moved
+            actual = dict(Balance.objects.values_list("user_id", "amount"))
+            lost = sum(abs(expected[pk] - actual[pk]) for pk in expected)
+
+            completed = writers * ops - sum(r[3] for r in results)
+            self.stdout.write(f"mode:        {'legacy' if options['legacy'] else 'conditional update'}")
+            self.stdout.write(f"writers:     {writers} x {ops} ops on {user_count} account(s)")
+            self.stdout.write(f"elapsed:     {elapsed:.3f}s")
+            self.stdout.write(f"throughput:  {completed / elapsed:.1f} ops/s")
+            self.stdout.write(f"rejected:    {sum(r[2] for r in results)}")
+            self.stdout.write(f"db errors:   {sum(r[3] for r in results)}")
+            self.stdout.write(f"lost amount: {lost}")
+
+        if lost:
+            self.stderr.write(self.style.ERROR("Balance updates were lost"))
+        else:
+            self.stdout.write(self.style.SUCCESS("No lost updates"))
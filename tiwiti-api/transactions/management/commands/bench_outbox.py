@@ -0,0 +1,65 @@
+import time
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+
+from transactions import outbox
+from transactions.benchmarks import benchmark_database, run_concurrently
+from transactions.models import Balance, Deposit, TransactionLog
+
+User = get_user_model()
+
+
+def percentile(timings, fraction):
+    return timings[min(len(timings) - 1, int(len(timings) * fraction))]
+
+
+class Command(BaseCommand):
+    help = "Compare deposit write latency with synchronous TransactionLog inserts and with the write-behind outbox"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--writers", type=int, default=16)
+        parser.add_argument("--ops", type=int, default=100, help="Deposits per writer")
+        parser.add_argument("--users", type=int, default=16)
+
+    def handle(self, *args, **options):
+        writers, ops = options["writers"], options["ops"]
+
+        with benchmark_database() as connection:
+            if connection.vendor == "sqlite":
+                self.stdout.write(self.style.WARNING(
+                    "SQLite locks the whole database per write and the flusher queues on the same lock, "
+                    "run this against Postgres to see the latency the outbox takes off each request"
+                ))
+            users = [User.objects.create_user(username=f"bench{i}", password="bench") for i in range(options["users"])]
+            Balance.objects.bulk_create([Balance(user=user) for user in users])
+
+            for label, enabled in (("sync", False), ("outbox", True)):
+                with override_settings(TRANSACTION_LOG_OUTBOX=enabled, BALANCE_CHECKPOINT_EVERY=None):
+                    before = TransactionLog.objects.count()
+
+                    def worker(index):
+                        user = users[index % len(users)]
+                        timings = []
+                        for _ in range(ops):
+                            started = time.perf_counter()
+                            Deposit.objects.create(user=user, amount=Decimal("1.00"))
+                            timings.append((time.perf_counter() - started) * 1000)
+                        return timings
+
+                    elapsed, results = run_concurrently(worker, writers)
+                    flushed = time.perf_counter()
+                    outbox.flush()
+                    drain = time.perf_counter() - flushed
+                    written = TransactionLog.objects.count() - before
+
+                timings = sorted(t for result in results for t in result)
+                self.stdout.write(
+                    f"{label:7s} p50 {percentile(timings, 0.50):7.2f}ms  p95 {percentile(timings, 0.95):7.2f}ms  "
+                    f"p99 {percentile(timings, 0.99):7.2f}ms  {len(timings) / elapsed:8.1f} deposits/s"
+                    + (f"  (log drained {drain * 1000:.0f}ms after the last write)" if enabled else "")
+                )
+                if written != writers * ops:
+                    raise CommandError(f"{label}: {written} log entries for {writers * ops} deposits")
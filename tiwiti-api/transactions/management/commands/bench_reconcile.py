@@ -0,0 +1,63 @@
+import io
+import os
+import tempfile
+import time
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from transactions.benchmarks import benchmark_database
+from transactions.models import Balance, TransactionLog
+
+User = get_user_model()
+
+BATCH = 50000
+
+
+class Command(BaseCommand):
+    help = "Time reconcile_ledger --repair on a seeded database with a few drifted balances"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000000)
+        parser.add_argument("--drift-every", type=int, default=1000, help="Every Nth balance is seeded wrong")
+        parser.add_argument("--workers", type=int, default=os.cpu_count())
+        parser.add_argument("--batch-size", type=int, default=10000)
+
+    def seed(self, user_count, drift_every):
+        for start in range(0, user_count, BATCH):
+            users = User.objects.bulk_create([User(username=f"reconcile{i}") for i in range(start, min(start + BATCH, user_count))])
+            TransactionLog.objects.bulk_create(
+                [TransactionLog(type="deposit", user=user, amount=Decimal("50.00"), status="successful") for user in users]
+                + [TransactionLog(type="withdrawal", user=user, amount=Decimal("20.00"), status="successful") for user in users]
+            )
+            Balance.objects.bulk_create([
+                Balance(user=user, amount=Decimal("31.00") if (start + i) % drift_every == 0 else Decimal("30.00"))
+                for i, user in enumerate(users)
+            ])
+            self.stdout.write(f"\rseeded {start + len(users)} users", ending="")
+            self.stdout.flush()
+        self.stdout.write("")
+
+    def handle(self, *args, **options):
+        users, drift_every = options["users"], options["drift_every"]
+        expected = len(range(0, users, drift_every))
+
+        with benchmark_database():
+            self.seed(users, drift_every)
+            out = io.StringIO()
+            started = time.perf_counter()
+            call_command(
+                "reconcile_ledger", "--repair", "--show", "0",
+                "--workers", str(options["workers"]), "--batch-size", str(options["batch_size"]),
+                "--checkpoint", os.path.join(tempfile.mkdtemp(), "progress.json"),
+                stdout=out
+            )
+            elapsed = time.perf_counter() - started
+            repaired = Balance.objects.exclude(amount=Decimal("30.00")).count()
+
+        self.stdout.write(out.getvalue().strip().splitlines()[-2])
+        self.stdout.write(f"elapsed: {elapsed:.1f}s with {options['workers']} workers ({users / elapsed:.0f} users/s)")
+        if repaired:
+            raise CommandError(f"{repaired} balances still off, expected {expected} repaired")
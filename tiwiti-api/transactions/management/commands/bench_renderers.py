@@ -0,0 +1,71 @@
+import time
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+
+from tiwiti_api.renderers import MessagePackRenderer, ORJSONRenderer, msgpack
+from transactions.benchmarks import benchmark_database
+from transactions.fast_serializers import fast_serializer
+from transactions.models import Deposit, TransactionLog
+from transactions.serializers import TransactionLogSerializer
+
+User = get_user_model()
+
+
+def best_of(repeat, func):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+class Command(BaseCommand):
+    help = "Encode throughput of DRF's JSONRenderer, ORJSONRenderer and MessagePackRenderer on TransactionLog pages"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=10000, help="TransactionLog rows per payload")
+        parser.add_argument("--repeat", type=int, default=20, help="Encodes per renderer, the best one counts")
+
+    def handle(self, *args, **options):
+        rows, repeat = options["rows"], options["repeat"]
+
+        with benchmark_database():
+            user = User.objects.create_user(username="bench", password="bench")
+            deposits = Deposit.objects.bulk_create([Deposit(user=user, amount=Decimal("12.34")) for _ in range(rows)])
+            TransactionLog.objects.bulk_create([
+                TransactionLog(type="deposit", user=user, amount=d.amount, deposit_transaction=d, status="successful")
+                for d in deposits
+            ])
+            queryset = TransactionLog.objects.order_by("-updated_at", "-id")
+            fast = fast_serializer(TransactionLogSerializer)
+            payloads = {
+                # What the list endpoints hand the renderer, amounts and timestamps already strings
+                "serialized": {"next": None, "previous": None, "results": fast.serialize(queryset.values_list(*fast.columns()))},
+                # Decimals and datetimes left to the renderer's encoder
+                "raw values": {"next": None, "previous": None, "results": list(queryset.values(*fast.columns()))},
+            }
+
+        renderers = [("JSONRenderer", JSONRenderer()), ("ORJSONRenderer", ORJSONRenderer())]
+        if msgpack is not None:
+            renderers.append(("MessagePackRenderer", MessagePackRenderer()))
+        else:
+            self.stdout.write("msgpack is not installed, MessagePackRenderer skipped")
+
+        for name, payload in payloads.items():
+            self.stdout.write(f"{rows:,} row payload, {name}:")
+            baseline = None
+            for label, renderer in renderers:
+                if label == "ORJSONRenderer" and name == "serialized":
+                    if renderer.render(payload) != JSONRenderer().render(payload):
+                        self.stderr.write(self.style.ERROR("ORJSONRenderer output differs from JSONRenderer"))
+                size = len(renderer.render(payload))
+                elapsed = best_of(repeat, lambda: renderer.render(payload))
+                baseline = baseline or elapsed
+                self.stdout.write(
+                    f"  {label:20s} {elapsed * 1000:8.2f}ms  {rows / elapsed:12,.0f} rows/s  "
+                    f"{size / elapsed / 1e6:7.1f} MB/s  {size / 1e6:6.2f} MB  ({baseline / elapsed:.1f}x)"
+                )
@@ -0,0 +1,67 @@
+import time
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+
+from transactions.benchmarks import benchmark_database
+from transactions.fast_serializers import fast_serializer
+from transactions.models import Deposit, PersonalUsage, TransactionLog
+from transactions.serializers import DepositSerializer, PersonalUsageSerializer, TransactionLogSerializer
+
+User = get_user_model()
+
+
+def best_of(repeat, func):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+class Command(BaseCommand):
+    help = "Time ModelSerializer against the values_list() fast path per 1,000 rows, fetch and JSON rendering included"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=1000)
+        parser.add_argument("--repeat", type=int, default=20, help="Runs per path, the best one counts")
+
+    def handle(self, *args, **options):
+        rows, repeat = options["rows"], options["repeat"]
+
+        with benchmark_database():
+            user = User.objects.create_user(username="bench", password="bench")
+            deposits = Deposit.objects.bulk_create([Deposit(user=user, amount=Decimal("12.34")) for _ in range(rows)])
+            TransactionLog.objects.bulk_create([
+                TransactionLog(type="deposit", user=user, amount=d.amount, deposit_transaction=d, status="successful")
+                for d in deposits
+            ])
+            PersonalUsage.objects.bulk_create(
+                [PersonalUsage(user=user, amount=Decimal("1.50"), description="fees") for _ in range(rows)]
+            )
+
+            renderer = JSONRenderer()
+            for serializer_class, queryset in (
+                (TransactionLogSerializer, TransactionLog.objects.order_by("-updated_at", "-id")),
+                (DepositSerializer, Deposit.objects.order_by("-created_at", "-id")),
+                (PersonalUsageSerializer, PersonalUsage.objects.order_by("-updated_at", "-id")),
+            ):
+                fast = fast_serializer(serializer_class)
+
+                def model_path():
+                    return renderer.render(serializer_class(queryset.all(), many=True).data)
+
+                def fast_path():
+                    return renderer.render(fast.serialize(queryset.values_list(*fast.columns(), named=True)))
+
+                if model_path() != fast_path():
+                    self.stderr.write(self.style.ERROR(f"{serializer_class.__name__}: the outputs differ"))
+                model, quick = best_of(repeat, model_path), best_of(repeat, fast_path)
+                per_thousand = 1000 / rows * 1000
+                self.stdout.write(
+                    f"{serializer_class.__name__:26s} ModelSerializer {model * per_thousand:7.2f}ms  "
+                    f"fast {quick * per_thousand:7.2f}ms  per 1,000 rows  ({model / quick:.1f}x)"
+                )
@@ -0,0 +1,52 @@
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import override_settings
+
+from transactions.benchmarks import benchmark_database, run_concurrently
+from transactions.models import TotalBalance
+
+
+class Command(BaseCommand):
+    help = "Compare write contention on TotalBalance with 1 shard row and with many"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--writers", type=int, default=32)
+        parser.add_argument("--ops", type=int, default=50, help="Updates per writer")
+        parser.add_argument("--shards", type=int, nargs="+", default=[1, 16])
+        parser.add_argument(
+            "--hold-ms", type=float, default=2.0,
+            help="Time each transaction keeps going after touching the totals, like the rest of a deposit would"
+        )
+
+    def handle(self, *args, **options):
+        writers, ops, hold = options["writers"], options["ops"], options["hold_ms"] / 1000
+
+        with benchmark_database() as connection:
+            if connection.vendor == "sqlite":
+                self.stdout.write(self.style.WARNING(
+                    "SQLite locks the whole database per write, run this against Postgres/MySQL to see the shard effect"
+                ))
+
+            for shards in options["shards"]:
+                TotalBalance.objects.all().delete()
+
+                def worker(index):
+                    for _ in range(ops):
+                        with transaction.atomic():
+                            TotalBalance.apply_delta(deposits=Decimal("1.00"), user_id=index)
+                            time.sleep(hold)
+
+                with override_settings(TOTAL_BALANCE_SHARDS=shards):
+                    elapsed, _ = run_concurrently(worker, writers)
+                    total = TotalBalance.current().total_deposits
+
+                expected = Decimal(writers * ops)
+                self.stdout.write(
+                    f"{shards:3d} shard(s): {writers * ops / elapsed:10.1f} updates/s  "
+                    f"({elapsed:.3f}s, total {total} of {expected})"
+                )
+                if total != expected:
+                    self.stderr.write(self.style.ERROR("Totals lost updates"))
@@ -0,0 +1,173 @@
+import re
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from transactions.benchmarks import benchmark_database
+from transactions.models import (
+    Deposit,
+    Withdrawal,
+    Balance,
+    PersonalUsage,
+    TransactionLog
+)
+
+User = get_user_model()
+
+# Tables that grow with the history, a full scan on any of them is a failure
+LARGE_TABLES = [model._meta.db_table for model in (Deposit, Withdrawal, PersonalUsage, TransactionLog)]
+
+# Query params of TransactionLogAPIView, each one runs page-numbered and as a followed cursor page
+HISTORY_FILTERS = [
+    {"type": "withdrawal"},
+    {"status": "failed"},
+    {"start": "2020-01-01", "end": "2100-01-01"},
+    {"min_amount": "8", "max_amount": "20"},
+    {"type": "withdrawal", "start": "2020-01-01", "end": "2100-01-01", "min_amount": "1"},
+    {"type": "deposit", "status": "successful"},
+    {"ordering": "updated_at"},
+    {"ordering": "-amount"},
+    {"ordering": "amount", "min_amount": "1"},
+    {"ordering": "-amount", "type": "deposit"},
+    {"ordering": "-amount", "start": "2020-01-01"},
+]
+
+# (url name, query params, follow the next link, as admin)
+ENDPOINTS = [
+    ("balance", {}, False, False),
+    ("user-stats", {}, False, False),
+    ("deposit", {}, False, False),
+    ("deposit", {"pagination": "cursor"}, True, False),
+    ("withdrawal", {}, False, False),
+    ("withdrawal", {"pagination": "cursor"}, True, False),
+    ("transaction-history", {}, False, False),
+    ("transaction-history", {"pagination": "cursor"}, True, False),
+    # Every history filter and ordering, alone and combined
+    *(("transaction-history", params, follow, False) for params in HISTORY_FILTERS for follow in (False, True)),
+    ("personal-usage", {"pagination": "cursor"}, True, True),
+    ("total-balance", {}, False, True),
+]
+
+
+def explain(connection, sql, params):
+    """Return the plan lines of one query"""
+    prefix = {"sqlite": "EXPLAIN QUERY PLAN ", "postgresql": "EXPLAIN "}.get(connection.vendor)
+    if prefix is None:
+        raise CommandError(f"EXPLAIN checks are not implemented for {connection.vendor}")
+    with connection.cursor() as cursor:
+        cursor.execute(prefix + sql, params)
+        return [str(row[-1]) for row in cursor.fetchall()]
+
+
+def full_scans(vendor, plan):
+    """
+    The plan lines that read a whole large table, or sort rows of one
+    without an index (every page would sort the user's full history).
+    Sorting what an index search bounded on both sides of amount found
+    (?min_amount=&max_amount= in time order) only sorts that range.
+    """
+    tables = "|".join(LARGE_TABLES)
+    if vendor == "sqlite":
+        # "SCAN t" reads the table, "SCAN t USING INDEX i" walks an index in order (cheap under a LIMIT)
+        scan = re.compile(rf"^SCAN ({tables})$")
+        sort = re.compile(r"^USE TEMP B-TREE FOR ORDER BY$")
+        bounded = re.compile(r"^SEARCH .* USING (COVERING )?INDEX \w+ \(.*amount>\? AND amount<\?\)")
+    else:
+        scan = re.compile(rf"Seq Scan on ({tables})\b")
+        sort = re.compile(r"^(->\s*)?Sort\b")
+        bounded = re.compile(r"^Index Cond: .*\(amount >= .*\(amount <= ")
+    touches_large_table = any(re.search(rf"\b({tables})\b", line) for line in plan)
+    sorts_a_range = any(bounded.search(line.strip()) for line in plan)
+    return [
+        line for line in plan
+        if scan.search(line.strip()) or (touches_large_table and not sorts_a_range and sort.search(line.strip()))
+    ]
+
+
+class Command(BaseCommand):
+    help = "EXPLAIN every query behind the ledger endpoints on a seeded dataset and fail on full scans or unindexed sorts"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=50000, help="Deposits to seed (withdrawals and logs follow)")
+        parser.add_argument("--users", type=int, default=200)
+
+    def seed(self, rows, user_count):
+        users = User.objects.bulk_create([User(username=f"explain{i}") for i in range(user_count)])
+        admin = User.objects.create_superuser(username="explain-admin", password="explain")
+        Balance.objects.bulk_create([Balance(user=user, amount=Decimal("1000000.00")) for user in users])
+
+        deposits = Deposit.objects.bulk_create(
+            [Deposit(user=users[i % user_count], amount=Decimal(10 + i % 500)) for i in range(rows)], batch_size=5000
+        )
+        withdrawals = Withdrawal.objects.bulk_create(
+            [Withdrawal(user=users[i % user_count], amount=Decimal("5.00")) for i in range(rows // 2)], batch_size=5000
+        )
+        TransactionLog.objects.bulk_create(
+            [TransactionLog(type="deposit", user=d.user, amount=d.amount, deposit_transaction=d, status="successful") for d in deposits]
+            # A third of the withdrawals failed, so the status filter has pages to follow
+            + [
+                TransactionLog(type="withdrawal", user=w.user, amount=w.amount, withdrawal_transaction=w, status="failed" if i % 3 == 0 else "successful")
+                for i, w in enumerate(withdrawals)
+            ],
+            batch_size=5000
+        )
+        PersonalUsage.objects.bulk_create(
+            [PersonalUsage(user=admin, amount=Decimal("1.00")) for _ in range(rows // 10)], batch_size=5000
+        )
+        return users[0], admin
+
+    def handle(self, *args, **options):
+        failures = 0
+
+        with benchmark_database() as connection:
+            user, admin = self.seed(options["rows"], options["users"])
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE")
+
+            clients = {}
+            for is_admin, owner in ((False, user), (True, admin)):
+                clients[is_admin] = APIClient()
+                clients[is_admin].credentials(HTTP_AUTHORIZATION=f"Token {Token.objects.create(user=owner).key}")
+
+            for name, params, follow, is_admin in ENDPOINTS:
+                client = clients[is_admin]
+                label = " ".join([name, *(f"{key}={value}" for key, value in params.items()), *(["(next page)"] if follow else [])])
+                if follow:
+                    url = client.get(reverse(name), {"pagination": "cursor", **params}).data["next"]
+                    if not url:
+                        raise CommandError(f"{name} has a single page, seed more --rows per user")
+                    params = {}
+                else:
+                    url = reverse(name)
+
+                captured = []
+
+                def capture(execute, sql, sql_params, many, context):
+                    captured.append((sql, sql_params))
+                    return execute(sql, sql_params, many, context)
+
+                with connection.execute_wrapper(capture):
+                    response = client.get(url, params)
+                if response.status_code != 200:
+                    raise CommandError(f"{name} returned {response.status_code}")
+
+                scanned = 0
+                for sql, sql_params in captured:
+                    if not sql.lstrip().upper().startswith("SELECT"):
+                        continue
+                    scans = full_scans(connection.vendor, explain(connection, sql, sql_params))
+                    if scans:
+                        scanned += 1
+                        self.stderr.write(self.style.ERROR(f"UNINDEXED  {label}: {'; '.join(scans)}"))
+                        self.stderr.write(f"           {sql}")
+                if not scanned:
+                    self.stdout.write(f"ok         {label} ({len(captured)} queries)")
+                failures += scanned
+
+        if failures:
+            raise CommandError(f"{failures} queries scan or sort a large table without an index")
+        self.stdout.write(self.style.SUCCESS("Every query is index backed"))
@@ -0,0 +1,38 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from transactions.bulk import DEFAULT_CHUNK_SIZE, ingest_operations, read_operations
+
+
+class Command(BaseCommand):
+    help = "Apply a settlement file of deposits/withdrawals (csv, json or ndjson) in batched transactions"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Settlement file, csv needs a user,type,amount header")
+        parser.add_argument("--format", choices=["csv", "json", "ndjson"], help="Defaults to the file extension")
+        parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Operations per transaction")
+        parser.add_argument("--report", help="Write the per-item results to this JSON file")
+
+    def handle(self, *args, **options):
+        format = options["format"] or options["path"].rsplit(".", 1)[-1].lower()
+
+        try:
+            with open(options["path"], "rb") as stream:
+                operations = read_operations(stream, format)
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        results = ingest_operations(operations, chunk_size=options["chunk_size"])
+        failed = [result for result in results if result["status"] == "failed"]
+
+        if options["report"]:
+            with open(options["report"], "w") as report:
+                json.dump(results, report, indent=2)
+
+        for result in failed[:20]:
+            self.stderr.write(f"item {result['index']}: {result['error']}")
+        if len(failed) > 20:
+            self.stderr.write(f"... and {len(failed) - 20} more failures")
+
+        self.stdout.write(self.style.SUCCESS(f"{len(results) - len(failed)} successful, {len(failed)} failed"))
@@ -0,0 +1,123 @@
+import json
+import multiprocessing
+import os
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from transactions import loadtest
+from transactions.benchmarks import benchmark_database
+
+# Columns of the report, (key, header, width)
+COLUMNS = [("requests", "requests", 9), ("errors", "errors", 7), ("throughput", "req/s", 9),
+           ("p50", "p50 ms", 8), ("p95", "p95 ms", 8), ("p99", "p99 ms", 8), ("max", "max ms", 8)]
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True, cwd=settings.BASE_DIR
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed users and drive a mix of deposit, withdraw, balance and history requests through the WSGI app "
+        "on a throwaway database, report throughput and p50/p95/p99 per endpoint and save them as JSON"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=100)
+        parser.add_argument("--clients", type=int, default=32, help="Concurrent clients, each one logged in as a user")
+        parser.add_argument("--requests", type=int, default=100, help="Requests per client")
+        parser.add_argument("--mix", default=loadtest.DEFAULT_MIX, help="Endpoint weights")
+        parser.add_argument(
+            "--processes", type=int, default=0,
+            help="Spread the clients over this many processes, 0 runs them all as threads of this one"
+        )
+        parser.add_argument("--seed", type=int, default=0, help="Seed of the request sequence")
+        parser.add_argument("--output", help="Results file (default loadtest-results/<time>-<commit>.json)")
+        parser.add_argument("--compare", help="An earlier results file to show the change against")
+
+    def handle(self, *args, **options):
+        try:
+            mix = loadtest.parse_mix(options["mix"])
+        except ValueError as e:
+            raise CommandError(e)
+        clients, processes = options["clients"], options["processes"]
+        if options["users"] < 1 or clients < 1:
+            raise CommandError("--users and --clients must be at least 1")
+        baseline = self.load(options["compare"]) if options["compare"] else None
+        started = datetime.now(dt_timezone.utc)
+
+        with benchmark_database() as connection:
+            tokens = loadtest.seed(options["users"])
+            client_tokens = [tokens[index % len(tokens)] for index in range(clients)]
+            vendor = connection.vendor
+            connections.close_all()
+
+            if processes:
+                context = multiprocessing.get_context("fork" if "fork" in multiprocessing.get_all_start_methods() else None)
+                with ProcessPoolExecutor(
+                    max_workers=processes, initializer=loadtest.init_process, initargs=(settings.DATABASES,), mp_context=context
+                ) as pool:
+                    runs = list(pool.map(
+                        loadtest.run_clients,
+                        [client_tokens[index::processes] for index in range(processes) if client_tokens[index::processes]],
+                        [mix] * processes, [options["requests"]] * processes,
+                        [f"{options['seed']}:{index}" for index in range(processes)],
+                    ))
+            else:
+                runs = [loadtest.run_clients(client_tokens, mix, options["requests"], options["seed"])]
+
+        elapsed = max(finished for _, finished, _ in runs) - min(started for started, _, _ in runs)
+        summary = loadtest.summarize(loadtest.merge(samples for _, _, samples in runs), elapsed)
+        results = {
+            "commit": git_commit(),
+            "started": started.isoformat(),
+            "database": vendor,
+            "database_profile": os.environ.get("DATABASE_PROFILE", "sqlite"),
+            "config": {key: options[key] for key in ("users", "clients", "requests", "processes", "seed")} | {"mix": mix},
+            "elapsed": round(elapsed, 3),
+            "endpoints": summary,
+        }
+        self.report(summary, baseline)
+        self.save(results, options["output"] or os.path.join(
+            "loadtest-results", f"{started:%Y%m%dT%H%M%S}-{results['commit'] or 'nocommit'}.json"
+        ))
+
+    def load(self, path):
+        try:
+            with open(path) as f:
+                return json.load(f)["endpoints"]
+        except (OSError, ValueError, KeyError) as e:
+            raise CommandError(f"Can't read {path}: {e}")
+
+    def report(self, summary, baseline):
+        self.stdout.write(f"{'endpoint':10s}" + "".join(f"{header:>{width}s}" for _, header, width in COLUMNS))
+        for name, stats in summary.items():
+            line = f"{name:10s}" + "".join(f"{stats[key]:>{width}}" for key, _, width in COLUMNS)
+            if baseline and name in baseline:
+                before = baseline[name]
+                line += f"   vs before: req/s {self.change(before['throughput'], stats['throughput'])}" \
+                        f" p99 {self.change(before['p99'], stats['p99'])}"
+            self.stdout.write(line)
+            if stats["errors"]:
+                self.stderr.write(self.style.WARNING(f"{name}: {stats['errors']} requests failed"))
+
+    def change(self, before, after):
+        return f"{(after - before) / before:+.1%}" if before else "n/a"
+
+    def save(self, results, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(results, f, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Results saved to {path}"))
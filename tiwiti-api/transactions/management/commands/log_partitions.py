@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from transactions import partitions
+
+
+class Command(BaseCommand):
+    help = "Create the upcoming monthly partitions of the transaction log and list them (PostgreSQL)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--months-ahead", type=int, default=3, help="Months past the current one to create")
+
+    def handle(self, *args, **options):
+        if not partitions.is_partitioned(connection):
+            self.stdout.write(self.style.WARNING(
+                f"{partitions.TABLE} is not partitioned on {connection.vendor}, "
+                "date-bounded queries use its updated_at indexes instead"
+            ))
+            return
+
+        end = partitions.months_ahead(options["months_ahead"])
+        for name in partitions.create_partitions(connection, timezone.now(), end):
+            self.stdout.write(self.style.SUCCESS(f"Created {name}"))
+        for name, bounds, rows in partitions.list_partitions(connection):
+            self.stdout.write(f"{name:45} {bounds}  ~{max(rows, 0)} rows")
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from transactions.idempotency import purge_expired_keys
+
+
+class Command(BaseCommand):
+    help = "Delete Idempotency-Key records older than IDEMPOTENCY_KEY_TTL"
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS(f"{purge_expired_keys()} expired keys deleted"))
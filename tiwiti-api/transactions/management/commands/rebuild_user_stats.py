@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from transactions.models import UserStats
+from transactions.reconcile import user_ranges
+
+
+class Command(BaseCommand):
+    help = (
+        "Backfill (or repair) every user's stats row from their deposits and withdrawals, "
+        "one user id range per transaction"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000, help="User ids per range")
+        parser.add_argument("--start", type=int, default=None, help="Carry on from this user id")
+
+    def handle(self, *args, **options):
+        users = 0
+        for start, stop in user_ranges(options["batch_size"]):
+            if options["start"] is not None and stop <= options["start"]:
+                continue
+            users += UserStats.objects.rebuild(max(start, options["start"] or start), stop)
+            if options["verbosity"] > 1:
+                self.stdout.write(f"users {start} to {stop - 1} done")
+        self.stdout.write(self.style.SUCCESS(f"Stats rebuilt, {users} users with ledger activity"))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from transactions.models import TotalBalance
+
+
+class Command(BaseCommand):
+    help = "Repair TotalBalance by recomputing it from the full deposit, withdrawal and personal usage history"
+
+    def handle(self, *args, **options):
+        total_balance = TotalBalance.recalculate()
+        self.stdout.write(f"total deposits:      {total_balance.total_deposits}")
+        self.stdout.write(f"total withdrawals:   {total_balance.total_withdrawals}")
+        self.stdout.write(f"personal usage:      {total_balance.personal_usage}")
+        self.stdout.write(f"admin total balance: {total_balance.admin_total_balance}")
+        self.stdout.write(self.style.SUCCESS("TotalBalance recalculated"))
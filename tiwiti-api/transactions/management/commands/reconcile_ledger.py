@@ -0,0 +1,103 @@
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from transactions.models import TotalBalance, journal_mode
+from transactions.reconcile import reconcile_range, total_mismatches, user_ranges
+from transactions.workers import init_worker
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute every user's balance from the transaction log in parallel user id ranges, "
+        "report the mismatches (and TotalBalance drift) and optionally repair them"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repair", action="store_true", help="Fix the mismatches instead of only reporting them")
+        parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Processes, 0 runs in this process")
+        parser.add_argument("--batch-size", type=int, default=10000, help="User ids per range")
+        parser.add_argument("--checkpoint", default="reconcile_ledger.json", help="Progress file")
+        parser.add_argument("--resume", action="store_true", help="Skip the ranges the progress file has as done")
+        parser.add_argument("--show", type=int, default=50, help="Mismatches to print")
+
+    def load_checkpoint(self, options):
+        if not options["resume"] or not os.path.exists(options["checkpoint"]):
+            return {"batch_size": options["batch_size"], "done": [], "checked": 0, "mismatches": 0, "repaired": 0}
+        with open(options["checkpoint"]) as f:
+            progress = json.load(f)
+        if progress["batch_size"] != options["batch_size"]:
+            raise CommandError(f"The progress file was written with --batch-size {progress['batch_size']}")
+        return progress
+
+    def save_checkpoint(self, path, progress):
+        with open(path + ".tmp", "w") as f:
+            json.dump(progress, f)
+        os.replace(path + ".tmp", path)
+
+    def handle(self, *args, **options):
+        progress = self.load_checkpoint(options)
+
+        if journal_mode():
+            self.stdout.write(self.style.WARNING("LEDGER_MODE is journal, balances are read from the journal, only checking TotalBalance"))
+            ranges = []
+        else:
+            done = set(progress["done"])
+            ranges = [r for r in user_ranges(options["batch_size"]) if r[0] not in done]
+        if progress["done"]:
+            self.stdout.write(f"Resuming, {len(progress['done'])} ranges already done")
+
+        shown = 0
+
+        def record(result):
+            nonlocal shown
+            start, checked, mismatches, repaired = result
+            progress["done"].append(start)
+            progress["checked"] += checked
+            progress["mismatches"] += len(mismatches)
+            progress["repaired"] += repaired
+            self.save_checkpoint(options["checkpoint"], progress)
+            for mismatch in mismatches:
+                if shown < options["show"]:
+                    self.stdout.write(
+                        f"user {mismatch['user']}: balance {mismatch['balance']}, transaction log {mismatch['expected']}"
+                    )
+                shown += 1
+
+        if options["workers"] and len(ranges) > 1:
+            # Forked workers must not share this process's connections
+            connections.close_all()
+            pool = ProcessPoolExecutor(
+                max_workers=options["workers"], initializer=init_worker, initargs=(settings.DATABASES,),
+                mp_context=multiprocessing.get_context("fork" if "fork" in multiprocessing.get_all_start_methods() else None)
+            )
+            with pool:
+                futures = [pool.submit(reconcile_range, start, stop, options["repair"]) for start, stop in ranges]
+                for future in as_completed(futures):
+                    record(future.result())
+        else:
+            for start, stop in ranges:
+                record(reconcile_range(start, stop, options["repair"]))
+
+        totals = total_mismatches()
+        for field, (current, expected) in totals.items():
+            self.stdout.write(f"TotalBalance.{field}: {current}, history {expected}")
+        if totals and options["repair"]:
+            TotalBalance.recalculate()
+
+        # Finished, the next run starts from the beginning
+        if os.path.exists(options["checkpoint"]):
+            os.remove(options["checkpoint"])
+        self.stdout.write(
+            f"{progress['checked']} balances checked, {progress['mismatches']} mismatched, "
+            f"{progress['repaired']} repaired, TotalBalance {'off' if totals else 'ok'}"
+            + (" (recalculated)" if totals and options["repair"] else "")
+        )
+        if (progress["mismatches"] > progress["repaired"]) or (totals and not options["repair"]):
+            raise CommandError("The ledger doesn't reconcile")
+        self.stdout.write(self.style.SUCCESS("Ledger reconciled"))
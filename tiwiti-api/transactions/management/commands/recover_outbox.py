@@ -0,0 +1,17 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from transactions.outbox import recover
+
+
+class Command(BaseCommand):
+    help = "Write the transaction log entries of deposits and withdrawals the log outbox never wrote"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--hours", type=float, help="Only look at the rows of the last N hours (default: all)")
+
+    def handle(self, *args, **options):
+        since = timezone.now() - timedelta(hours=options["hours"]) if options["hours"] else None
+        self.stdout.write(self.style.SUCCESS(f"{recover(since=since)} transaction log entries recovered"))
@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from transactions.cache import invalidate_balance
+from transactions.models import Balance, BalanceSnapshot, TransactionLog, journal_mode
+
+
+class Command(BaseCommand):
+    help = (
+        "Take a BalanceSnapshot of every user. Run it before switching LEDGER_MODE to journal, "
+        "or with --write-balances before switching back to balance"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--due", action="store_true",
+            help="Only users whose journal tail is past JOURNAL_SNAPSHOT_EVERY / JOURNAL_SNAPSHOT_INTERVAL"
+        )
+        parser.add_argument(
+            "--write-balances", action="store_true",
+            help="Copy the journal balances into Balance.amount instead of taking snapshots"
+        )
+
+    def journal_users(self):
+        users = set(BalanceSnapshot.objects.values_list("user_id", flat=True).distinct())
+        users.update(TransactionLog.objects.journal().values_list("user_id", flat=True).distinct())
+        return sorted(users)
+
+    def handle(self, *args, **options):
+        if options["write_balances"]:
+            for user_id in self.journal_users():
+                with transaction.atomic():
+                    amount = BalanceSnapshot.objects.balances([user_id])[user_id]
+                    invalidate_balance(user_id)
+                    # update() rather than save(), saving a Balance in journal mode would snapshot it again
+                    if not Balance.objects.filter(user_id=user_id).update(amount=amount, updated_at=timezone.now()):
+                        Balance.objects.bulk_create([Balance(user_id=user_id, amount=amount)])
+            self.stdout.write(self.style.SUCCESS("Balances written from the journal"))
+            return
+
+        if journal_mode():
+            users = self.journal_users()
+        else:
+            users = list(Balance.objects.order_by("user_id").values_list("user_id", flat=True))
+
+        taken = 0
+        for user_id in users:
+            if options["due"]:
+                snapshot, tail = BalanceSnapshot.objects.tails([user_id])[user_id]
+                if not tail["count"] or not BalanceSnapshot.objects.snapshot_due(snapshot, tail["count"]):
+                    continue
+            BalanceSnapshot.objects.take(user_id)
+            taken += 1
+        self.stdout.write(self.style.SUCCESS(f"{taken} balance snapshots taken"))
@@ -0,0 +1,29 @@
+import sqlite3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+
+class Command(BaseCommand):
+    help = "Copy the primary SQLite database into the SQLite replicas, the local stand-in for replication"
+
+    def handle(self, *args, **options):
+        primary = connections["default"]
+        if primary.vendor != "sqlite":
+            raise CommandError("sync_replica only copies SQLite files, real replicas replicate themselves")
+        if not settings.DATABASE_REPLICAS:
+            raise CommandError("No replica configured, set REPLICA_SQLITE_PATH")
+
+        primary.ensure_connection()
+        for alias in settings.DATABASE_REPLICAS:
+            replica = settings.DATABASES[alias]
+            if connections[alias].vendor != "sqlite":
+                raise CommandError(f"{alias} is not a SQLite database")
+            connections[alias].close()
+            target = sqlite3.connect(replica["NAME"])
+            try:
+                primary.connection.backup(target)
+            finally:
+                target.close()
+            self.stdout.write(self.style.SUCCESS(f"Copied {settings.DATABASES['default']['NAME']} to {replica['NAME']}"))
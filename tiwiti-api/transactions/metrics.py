@@ -0,0 +1,26 @@
+"""Ledger metrics, registered with tiwiti_api.metrics"""
+from django.db import transaction
+
+from tiwiti_api.metrics import Counter, Gauge, Histogram
+
+LEDGER_ENTRIES = Counter(
+    "tiwiti_ledger_entries_total", "Committed deposits and withdrawals", labels=("type", "source")
+)
+LEDGER_AMOUNT = Counter("tiwiti_ledger_amount_total", "Money moved by committed deposits and withdrawals", labels=("type",))
+REJECTED_WITHDRAWALS = Counter(
+    "tiwiti_withdrawals_rejected_total", "Withdrawals refused by the balance check", labels=("reason", "source")
+)
+TOTAL_BALANCE_RECALCULATIONS = Histogram(
+    "tiwiti_total_balance_recalculate_seconds", "TotalBalance rebuilds from the full history",
+    buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0)
+)
+OUTBOX_QUEUE_DEPTH = Gauge("tiwiti_outbox_queue_depth", "Transaction log entries waiting for the outbox flusher")
+OUTBOX_WRITTEN = Counter("tiwiti_outbox_entries_written_total", "Transaction log entries written by the outbox flusher")
+
+
+def committed(kind, amount, count=1, source="api"):
+    """Count ledger entries once the surrounding transaction commits"""
+    def count_entries():
+        LEDGER_ENTRIES.inc(count, type=kind, source=source)
+        LEDGER_AMOUNT.inc(float(amount), type=kind)
+    transaction.on_commit(count_entries)
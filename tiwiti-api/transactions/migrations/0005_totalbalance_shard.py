@@ -0,0 +1,65 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:35
+
+from decimal import Decimal
+
+from django.db import migrations, models
+
+
+def keep_latest_total(apps, schema_editor):
+    """
+    Only the latest TotalBalance row was ever current, the older ones are
+    stale copies that would be double counted once the shards are summed
+    """
+    TotalBalance = apps.get_model('transactions', 'TotalBalance')
+    latest = TotalBalance.objects.order_by('-updated_at').first()
+    if latest:
+        TotalBalance.objects.exclude(pk=latest.pk).delete()
+
+
+def recalculate_totals(apps, schema_editor):
+    """
+    Deposits and withdrawals never reached the old row, apply_delta() only
+    moves the totals from here on so they have to start out right
+    """
+    TotalBalance = apps.get_model('transactions', 'TotalBalance')
+    PersonalUsage = apps.get_model('transactions', 'PersonalUsage')
+    TransactionLog = apps.get_model('transactions', 'TransactionLog')
+
+    # Same aggregation as TotalBalance.expected_totals(), frozen here against the historical models
+    def total(queryset):
+        return queryset.aggregate(models.Sum('amount'))['amount__sum'] or Decimal('0.00')
+
+    personal_usage = total(PersonalUsage.objects.filter(type='deduction')) - total(PersonalUsage.objects.filter(type='refund'))
+    total_deposits = total(TransactionLog.objects.filter(type='deposit'))
+    total_withdrawals = total(TransactionLog.objects.filter(type='withdrawal'))
+    totals = dict(
+        total_deposits=total_deposits,
+        total_withdrawals=total_withdrawals,
+        personal_usage=personal_usage,
+        displayed_total_balance=total_deposits - total_withdrawals,
+        admin_total_balance=total_deposits - total_withdrawals - personal_usage
+    )
+    if TotalBalance.objects.exists() or any(totals.values()):
+        TotalBalance.objects.update_or_create(shard=0, defaults=totals)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0004_alter_personalusage_user'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='totalbalance',
+            name='shard',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.RunPython(keep_latest_total, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='totalbalance',
+            name='shard',
+            field=models.PositiveSmallIntegerField(default=0, unique=True),
+        ),
+        migrations.RunPython(recalculate_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:38
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0005_totalbalance_shard'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='deposit',
+            index=models.Index(fields=['user', 'created_at', 'id'], name='deposit_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='personalusage',
+            index=models.Index(fields=['updated_at', 'id'], name='usage_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transactionlog',
+            index=models.Index(fields=['user', 'updated_at', 'id'], name='txlog_user_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transactionlog',
+            index=models.Index(fields=['type', 'updated_at'], name='txlog_type_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='withdrawal',
+            index=models.Index(fields=['user', 'created_at', 'id'], name='withdrawal_user_created_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:08
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0010_txlog_updated_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='transactionlog',
+            constraint=models.UniqueConstraint(fields=('deposit_transaction',), name='txlog_deposit_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='transactionlog',
+            constraint=models.UniqueConstraint(fields=('withdrawal_transaction',), name='txlog_withdrawal_unique'),
+        ),
+    ]
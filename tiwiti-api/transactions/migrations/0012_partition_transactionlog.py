@@ -0,0 +1,15 @@
+from django.db import migrations
+
+from transactions.partitions import partition_log_table, unpartition_log_table
+
+
+class Migration(migrations.Migration):
+    """Range-partition the transaction log by month on PostgreSQL, a no-op elsewhere"""
+
+    dependencies = [
+        ('transactions', '0011_txlog_unique_entries'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_log_table, unpartition_log_table),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:53
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_remove_balance_user_remove_deposit_user_and_more'),
+        ('transactions', '0012_partition_transactionlog'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('total_deposits', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=30)),
+                ('total_withdrawals', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=30)),
+                ('transaction_count', models.PositiveIntegerField(default=0)),
+                ('largest_transaction', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=20)),
+                ('first_activity', models.DateTimeField(blank=True, null=True)),
+                ('last_activity', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'user stats',
+            },
+        ),
+    ]
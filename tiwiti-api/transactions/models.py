@@ -1,7 +1,46 @@
-from django.db import models, transaction
+import random
+from datetime import timedelta
+from django.db import models, transaction, IntegrityError
+from django.db.models import F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest, Least
 from django.conf import settings
+from django.utils import timezone
 from decimal import Decimal
 from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from . import metrics, outbox, partitions
+from .cache import invalidate_balance, invalidate_totals
+
+
+class InsufficientFundsError(ValueError):
+    """Raised when a withdrawal would take a balance below zero"""
+
+    def __init__(self, message, reason="insufficient_balance"):
+        super().__init__(message)
+        self.reason = reason
+
+
+def to_decimal(amount):
+    """Normalise int/float/str amounts to Decimal before they reach the ledger"""
+    if isinstance(amount, Decimal):
+        return amount
+    if isinstance(amount, float):
+        return Decimal(str(amount))
+    return Decimal(amount)
+
+
+def journal_mode():
+    """
+    True when settings.LEDGER_MODE is "journal": balances are read from the
+    TransactionLog journal (latest snapshot + tail) instead of Balance.amount
+    """
+    return getattr(settings, "LEDGER_MODE", "balance") == "journal"
+
+
+def balance_ledger():
+    """The manager that moves and reads balances in the configured LEDGER_MODE"""
+    return BalanceSnapshot.objects if journal_mode() else Balance.objects
+
 
 # User Deposit 
 class Deposit(models.Model):
@@ -10,31 +49,41 @@ class Deposit(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "created_at", "id"], name="deposit_user_created_idx"),
+        ]
+
     def __str__(self):
         return f"Deposit(user={self.user}, amount={self.amount})"
     
     # When a deposit is made it has to affect the balance
     def save(self, *args, **kwargs):
         """Update user balance on deposit"""
-        balance, _= Balance.objects.get_or_create(user=self.user)
-        
-        if isinstance(self.amount, float):
-            self.amount = Decimal(str(self.amount))
-        elif isinstance(self.amount, int):
-            self.amount = Decimal(self.amount)
+        self.amount = to_decimal(self.amount)
 
-        balance.amount += self.amount
-        balance.save()
-        super().save(*args, **kwargs)
+        # Only a new deposit moves money, re-saving an existing one must not credit it twice
+        if not self._state.adding:
+            return super().save(*args, **kwargs)
+
+        with transaction.atomic():
+            balance_ledger().credit(self.user, self.amount)
+            TotalBalance.apply_delta(deposits=self.amount, user_id=self.user_id)
+            super().save(*args, **kwargs)
+            UserStats.objects.record(self.user_id, deposits=self.amount, at=self.created_at)
+            metrics.committed("deposit", self.amount)
 
-        #It also has to update the transaction log
-        TransactionLog.objects.create(
-            type = "deposit",
-            user = self.user,
-            amount = self.amount,
-            deposit_transaction = self,
-            status = "successful"
-        )    
+            #It also has to update the transaction log
+            TransactionLog.objects.record(
+                type = "deposit",
+                user = self.user,
+                amount = self.amount,
+                deposit_transaction = self,
+                status = "successful"
+            )
+            # With the outbox the flusher checkpoints once the entry is written
+            if not outbox.enabled():
+                BalanceSnapshot.objects.maybe_checkpoint(self.user_id)
 
 # User Withdrawal
 class Withdrawal(models.Model):
@@ -43,41 +92,463 @@ class Withdrawal(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "created_at", "id"], name="withdrawal_user_created_idx"),
+        ]
+
     # when a withdrawal is made it also has to affect the balance
     def save(self, *args, **kwargs):
-        """Update user balance on withdrawal"""
-        with transaction.atomic():            
-            balance = Balance.objects.filter(user=self.user).first()
-            if balance and balance.amount >= self.amount:
-                balance.amount -= self.amount
-                balance.save()
-                super().save(*args, **kwargs)
-
-                # Transaction Log also needs to be updated
-                TransactionLog.objects.create(
-                    type = "withdrawal",
-                    user = self.user,
-                    amount = self.amount,
-                    withdrawal_transaction = self,
-                    status = "successful"
-                ) 
+        """
+        Update user balance on withdrawal, raises InsufficientFundsError
+        instead of silently dropping a withdrawal the balance can't cover
+        """
+        self.amount = to_decimal(self.amount)
+
+        if not self._state.adding:
+            return super().save(*args, **kwargs)
+
+        with transaction.atomic():
+            try:
+                balance_ledger().debit(self.user, self.amount)
+            except InsufficientFundsError as e:
+                metrics.REJECTED_WITHDRAWALS.inc(reason=e.reason, source="api")
+                raise
+            TotalBalance.apply_delta(withdrawals=self.amount, user_id=self.user_id)
+            super().save(*args, **kwargs)
+            UserStats.objects.record(self.user_id, withdrawals=self.amount, at=self.created_at)
+            metrics.committed("withdrawal", self.amount)
+
+            # Transaction Log also needs to be updated
+            TransactionLog.objects.record(
+                type = "withdrawal",
+                user = self.user,
+                amount = self.amount,
+                withdrawal_transaction = self,
+                status = "successful"
+            )
+            if not outbox.enabled():
+                BalanceSnapshot.objects.maybe_checkpoint(self.user_id)
 
     def __repr__(self):
         return f"Withdrawal(user={self.user}, amount={self.amount})"
 
+# Balance mutations
+class BalanceQuerySet(models.QuerySet):
+    """
+    Ledger mutation service: every balance change is a single conditional
+    UPDATE ... SET amount = amount +/- x, so concurrent writers never lose
+    an update. The UPDATE takes the row lock itself on backends with row
+    locking (Postgres/MySQL) and the database write lock on SQLite.
+    """
+
+    def credit(self, user, amount):
+        """
+        Add amount to the user's balance (a user or a user id),
+        creating the row on the first deposit
+        """
+        amount = to_decimal(amount)
+        invalidate_balance(getattr(user, "pk", user))
+        updated = self.filter(user=user).update(amount=F("amount") + amount, updated_at=timezone.now())
+
+        if not updated:
+            try:
+                with transaction.atomic():
+                    self.create(user_id=getattr(user, "pk", user), amount=amount)
+            except IntegrityError:
+                # Another writer created the row first, add to theirs
+                self.filter(user=user).update(amount=F("amount") + amount, updated_at=timezone.now())
+
+    def debit(self, user, amount):
+        """Take amount off the user's balance only if the balance covers it"""
+        amount = to_decimal(amount)
+        invalidate_balance(getattr(user, "pk", user))
+        updated = self.filter(user=user, amount__gte=amount).update(
+            amount=F("amount") - amount, updated_at=timezone.now()
+        )
+
+        if not updated:
+            if not self.filter(user=user).exists():
+                raise InsufficientFundsError("No Balance Record found for this user", reason="no_balance")
+            raise InsufficientFundsError("Insufficient Balance")
+
+    def current(self, user):
+        """The user's balance row, raises Balance.DoesNotExist"""
+        return self.get(user=user)
+
+    def balances(self, user_ids):
+        """{user_id: amount} of the users that have a balance, locked until the transaction ends"""
+        return dict(self.select_for_update().filter(user_id__in=user_ids).values_list("user_id", "amount"))
+
+
 # User Balance
 class Balance(models.Model):
     user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="balance")
     amount = models.DecimalField(max_digits=20, decimal_places=2, default=0.00)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = BalanceQuerySet.as_manager()
+
+    # Direct edits (admin adjustments) must not leave a cached balance behind
+    def save(self, *args, **kwargs):
+        invalidate_balance(self.user_id)
+        super().save(*args, **kwargs)
+
+        # In journal mode the edited amount is where the journal carries on from
+        if journal_mode():
+            BalanceSnapshot.objects.take(self.user_id, amount=self.amount)
+
+    def delete(self, *args, **kwargs):
+        invalidate_balance(self.user_id)
+        return super().delete(*args, **kwargs)
+
+
+# Per-user dashboard stats
+class UserStatsQuerySet(models.QuerySet):
+    """
+    Lifetime totals kept next to the balance. Every ledger event moves
+    them with one conditional UPDATE in its own transaction, so reading
+    them is a primary key lookup instead of aggregating the history.
+    """
+
+    def record(self, user_id, deposits=0, withdrawals=0, count=1, largest=None, at=None, last=None):
+        """
+        Add ledger events to the user's row, creating it on the first one.
+        A batch passes its sums, count, largest amount and first (at) and
+        last activity.
+        """
+        deposits, withdrawals = to_decimal(deposits), to_decimal(withdrawals)
+        largest = to_decimal(largest) if largest is not None else max(deposits, withdrawals)
+        now = timezone.now()
+        at = at or now
+        last = last or at
+        changes = dict(
+            total_deposits=F("total_deposits") + deposits,
+            total_withdrawals=F("total_withdrawals") + withdrawals,
+            transaction_count=F("transaction_count") + count,
+            largest_transaction=Greatest("largest_transaction", models.Value(largest)),
+            # Greatest/Least return NULL for a NULL argument on SQLite
+            first_activity=Least(Coalesce("first_activity", models.Value(at)), models.Value(at)),
+            last_activity=Greatest(Coalesce("last_activity", models.Value(last)), models.Value(last)),
+            updated_at=now,
+        )
+        if self.filter(user_id=user_id).update(**changes):
+            return
+
+        try:
+            with transaction.atomic():
+                self.create(
+                    user_id=user_id,
+                    total_deposits=deposits,
+                    total_withdrawals=withdrawals,
+                    transaction_count=count,
+                    largest_transaction=largest,
+                    first_activity=at,
+                    last_activity=last,
+                )
+        except IntegrityError:
+            # Another writer created the row first, add to theirs
+            self.filter(user_id=user_id).update(**changes)
+
+    def rebuild(self, start, stop):
+        """
+        Recompute the rows of the users start <= id < stop from their
+        deposits and withdrawals, returns how many users have stats.
+        The existing rows are locked first, a write racing the rebuild
+        waits and then applies its event on top of the rebuilt row.
+        """
+        user_range = {"user_id__gte": start, "user_id__lt": stop}
+        with transaction.atomic():
+            stale = set(self.select_for_update().filter(**user_range).values_list("user_id", flat=True))
+            rows = {}
+            for model, field in ((Deposit, "total_deposits"), (Withdrawal, "total_withdrawals")):
+                aggregates = (
+                    model.objects.filter(**user_range)
+                    .values("user_id")
+                    .annotate(
+                        total=models.Sum("amount"),
+                        count=models.Count("id"),
+                        largest=models.Max("amount"),
+                        first=models.Min("created_at"),
+                        last=models.Max("created_at"),
+                    )
+                    .order_by()
+                    .values_list("user_id", "total", "count", "largest", "first", "last")
+                )
+                for user_id, total, count, largest, first, last in aggregates:
+                    stats = rows.setdefault(user_id, self.model(user_id=user_id))
+                    setattr(stats, field, total)
+                    stats.transaction_count += count
+                    stats.largest_transaction = max(to_decimal(stats.largest_transaction), largest)
+                    stats.first_activity = min(filter(None, (stats.first_activity, first)))
+                    stats.last_activity = max(filter(None, (stats.last_activity, last)))
+
+            for user_id in stale | set(rows):
+                invalidate_balance(user_id)
+            self.filter(user_id__in=stale - set(rows)).delete()
+            self.bulk_create(
+                rows.values(),
+                update_conflicts=True,
+                unique_fields=["user"],
+                update_fields=[*UserStats.STAT_FIELDS, "updated_at"],
+            )
+        return len(rows)
+
+
+class UserStats(models.Model):
+    """A user's lifetime deposit/withdrawal figures, see UserStatsQuerySet"""
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True, related_name="stats")
+    total_deposits = models.DecimalField(max_digits=30, decimal_places=2, default=Decimal("0.00"))
+    total_withdrawals = models.DecimalField(max_digits=30, decimal_places=2, default=Decimal("0.00"))
+    transaction_count = models.PositiveIntegerField(default=0)
+    largest_transaction = models.DecimalField(max_digits=20, decimal_places=2, default=Decimal("0.00"))
+    first_activity = models.DateTimeField(blank=True, null=True)
+    last_activity = models.DateTimeField(blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    STAT_FIELDS = (
+        "total_deposits",
+        "total_withdrawals",
+        "transaction_count",
+        "largest_transaction",
+        "first_activity",
+        "last_activity",
+    )
+
+    objects = UserStatsQuerySet.as_manager()
+
+    class Meta:
+        verbose_name_plural = "user stats"
+
+    def __str__(self):
+        return f"UserStats(user={self.user_id}, count={self.transaction_count})"
+
+
+# Journal balances
+EMPTY_TAIL = {"total": None, "count": 0, "last_entry_id": None, "updated_at": None}
+
+
+class BalanceSnapshotQuerySet(models.QuerySet):
+    """
+    Journal ledger (settings.LEDGER_MODE = "journal"). The successful
+    deposit/withdrawal rows of TransactionLog are an append-only journal
+    and a balance is the user's latest snapshot plus the sum of the
+    entries after it. Writes only insert: a deposit is its journal row,
+    a withdrawal locks the user row to check the funds first. Inserting
+    an entry share-locks the user row through its foreign key, so the
+    withdrawal and snapshot locks wait for in-flight entries to commit.
+    """
+
+    def _lock_user(self, user_id):
+        user_model = self.model._meta.get_field("user").related_model
+        list(user_model._default_manager.select_for_update().filter(pk=user_id).values_list("pk"))
+
+    def tails(self, user_ids):
+        """{user_id: (latest snapshot, aggregate of the entries after it)}"""
+        latest = self.filter(user_id=OuterRef("user_id")).order_by("-last_entry_id", "-id")
+        snapshots = {
+            snapshot.user_id: snapshot
+            for snapshot in self.filter(user_id__in=user_ids, id=Subquery(latest.values("id")[:1]))
+        }
+        latest = latest.values("last_entry_id")[:1]
+        tails = {
+            row.pop("user_id"): row
+            for row in TransactionLog.objects.journal()
+            .filter(user_id__in=user_ids, id__gt=Coalesce(Subquery(latest), 0))
+            .values("user_id")
+            .annotate(
+                total=models.Sum(TransactionLog.signed_amount()),
+                count=models.Count("id"),
+                last_entry_id=models.Max("id"),
+                updated_at=models.Max("updated_at"),
+            )
+            .order_by()
+        }
+        return {user_id: (snapshots.get(user_id), tails.get(user_id, EMPTY_TAIL)) for user_id in user_ids}
+
+    @staticmethod
+    def _amount(snapshot, tail):
+        base = snapshot.amount if snapshot is not None else Decimal("0.00")
+        return base + (tail["total"] or Decimal("0.00"))
+
+    def credit(self, user, amount):
+        """Nothing to update, the caller's journal entry is the credit"""
+        invalidate_balance(getattr(user, "pk", user))
+
+    def debit(self, user, amount):
+        """Check the journal balance covers amount, the caller's journal entry is the debit"""
+        user_id = getattr(user, "pk", user)
+        invalidate_balance(user_id)
+        self._lock_user(user_id)
+        snapshot, tail = self.tails([user_id])[user_id]
+        if snapshot is None and not tail["count"]:
+            raise InsufficientFundsError("No Balance Record found for this user", reason="no_balance")
+        if self._amount(snapshot, tail) < to_decimal(amount):
+            raise InsufficientFundsError("Insufficient Balance")
+
+    def balances(self, user_ids):
+        """{user_id: amount} of the users with a journal, locked until the transaction ends"""
+        for user_id in sorted(user_ids):
+            self._lock_user(user_id)
+        return {
+            user_id: self._amount(snapshot, tail)
+            for user_id, (snapshot, tail) in self.tails(user_ids).items()
+            if snapshot is not None or tail["count"]
+        }
+
+    def current(self, user):
+        """
+        The user's balance as an unsaved Balance, raises Balance.DoesNotExist.
+        Takes a new snapshot once the tail is JOURNAL_SNAPSHOT_EVERY entries
+        long or the latest snapshot is JOURNAL_SNAPSHOT_INTERVAL seconds old.
+        """
+        user_id = getattr(user, "pk", user)
+        snapshot, tail = self.tails([user_id])[user_id]
+        if snapshot is None and not tail["count"]:
+            raise Balance.DoesNotExist("No Balance Record found for this user")
+
+        if tail["count"] and self.snapshot_due(snapshot, tail["count"]):
+            snapshot, tail = self.take(user_id)
+
+        balance = Balance(user_id=user_id, amount=self._amount(snapshot, tail))
+        balance.updated_at = max(
+            value for value in (snapshot and snapshot.created_at, tail["updated_at"]) if value is not None
+        )
+        return balance
+
+    def snapshot_due(self, snapshot, tail_count):
+        if tail_count >= getattr(settings, "JOURNAL_SNAPSHOT_EVERY", 100):
+            return True
+        interval = getattr(settings, "JOURNAL_SNAPSHOT_INTERVAL", 15 * 60)
+        return snapshot is None or snapshot.created_at < timezone.now() - timedelta(seconds=interval)
+
+    def take(self, user_id, amount=None):
+        """
+        Snapshot the user's balance at their latest journal entry, or record
+        amount as the balance from here on (an admin adjustment). In balance
+        mode with synchronous logs the Balance row is what gets recorded.
+        Returns (snapshot, tail) with an empty tail.
+        """
+        with transaction.atomic():
+            self._lock_user(user_id)
+            snapshot, tail = self.tails([user_id])[user_id]
+            # The Balance row runs ahead of a log the outbox is still writing, use the log then
+            if amount is None and not journal_mode() and not outbox.enabled():
+                amount = Balance.objects.get(user_id=user_id).amount
+            elif amount is None:
+                if snapshot is None and not tail["count"]:
+                    raise Balance.DoesNotExist("No Balance Record found for this user")
+                amount = self._amount(snapshot, tail)
+            last_entry_id = tail["last_entry_id"] or (snapshot.last_entry_id if snapshot is not None else 0)
+            snapshot = self.create(user_id=user_id, amount=to_decimal(amount), last_entry_id=last_entry_id)
+        return snapshot, EMPTY_TAIL
+
+    def peek(self, user_id):
+        """
+        The snapshot take() would record now, unsaved and without locking
+        anything. Raises Balance.DoesNotExist like take().
+        """
+        if not journal_mode() and not outbox.enabled():
+            # One statement, a deposit's Balance update and log entry commit together
+            last_entry = TransactionLog.objects.journal().filter(user_id=user_id).order_by("-id").values("id")[:1]
+            row = (
+                Balance.objects.filter(user_id=user_id)
+                .values("amount")
+                .annotate(last_entry_id=Coalesce(Subquery(last_entry), 0))
+                .first()
+            )
+            if row is None:
+                raise Balance.DoesNotExist("No Balance Record found for this user")
+            amount, last_entry_id = row["amount"], row["last_entry_id"]
+        else:
+            snapshot, tail = self.tails([user_id])[user_id]
+            if snapshot is None and not tail["count"]:
+                raise Balance.DoesNotExist("No Balance Record found for this user")
+            amount = self._amount(snapshot, tail)
+            last_entry_id = tail["last_entry_id"] or (snapshot.last_entry_id if snapshot is not None else 0)
+        return self.model(user_id=user_id, amount=to_decimal(amount), last_entry_id=last_entry_id, created_at=timezone.now())
+
+    def maybe_checkpoint(self, user_id, entries=1):
+        """
+        Called by the write paths after adding entries for the user, takes a
+        snapshot with probability entries / BALANCE_CHECKPOINT_EVERY so every
+        user gets a checkpoint about every that many entries in either mode
+        """
+        every = getattr(settings, "BALANCE_CHECKPOINT_EVERY", 100)
+        if every and random.random() * every < entries:
+            self.take(user_id)
+
+    def balance_at(self, user_id, moment):
+        """
+        The user's balance at moment, raises Balance.DoesNotExist. Seeks the
+        checkpoints either side of moment on the (user, created_at) index and
+        sums only the entries between them, so the cost depends on the
+        checkpoint spacing rather than the age or size of the account.
+        Read only: where no checkpoint follows moment the current balance
+        (peek()) stands in for one, the write path and snapshot_balances
+        take the checkpoints.
+        """
+        if moment >= timezone.now():
+            return self.peek(user_id).amount
+
+        checkpoints = self.filter(user_id=user_id)
+        before = checkpoints.filter(created_at__lte=moment).order_by("-created_at", "-id").first()
+        after = checkpoints.filter(created_at__gt=moment).order_by("created_at", "id").first()
+        entries = TransactionLog.objects.journal().filter(user_id=user_id)
+        every = getattr(settings, "BALANCE_CHECKPOINT_EVERY", 100) or 100
+
+        # Nothing checkpointed since moment, count back from the current balance unless the tail is short
+        if after is None and (before is None or entries.filter(id__gt=before.last_entry_id)[:every].count() >= every):
+            after = self.peek(user_id)
+
+        if before is not None:
+            entries = entries.filter(id__gt=before.last_entry_id, updated_at__lte=moment)
+            if after is not None:
+                entries = entries.filter(id__lte=after.last_entry_id)
+            moved = entries.aggregate(total=models.Sum(TransactionLog.signed_amount()))["total"]
+            return before.amount + (moved or Decimal("0.00"))
+
+        # Before the first checkpoint, count back from it
+        moved = entries.filter(
+            id__lte=after.last_entry_id, updated_at__gt=moment, updated_at__lte=after.created_at
+        ).aggregate(total=models.Sum(TransactionLog.signed_amount()))["total"]
+        return after.amount - (moved or Decimal("0.00"))
+
+
+class BalanceSnapshot(models.Model):
+    """
+    A user's balance counting every TransactionLog entry up to
+    last_entry_id. The journal ledger reads balances from the latest one,
+    balances as of a past date start from the checkpoint before it.
+    See BalanceSnapshotQuerySet
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="balance_snapshots")
+    amount = models.DecimalField(max_digits=20, decimal_places=2)
+    last_entry_id = models.BigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = BalanceSnapshotQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "last_entry_id"], name="snapshot_user_entry_idx"),
+            models.Index(fields=["user", "created_at"], name="snapshot_user_created_idx"),
+        ]
+
+    def __str__(self):
+        return f"BalanceSnapshot(user={self.user_id}, amount={self.amount}, last_entry_id={self.last_entry_id})"
+
 
 # Total Balance (Admin record/view of all users funds)
 class TotalBalance(models.Model):
     """
     Stores the total balance of funds being held 
-    by the admin after personal usage
+    by the admin after personal usage.
+
+    The totals are spread over settings.TOTAL_BALANCE_SHARDS rows so that
+    concurrent writers don't all queue on one row lock, current() sums them.
     """
+    shard = models.PositiveSmallIntegerField(default=0, unique=True)
     total_deposits = models.DecimalField(max_digits=30, decimal_places=2, default=0.00)
     total_withdrawals = models.DecimalField(max_digits=30, decimal_places=2, default=0.00)
     personal_usage = models.DecimalField(max_digits=30, decimal_places=2, default=0.00)
@@ -85,44 +556,129 @@ class TotalBalance(models.Model):
     admin_total_balance = models.DecimalField(max_digits=30, decimal_places=2, default=0.00)
     updated_at = models.DateTimeField(auto_now=True)
 
+    TOTAL_FIELDS = (
+        "total_deposits",
+        "total_withdrawals",
+        "personal_usage",
+        "displayed_total_balance",
+        "admin_total_balance",
+    )
+
+    # Admin edits must not leave a stale ETag (etags.py) behind
+    def save(self, *args, **kwargs):
+        invalidate_totals()
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        invalidate_totals()
+        return super().delete(*args, **kwargs)
+
+    @classmethod
+    def shard_count(cls):
+        return max(1, getattr(settings, "TOTAL_BALANCE_SHARDS", 1))
+
+    @classmethod
+    def current(cls):
+        """The totals summed over every shard, as an unsaved TotalBalance"""
+        totals = cls.objects.aggregate(
+            **{field: models.Sum(field) for field in cls.TOTAL_FIELDS},
+            updated_at=models.Max("updated_at")
+        )
+        total_balance = cls(**{field: totals[field] or Decimal("0.00") for field in cls.TOTAL_FIELDS})
+        total_balance.updated_at = totals["updated_at"]
+        return total_balance
+
+    @classmethod
+    def apply_delta(cls, deposits=0, withdrawals=0, personal_usage=0, user_id=None):
+        """
+        Move the running totals by the amounts of one ledger event (or an
+        aggregated batch of them) in a single UPDATE of one shard row, so
+        the cost of a write doesn't grow with the history. The shard is
+        picked from user_id, or at random without one. Call inside the
+        transaction of the event itself.
+        """
+        deposits, withdrawals, personal_usage = (to_decimal(value) for value in (deposits, withdrawals, personal_usage))
+        net = deposits - withdrawals
+        invalidate_totals()
+        shards = cls.shard_count()
+        shard = user_id % shards if user_id is not None else random.randrange(shards)
+
+        # Ensure there's enough available balance before making deductions,
+        # the check spans every shard so those rows are locked for it
+        if personal_usage > 0:
+            rows = cls.objects.select_for_update().values_list("total_deposits", "personal_usage")
+            available = sum((row[0] - row[1] for row in rows), Decimal("0.00")) + deposits
+            if available <= personal_usage:
+                raise ValueError("Insufficient funds for deduction.")
+
+        changes = dict(
+            total_deposits=F("total_deposits") + deposits,
+            total_withdrawals=F("total_withdrawals") + withdrawals,
+            personal_usage=F("personal_usage") + personal_usage,
+            displayed_total_balance=F("displayed_total_balance") + net,
+            admin_total_balance=F("admin_total_balance") + net - personal_usage,
+            updated_at=timezone.now()
+        )
+        if cls.objects.filter(shard=shard).update(**changes):
+            return
+
+        # Create the shard row if none exists
+        try:
+            with transaction.atomic():
+                cls.objects.create(
+                    shard=shard,
+                    total_deposits=deposits,
+                    total_withdrawals=withdrawals,
+                    personal_usage=personal_usage,
+                    displayed_total_balance=net,
+                    admin_total_balance=net - personal_usage
+                )
+        except IntegrityError:
+            cls.objects.filter(shard=shard).update(**changes)
+
     @classmethod
-    def update_personal_usage(cls):
+    def expected_totals(cls):
         """
-        Calculates personal usage dynamically:
-        (Total Admin Withdrawals - Refunded Amounts)
+        The totals computed from the full history with
+        (Total Admin Withdrawals - Refunded Amounts) as personal usage
         """
         total_deductions= PersonalUsage.objects.filter(type='deduction').aggregate(models.Sum('amount'))['amount__sum'] or Decimal('0.00')
         total_refunds = PersonalUsage.objects.filter(type='refund').aggregate(models.Sum('amount'))['amount__sum'] or Decimal('0.00')
         personal_usage = total_deductions - total_refunds
-        
+
         # Fetch total deposits and withdrawals from the system
         total_deposits = TransactionLog.objects.filter(type='deposit').aggregate(models.Sum('amount'))['amount__sum'] or Decimal('0.00')
         total_withdrawals = TransactionLog.objects.filter(type='withdrawal').aggregate(models.Sum('amount'))['amount__sum'] or Decimal('0.00')
-        
-        # Ensure there's enough available balance before making deductions
-        if total_deposits <= personal_usage:
-            raise ValueError("Insufficient funds for deduction.")
-            
-        # Get the latest balance if it exists
-        total_balance = cls.objects.order_by('-updated_at').first()
-
-        if not total_balance:
-            # Create a new TotalBalance if none exists
-            total_balance = cls.objects.create(
-                total_deposits=total_deposits,
-                total_withdrawals = total_withdrawals,
-                personal_usage=personal_usage,
-                displayed_total_balance=Decimal('0.00'),
-                admin_total_balance=Decimal('0.00')
-            )
 
-        if total_balance:
-            total_balance.total_deposits = total_deposits
-            total_balance.total_withdrawals = total_withdrawals
-            total_balance.personal_usage = personal_usage
-            total_balance.displayed_total_balance = total_balance.total_deposits - total_balance.total_withdrawals
-            total_balance.admin_total_balance = Decimal(total_balance.total_deposits) - Decimal(total_balance.total_withdrawals) - personal_usage
-            total_balance.save()
+        # Entries still on their way through the log outbox already moved the totals
+        if outbox.enabled():
+            pending = outbox.pending_totals()
+            total_deposits += pending['deposit']
+            total_withdrawals += pending['withdrawal']
+
+        return dict(
+            total_deposits=total_deposits,
+            total_withdrawals=total_withdrawals,
+            personal_usage=personal_usage,
+            displayed_total_balance=total_deposits - total_withdrawals,
+            admin_total_balance=total_deposits - total_withdrawals - personal_usage
+        )
+
+    @classmethod
+    def recalculate(cls):
+        """
+        Repair operation: rebuild the totals from the full history.
+        Normal writes keep the totals current through apply_delta().
+        """
+        # The whole total goes to shard 0, the other shards start again from zero
+        with metrics.TOTAL_BALANCE_RECALCULATIONS.time(), transaction.atomic():
+            invalidate_totals()
+            # Lock the shards before aggregating, an apply_delta() committing in between would be zeroed out
+            list(cls.objects.select_for_update().order_by("shard").values_list("pk"))
+            totals = cls.expected_totals()
+            cls.objects.exclude(shard=0).update(**{field: Decimal("0.00") for field in cls.TOTAL_FIELDS})
+            cls.objects.update_or_create(shard=0, defaults=totals)
+        return cls.current()
         
 # Personal Usage 
 class PersonalUsage(models.Model):
@@ -141,21 +697,81 @@ class PersonalUsage(models.Model):
     description = models.TextField(blank=True, null=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["updated_at", "id"], name="usage_updated_idx"),
+        ]
+
+    @property
+    def signed_amount(self):
+        """What this entry adds to the admin's personal usage"""
+        return to_decimal(self.amount) if self.type == 'deduction' else -to_decimal(self.amount)
+
     def save(self, *args, **kwargs):
         """
         Override save() to automatically update TotalBalance
-        when a record is added.
+        when a record is added or changed.
         """
-        super().save(*args, **kwargs) # Saves the entry first
-        TotalBalance.update_personal_usage()    # Automatically update total balance
+        with transaction.atomic():
+            delta = self.signed_amount
+            if not self._state.adding:
+                delta -= PersonalUsage.objects.select_for_update().get(pk=self.pk).signed_amount
+            super().save(*args, **kwargs) # Saves the entry first
+            TotalBalance.apply_delta(personal_usage=delta, user_id=self.user_id)    # Automatically update total balance
 
     def delete(self, *args, **kwargs):
         """
         Override delete() to ensure balances are updated when
         automatically update TotalBalance when an entry is removed.
         """
-        super().delete(*args, **kwargs)
-        TotalBalance.update_personal_usage()
+        with transaction.atomic():
+            TotalBalance.apply_delta(personal_usage=-self.signed_amount, user_id=self.user_id)
+            return super().delete(*args, **kwargs)
+
+
+class TransactionLogQuerySet(models.QuerySet):
+    def journal(self):
+        """The entries that make up users' balances"""
+        return self.filter(type__in=TransactionLog.JOURNAL_TYPES, status="successful")
+
+    def between(self, start=None, end=None):
+        """
+        Entries with start <= updated_at < end. Bounding a query by date lets
+        a partitioned log (see partitions.py) skip the months outside it.
+        """
+        queryset = self
+        if start is not None:
+            queryset = queryset.filter(updated_at__gte=start)
+        if end is not None:
+            queryset = queryset.filter(updated_at__lt=end)
+        return queryset
+
+    def amount_between(self, low=None, high=None):
+        """Entries with low <= amount <= high"""
+        queryset = self
+        if low is not None:
+            queryset = queryset.filter(amount__gte=low)
+        if high is not None:
+            queryset = queryset.filter(amount__lte=high)
+        return queryset
+
+    def recent(self, months=1):
+        """Entries of the current month and the months-1 before it"""
+        start = partitions.month_start(timezone.now())
+        for _ in range(months - 1):
+            start = (start - timedelta(days=1)).replace(day=1)
+        return self.between(start=start)
+
+    def record(self, **fields):
+        """
+        Log an entry, or with settings.TRANSACTION_LOG_OUTBOX queue it for
+        the outbox flusher once the surrounding transaction commits
+        """
+        if not outbox.enabled():
+            return self.create(**fields)
+        entry = self.model(**fields)
+        values = {field.attname: getattr(entry, field.attname) for field in self.model._meta.concrete_fields if not field.primary_key}
+        transaction.on_commit(lambda: outbox.enqueue(values))
 
 
 # Transaction Log 
@@ -177,6 +793,9 @@ class TransactionLog(models.Model):
         ('failed', 'Failed'),
     ]
 
+    # Entries that move a user's balance, withdrawals count negative
+    JOURNAL_TYPES = ("deposit", "withdrawal")
+
     type = models.CharField(max_length=20, choices=TRANSACTION_TYPE)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="transactions")
     amount = models.DecimalField(max_digits=30, decimal_places=2)
@@ -185,3 +804,64 @@ class TransactionLog(models.Model):
     is_admin_only = models.BooleanField(default=False)
     status = models.CharField(max_length=20, choices=STATUS_TYPE)
     updated_at = models.DateTimeField(auto_now=True)
+
+    objects = TransactionLogQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "updated_at", "id"], name="txlog_user_updated_idx"),
+            models.Index(fields=["type", "updated_at"], name="txlog_type_updated_idx"),
+            models.Index(fields=["user", "id"], name="txlog_user_entry_idx"),
+            models.Index(fields=["updated_at", "id"], name="txlog_updated_idx"),
+            # History filters (TransactionLogAPIView), each leads with the user
+            models.Index(fields=["user", "type", "updated_at", "id"], name="txlog_user_type_updated_idx"),
+            models.Index(fields=["user", "status", "updated_at", "id"], name="txlog_user_status_updated_idx"),
+            models.Index(fields=["user", "amount", "id"], name="txlog_user_amount_idx"),
+        ]
+        constraints = [
+            # One entry per deposit/withdrawal. A partitioned log adds updated_at to
+            # both (partitions.py), the outbox checks for an entry itself there
+            models.UniqueConstraint(fields=["deposit_transaction"], name="txlog_deposit_unique"),
+            models.UniqueConstraint(fields=["withdrawal_transaction"], name="txlog_withdrawal_unique"),
+        ]
+
+    # Entries written or edited outside a deposit/withdrawal still change the user's history
+    def save(self, *args, **kwargs):
+        invalidate_balance(self.user_id)
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        invalidate_balance(self.user_id)
+        return super().delete(*args, **kwargs)
+
+    @staticmethod
+    def signed_amount():
+        """Expression for what an entry adds to the user's balance"""
+        return models.Case(
+            models.When(type="withdrawal", then=-F("amount")),
+            default=F("amount"),
+            output_field=models.DecimalField(max_digits=30, decimal_places=2),
+        )
+
+
+# Idempotency keys for the money-moving endpoints
+class IdempotencyKey(models.Model):
+    """
+    Remembers the response to a request sent with an Idempotency-Key header
+    so a retry gets that response back instead of moving money again.
+    A row without a status_code is a request still in progress.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="idempotency_keys")
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(blank=True, null=True)
+    response = models.JSONField(encoder=DjangoJSONEncoder, blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "key"], name="idempotency_user_key_unique"),
+        ]
+        indexes = [
+            models.Index(fields=["created_at"], name="idempotency_created_idx"),
+        ]
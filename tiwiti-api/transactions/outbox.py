@@ -0,0 +1,238 @@
+"""
+Write-behind TransactionLog inserts (settings.TRANSACTION_LOG_OUTBOX).
+
+The Deposit/Withdrawal row a request commits is its outbox record: the
+log entry is queued once that transaction commits, and a flusher thread
+writes queued entries with one bulk_create per batch. The queue is
+bounded. When it's full, writers wait (backpressure) and then write
+their entry themselves. Entries that never reach the log (a crash, a
+failed flush) are rebuilt by recover() from the rows without one. Both
+lock the deposit/withdrawal rows and skip the ones already logged, so
+recovery and a late flush can't both insert the same entry. The unique
+constraints alone don't stop that on a partitioned log (partitions.py),
+where they include updated_at and the two inserts date the entry apart.
+"""
+import atexit
+import logging
+import queue
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.apps import apps
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DatabaseError, connections, models, transaction
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+from . import metrics
+from .cache import invalidate_balance
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_queue = None
+_flusher = None
+_recovered = threading.Event()
+
+
+def enabled():
+    if not getattr(settings, "TRANSACTION_LOG_OUTBOX", False):
+        return False
+    if getattr(settings, "LEDGER_MODE", "balance") == "journal":
+        raise ImproperlyConfigured("TRANSACTION_LOG_OUTBOX can't be used with LEDGER_MODE = 'journal'")
+    return True
+
+
+def _setting(name, default):
+    return getattr(settings, f"TRANSACTION_LOG_OUTBOX_{name}", default)
+
+
+def _start():
+    global _queue, _flusher
+    with _lock:
+        if _flusher is None or not _flusher.is_alive():
+            if _queue is None:
+                _queue = queue.Queue(maxsize=_setting("QUEUE_SIZE", 10000))
+            _flusher = threading.Thread(target=_run, name="transaction-log-outbox", daemon=True)
+            _flusher.start()
+    return _queue
+
+
+def enqueue(values):
+    """Queue one log entry (TransactionLog field values) for the flusher"""
+    try:
+        _start().put(values, timeout=_setting("PUT_TIMEOUT", 1.0))
+    except queue.Full:
+        # The flusher can't keep up, write it here rather than drop it
+        write([values])
+
+
+def flush():
+    """Block until everything queued so far is written"""
+    if _queue is not None:
+        _recovered.wait()
+        _queue.join()
+
+
+def _lock_unlogged(TransactionLog, kind, ids):
+    """
+    Lock the deposit (or withdrawal) rows ids and return the set of those
+    without a log entry. Whoever locks second waits for the first to
+    commit, then sees its entry.
+    """
+    field = TransactionLog._meta.get_field(f"{kind}_transaction")
+    ids = sorted(ids)
+    list(field.related_model.objects.select_for_update().filter(pk__in=ids).order_by("pk").values_list("pk"))
+    logged = TransactionLog.objects.filter(**{f"{field.attname}__in": ids}).values_list(field.attname, flat=True)
+    return set(ids) - set(logged)
+
+
+def write(entries):
+    """Insert a batch of log entries, skipping any that are already in the log"""
+    TransactionLog = apps.get_model("transactions", "TransactionLog")
+    BalanceSnapshot = apps.get_model("transactions", "BalanceSnapshot")
+    counts = {}
+    with transaction.atomic():
+        for kind in TransactionLog.JOURNAL_TYPES:
+            attname = f"{kind}_transaction_id"
+            ids = {values[attname] for values in entries if values.get(attname) is not None}
+            if ids:
+                unlogged = _lock_unlogged(TransactionLog, kind, ids)
+                entries = [values for values in entries if values.get(attname) is None or values[attname] in unlogged]
+        for values in entries:
+            counts[values["user_id"]] = counts.get(values["user_id"], 0) + 1
+        TransactionLog.objects.bulk_create([TransactionLog(**values) for values in entries], ignore_conflicts=True)
+        # The histories changed after the deposits committed, their ETags have to change again
+        for user_id in counts:
+            invalidate_balance(user_id)
+
+    # Checkpoint from here, the entries are only now part of the log
+    for user_id, count in counts.items():
+        BalanceSnapshot.objects.maybe_checkpoint(user_id, entries=count)
+
+
+def _next_batch():
+    batch = [_queue.get()]
+    deadline = time.monotonic() + _setting("FLUSH_INTERVAL", 0.05)
+    while len(batch) < _setting("BATCH_SIZE", 500):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        try:
+            batch.append(_queue.get(timeout=remaining))
+        except queue.Empty:
+            break
+    return batch
+
+
+def _retrying(func, *args, attempts=4, **kwargs):
+    # Lock timeouts and deadlocks against the request transactions are usually gone a moment later
+    for attempt in range(attempts):
+        try:
+            return func(*args, **kwargs)
+        except DatabaseError:
+            if attempt == attempts - 1:
+                raise
+            connections.close_all()
+            time.sleep(0.05 * 2 ** attempt)
+
+
+def _run():
+    try:
+        _retrying(recover, since=timezone.now() - timedelta(seconds=_setting("RECOVERY_WINDOW", 60 * 60)))
+    except DatabaseError:
+        logger.exception("Transaction log outbox recovery failed, run recover_outbox")
+    finally:
+        _recovered.set()
+
+    while True:
+        batch = _next_batch()
+        metrics.OUTBOX_QUEUE_DEPTH.set(_queue.qsize())
+        try:
+            _retrying(write, batch)
+            metrics.OUTBOX_WRITTEN.inc(len(batch))
+        except DatabaseError:
+            # The rows are still in the deposit/withdrawal tables, recover() rebuilds them
+            logger.exception("Writing %d transaction log entries failed, run recover_outbox", len(batch))
+        finally:
+            for _ in batch:
+                _queue.task_done()
+
+
+def recover(since=None, batch_size=1000):
+    """
+    Write the missing log entries of committed deposits and withdrawals
+    (created after since, or all of them), dated when the money moved.
+    Returns how many were written.
+    """
+    TransactionLog = apps.get_model("transactions", "TransactionLog")
+    recovered = 0
+    for kind in TransactionLog.JOURNAL_TYPES:
+        field = TransactionLog._meta.get_field(f"{kind}_transaction")
+        model = field.related_model
+        missing = model.objects.filter(**{f"{field.related_query_name()}__isnull": True})
+        if since is not None:
+            missing = missing.filter(created_at__gte=since)
+
+        rows = list(missing.order_by("pk").values_list("pk", "user_id", "amount")[:batch_size])
+        while rows:
+            last_pk = rows[-1][0]
+            with transaction.atomic():
+                # A flusher may have written some since they were read
+                unlogged = _lock_unlogged(TransactionLog, kind, [pk for pk, _, _ in rows])
+                rows = [row for row in rows if row[0] in unlogged]
+                TransactionLog.objects.bulk_create([
+                    TransactionLog(type=kind, user_id=user_id, amount=amount, status="successful", **{field.attname: pk})
+                    for pk, user_id, amount in rows
+                ], ignore_conflicts=True)
+                TransactionLog.objects.filter(**{f"{field.attname}__in": [pk for pk, _, _ in rows]}).update(
+                    updated_at=Subquery(model.objects.filter(pk=OuterRef(field.attname)).values("created_at")[:1])
+                )
+                for user_id in {user_id for _, user_id, _ in rows}:
+                    invalidate_balance(user_id)
+            recovered += len(rows)
+            rows = list(missing.filter(pk__gt=last_pk).order_by("pk").values_list("pk", "user_id", "amount")[:batch_size])
+    return recovered
+
+
+def _unlogged(TransactionLog, kind):
+    field = TransactionLog._meta.get_field(f"{kind}_transaction")
+    return field.related_model.objects.filter(**{f"{field.related_query_name()}__isnull": True})
+
+
+def pending(user_ids):
+    """{user_id: amount} the not yet logged deposits and withdrawals add to each balance"""
+    TransactionLog = apps.get_model("transactions", "TransactionLog")
+    amounts = {}
+    for kind, sign in (("deposit", 1), ("withdrawal", -1)):
+        rows = (
+            _unlogged(TransactionLog, kind).filter(user_id__in=user_ids)
+            .values("user_id")
+            .annotate(total=models.Sum("amount"))
+            .order_by()
+            .values_list("user_id", "total")
+        )
+        for user_id, total in rows:
+            amounts[user_id] = amounts.get(user_id, 0) + sign * total
+    return amounts
+
+
+def pending_totals():
+    """{"deposit": amount, "withdrawal": amount} not yet logged, across all users"""
+    TransactionLog = apps.get_model("transactions", "TransactionLog")
+    return {
+        kind: _unlogged(TransactionLog, kind).aggregate(total=models.Sum("amount"))["total"] or Decimal("0.00")
+        for kind in ("deposit", "withdrawal")
+    }
+
+
+@atexit.register
+def _drain():
+    # Best effort on a clean shutdown, anything left is picked up by recover()
+    if _queue is not None and _flusher is not None and _flusher.is_alive():
+        deadline = time.monotonic() + 5
+        while _queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
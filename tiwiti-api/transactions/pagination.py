@@ -0,0 +1,133 @@
+"""Pagination for the ledger list endpoints"""
+import base64
+import binascii
+import json
+from datetime import datetime
+from decimal import Decimal
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from rest_framework import pagination
+from rest_framework.exceptions import NotFound
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(pagination.BasePagination):
+    """
+    Keyset (cursor) pagination on a stable (timestamp, id) ordering.
+    Each page is fetched with WHERE (timestamp, id) < (last seen) instead
+    of an OFFSET, and no COUNT(*) is run, so page N costs the same as page 1.
+    Views set `keyset_ordering`, e.g. ("-created_at", "-id"), the last
+    field has to be unique.
+    """
+    cursor_query_param = "cursor"
+    page_size = pagination.PageNumberPagination.page_size
+    ordering = ("-updated_at", "-id")
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.base_url = request.build_absolute_uri()
+        self.fields = [field.lstrip("-") for field in getattr(view, "keyset_ordering", self.ordering)]
+        self.descending = getattr(view, "keyset_ordering", self.ordering)[0].startswith("-")
+        self.model = queryset.model
+
+        position, reverse = self.decode_cursor(request)
+        descending = self.descending != reverse
+
+        order = [("-" if descending else "") + field for field in self.fields]
+        queryset = queryset.order_by(*order)
+        if position is not None:
+            queryset = queryset.filter(self.after(position, descending))
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+
+        # Moving forward we know what's ahead and only assume we came from behind, and the other way round
+        if reverse:
+            self.has_next, self.has_previous = position is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+        self.page = rows
+        return rows
+
+    def after(self, position, descending):
+        """Q for the rows strictly after position in (timestamp, id) order"""
+        lookup = "lt" if descending else "gt"
+        condition = Q()
+        for index, field in enumerate(self.fields):
+            equal = {name: value for name, value in zip(self.fields[:index], position[:index])}
+            condition |= Q(**equal, **{f"{field}__{lookup}": position[index]})
+        return condition
+
+    def position_of(self, row):
+        return [getattr(row, field) for field in self.fields]
+
+    def encode_cursor(self, position, reverse):
+        values = [
+            value.isoformat() if isinstance(value, datetime) else str(value) if isinstance(value, Decimal) else value
+            for value in position
+        ]
+        payload = json.dumps({"p": values, "r": int(reverse)}, separators=(",", ":"))
+        token = base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+        return replace_query_param(self.base_url, self.cursor_query_param, token)
+
+    def decode_cursor(self, request):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None, False
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+            values = payload["p"]
+            if len(values) != len(self.fields):
+                raise ValueError
+            position = [self.model._meta.get_field(field).to_python(value) for field, value in zip(self.fields, values)]
+            if None in position:
+                raise ValueError
+            return position, bool(payload.get("r"))
+        except (TypeError, ValueError, KeyError, binascii.Error, ValidationError, FieldDoesNotExist):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.position_of(self.page[-1]), reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.position_of(self.page[0]), reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response({
+            "next": self.get_next_link(),
+            "previous": self.get_previous_link(),
+            "results": data,
+        })
+
+
+class LedgerPagination(pagination.PageNumberPagination):
+    """
+    Page-number pagination as before, ?pagination=cursor (or following a
+    next/previous cursor link) switches to KeysetPagination.
+    """
+    mode_query_param = "pagination"
+    keyset_class = KeysetPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if request.query_params.get(self.mode_query_param) == "cursor" or request.query_params.get(
+            self.keyset_class.cursor_query_param
+        ):
+            self.keyset = self.keyset_class()
+            self.keyset.page_size = self.page_size
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
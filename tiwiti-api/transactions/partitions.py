@@ -0,0 +1,147 @@
+"""
+Monthly partitions of the transaction log.
+
+On PostgreSQL transactions_transactionlog is partitioned by RANGE
+(updated_at), one partition per calendar month (UTC) plus a default one,
+so a query bounded by date only reads the months it covers and a
+newest-first page only reads the latest months. Other backends keep the
+single table, the same date bounds then run on its updated_at indexes.
+Kept free of model imports, migration 0012 uses it.
+"""
+from datetime import datetime, timezone as dt_timezone
+
+TABLE = "transactions_transactionlog"
+
+# (name, columns) of the indexes of TransactionLog.Meta as of migration 0012, recreated on the
+# partitioned table. Indexes added by later migrations are created on the partitioned table itself.
+INDEXES = [
+    ("txlog_user_updated_idx", "user_id, updated_at, id"),
+    ("txlog_type_updated_idx", "type, updated_at"),
+    ("txlog_user_entry_idx", "user_id, id"),
+    ("txlog_updated_idx", "updated_at, id"),
+]
+# (column, referenced table) of the foreign keys
+FOREIGN_KEYS = [
+    ("user_id", "core_customuser"),
+    ("deposit_transaction_id", "transactions_deposit"),
+    ("withdrawal_transaction_id", "transactions_withdrawal"),
+]
+UNIQUE = [
+    ("txlog_deposit_unique", "deposit_transaction_id"),
+    ("txlog_withdrawal_unique", "withdrawal_transaction_id"),
+]
+
+
+def month_start(moment):
+    moment = moment.astimezone(dt_timezone.utc)
+    return datetime(moment.year, moment.month, 1, tzinfo=dt_timezone.utc)
+
+
+def next_month(month):
+    return month.replace(year=month.year + month.month // 12, month=month.month % 12 + 1)
+
+
+def months(start, end):
+    """First day of every month that overlaps [start, end)"""
+    month = month_start(start)
+    while month < end:
+        yield month
+        month = next_month(month)
+
+
+def months_ahead(count, now=None):
+    """End of the month `count` months after the current one"""
+    month = month_start(now or datetime.now(dt_timezone.utc))
+    for _ in range(count + 1):
+        month = next_month(month)
+    return month
+
+
+def partition_name(month):
+    return f"{TABLE}_y{month:%Y}m{month:%m}"
+
+
+def is_partitioned(connection):
+    if connection.vendor != "postgresql":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass", [TABLE])
+        return cursor.fetchone() is not None
+
+
+def create_partitions(connection, start, end):
+    """Create the monthly partitions covering [start, end), returns the new ones"""
+    created = []
+    with connection.cursor() as cursor:
+        for month in months(start, end):
+            name = partition_name(month)
+            cursor.execute("SELECT to_regclass(%s)", [name])
+            if cursor.fetchone()[0] is not None:
+                continue
+            cursor.execute(
+                f"CREATE TABLE {name} PARTITION OF {TABLE} FOR VALUES FROM (%s) TO (%s)", [month, next_month(month)]
+            )
+            created.append(name)
+    return created
+
+
+def list_partitions(connection):
+    """[(partition, bounds, estimated rows)] oldest first"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT child.relname, pg_get_expr(child.relpartbound, child.oid), child.reltuples::bigint
+            FROM pg_inherits JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE pg_inherits.inhparent = %s::regclass ORDER BY child.relname
+            """,
+            [TABLE],
+        )
+        return cursor.fetchall()
+
+
+def _rebuild(cursor, partitioned):
+    """Copy the log into a new (partitioned or plain) table under the same name, constraint and index names"""
+    cursor.execute(f"ALTER TABLE {TABLE} RENAME TO {TABLE}_old")
+    cursor.execute(f"ALTER SEQUENCE IF EXISTS {TABLE}_id_seq RENAME TO {TABLE}_old_id_seq")
+    cursor.execute(
+        f"CREATE TABLE {TABLE} (LIKE {TABLE}_old INCLUDING DEFAULTS)"
+        + (" PARTITION BY RANGE (updated_at)" if partitioned else "")
+    )
+    # A partition key has to be part of every unique constraint, so a partitioned log takes
+    # two entries of one deposit dated apart, outbox.py checks for an existing one itself
+    key = ", updated_at" if partitioned else ""
+    cursor.execute(f"ALTER TABLE {TABLE} ADD PRIMARY KEY (id{key})")
+    cursor.execute(f"CREATE SEQUENCE {TABLE}_id_seq OWNED BY {TABLE}.id")
+    cursor.execute(f"ALTER TABLE {TABLE} ALTER COLUMN id SET DEFAULT nextval('{TABLE}_id_seq')")
+
+    if partitioned:
+        cursor.execute(f"SELECT min(updated_at) FROM {TABLE}_old")
+        oldest = cursor.fetchone()[0] or datetime.now(dt_timezone.utc)
+        cursor.execute(f"CREATE TABLE {TABLE}_default PARTITION OF {TABLE} DEFAULT")
+        create_partitions(cursor.db, oldest, months_ahead(3))
+
+    cursor.execute(f"INSERT INTO {TABLE} SELECT * FROM {TABLE}_old")
+    cursor.execute(f"SELECT setval('{TABLE}_id_seq', coalesce((SELECT max(id) FROM {TABLE}), 0) + 1, false)")
+    cursor.execute(f"DROP TABLE {TABLE}_old CASCADE")
+
+    for name, columns in INDEXES:
+        cursor.execute(f"CREATE INDEX {name} ON {TABLE} ({columns})")
+    for name, column in UNIQUE:
+        cursor.execute(f"ALTER TABLE {TABLE} ADD CONSTRAINT {name} UNIQUE ({column}{key})")
+    for column, target in FOREIGN_KEYS:
+        cursor.execute(
+            f"ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_{column}_fk FOREIGN KEY ({column}) "
+            f"REFERENCES {target} (id) DEFERRABLE INITIALLY DEFERRED"
+        )
+
+
+def partition_log_table(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        with schema_editor.connection.cursor() as cursor:
+            _rebuild(cursor, partitioned=True)
+
+
+def unpartition_log_table(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        with schema_editor.connection.cursor() as cursor:
+            _rebuild(cursor, partitioned=False)
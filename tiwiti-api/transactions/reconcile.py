@@ -0,0 +1,105 @@
+"""
+Ledger reconciliation: every Balance row against the sum of the user's
+journal entries, and TotalBalance against the global sums
+"""
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import models, transaction
+from django.utils import timezone
+
+from . import outbox
+from .cache import invalidate_balance
+from .models import Balance, TotalBalance, TransactionLog
+
+CENT = Decimal("0.01")
+
+
+def user_ranges(batch_size):
+    """[start, stop) user id ranges of batch_size ids covering every user"""
+    bounds = get_user_model().objects.aggregate(low=models.Min("pk"), high=models.Max("pk"))
+    if bounds["low"] is None:
+        return []
+    return [(start, start + batch_size) for start in range(bounds["low"], bounds["high"] + 1, batch_size)]
+
+
+def _journal_sums(user_filter):
+    rows = (
+        TransactionLog.objects.journal()
+        .filter(**user_filter)
+        .values("user_id")
+        .annotate(total=models.Sum(TransactionLog.signed_amount()))
+        .order_by()
+        .values_list("user_id", "total")
+    )
+    return {user_id: total.quantize(CENT) for user_id, total in rows}
+
+
+def _mismatches(balances, expected):
+    """(user_id, balance or None, expected) for every user whose balance is off"""
+    found = []
+    for user_id in sorted(set(balances) | set(expected)):
+        amount = balances.get(user_id)
+        total = expected.get(user_id) or Decimal("0.00")
+        if amount is None and total == 0:
+            continue
+        if amount != total:
+            found.append((user_id, amount, total))
+    return found
+
+
+def reconcile_range(start, stop, repair=False):
+    """
+    Check the users start <= id < stop with one grouped query over the
+    journal and one over Balance. A write can land between the two, so
+    the mismatches are checked again with their rows locked and, with
+    repair, fixed with bulk_update (bulk_create for missing rows).
+    Returns (start, users checked, mismatches, repaired).
+    """
+    user_range = {"user_id__gte": start, "user_id__lt": stop}
+    balances = dict(Balance.objects.filter(**user_range).values_list("user_id", "amount"))
+    suspects = _mismatches(balances, _journal_sums(user_range))
+
+    repaired = 0
+    mismatches = []
+    if suspects:
+        with transaction.atomic():
+            user_ids = [user_id for user_id, _, _ in suspects]
+            rows = {row.user_id: row for row in Balance.objects.select_for_update().filter(user_id__in=user_ids)}
+            expected = _journal_sums({"user_id__in": user_ids})
+            # Entries still on their way through the log outbox aren't drift
+            if outbox.enabled():
+                for user_id, amount in outbox.pending(user_ids).items():
+                    expected[user_id] = expected.get(user_id, Decimal("0.00")) + amount
+            found = _mismatches({user_id: row.amount for user_id, row in rows.items()}, expected)
+            mismatches = [
+                {"user": user_id, "balance": amount, "expected": total} for user_id, amount, total in found
+            ]
+
+            if repair and found:
+                now = timezone.now()
+                changed, missing = [], []
+                for user_id, amount, total in found:
+                    invalidate_balance(user_id)
+                    if amount is None:
+                        missing.append(Balance(user_id=user_id, amount=total))
+                    else:
+                        rows[user_id].amount, rows[user_id].updated_at = total, now
+                        changed.append(rows[user_id])
+                Balance.objects.bulk_update(changed, ["amount", "updated_at"])
+                Balance.objects.bulk_create(missing)
+                repaired = len(found)
+
+    return start, len(balances), mismatches, repaired
+
+
+def total_mismatches():
+    """{field: (current, expected)} of the TotalBalance fields that are off"""
+    current = TotalBalance.current()
+    expected = TotalBalance.expected_totals()
+    return {
+        field: (getattr(current, field), expected[field].quantize(CENT))
+        for field in TotalBalance.TOTAL_FIELDS
+        if getattr(current, field) != expected[field]
+    }
+
@@ -6,7 +6,8 @@ from .models import (
     Balance,
     TotalBalance,
     PersonalUsage,
-    TransactionLog
+    TransactionLog,
+    UserStats
 )
 from django.contrib.auth import authenticate, get_user_model
 from rest_framework.authtoken.models import Token
@@ -32,6 +33,26 @@ class BalanceSerializer(serializers.ModelSerializer):
         model = Balance
         fields = ["user", "amount", "updated_at"]
 
+# A user's balance at a point in time
+class BalanceAsOfSerializer(serializers.Serializer):
+    user = serializers.IntegerField()
+    amount = serializers.DecimalField(max_digits=20, decimal_places=2, allow_null=True)
+    as_of = serializers.DateTimeField()
+
+# A user's lifetime figures for dashboards
+class UserStatsSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = UserStats
+        fields = [
+            "user",
+            "total_deposits",
+            "total_withdrawals",
+            "transaction_count",
+            "largest_transaction",
+            "first_activity",
+            "last_activity",
+        ]
+
 # Total Balance Serializer for the admin
 class TotalBalanceSerializer(serializers.ModelSerializer):
     class Meta:
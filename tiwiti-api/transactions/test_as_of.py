@@ -0,0 +1,119 @@
+from datetime import timedelta
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from rest_framework import status
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from .models import (
+    Deposit,
+    Withdrawal,
+    BalanceSnapshot,
+    TransactionLog
+)
+from decimal import Decimal
+
+User = get_user_model()
+
+@override_settings(BALANCE_CHECKPOINT_EVERY=None)
+class BalanceAsOfTestCase(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.now = timezone.now()
+        self.user = User.objects.create_user(username="asofuser", password="testpassword")
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+        self.balance_url = reverse("balance")
+
+        # 10.00 three days ago, 20.00 two days ago and -5.00 yesterday
+        for days, model, amount in ((3, Deposit, "10.00"), (2, Deposit, "20.00"), (1, Withdrawal, "5.00")):
+            model.objects.create(user=self.user, amount=Decimal(amount))
+            TransactionLog.objects.filter(pk=TransactionLog.objects.latest("id").pk).update(
+                updated_at=self.now - timedelta(days=days)
+            )
+
+    def as_of(self, moment):
+        response = self.client.get(self.balance_url, {"as_of": moment.isoformat()})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data["amount"]
+
+    def test_balance_at_each_point(self):
+        """
+        Without a checkpoint after the date the entries since the date are
+        counted back from the current balance, without writing a checkpoint.
+        """
+        self.assertEqual(self.as_of(self.now - timedelta(days=4)), "0.00")
+        self.assertEqual(self.as_of(self.now - timedelta(days=2, hours=12)), "10.00")
+        self.assertEqual(self.as_of(self.now - timedelta(days=1, hours=12)), "30.00")
+        self.assertEqual(self.as_of(self.now - timedelta(hours=12)), "25.00")
+        self.assertEqual(self.as_of(self.now + timedelta(days=1)), "25.00")
+        self.assertEqual(BalanceSnapshot.objects.count(), 0)
+
+    def test_reads_do_not_write(self):
+        moment = self.now - timedelta(hours=12)
+        for mode in ("balance", "journal"):
+            with self.settings(LEDGER_MODE=mode), CaptureQueriesContext(connection) as captured:
+                self.assertEqual(BalanceSnapshot.objects.balance_at(self.user.pk, moment), Decimal("25.00"))
+                self.assertEqual(BalanceSnapshot.objects.balance_at(self.user.pk, self.now + timedelta(days=1)), Decimal("25.00"))
+            statements = [query["sql"] for query in captured.captured_queries]
+            self.assertTrue(all(sql.startswith("SELECT") and "FOR UPDATE" not in sql for sql in statements), statements)
+
+    def test_range_between_checkpoints(self):
+        """
+        With checkpoints either side of the date only the entries between them are summed.
+        """
+        earlier, _ = BalanceSnapshot.objects.take(self.user.pk)
+        BalanceSnapshot.objects.filter(pk=earlier.pk).update(
+            created_at=self.now - timedelta(days=1, hours=1), amount=Decimal("30.00"),
+            last_entry_id=earlier.last_entry_id - 1
+        )
+        BalanceSnapshot.objects.take(self.user.pk)
+
+        self.assertEqual(self.as_of(self.now - timedelta(hours=12)), "25.00")
+        self.assertEqual(self.as_of(self.now - timedelta(hours=24, minutes=30)), "30.00")
+        self.assertEqual(self.as_of(self.now - timedelta(days=2, hours=12)), "10.00")
+        self.assertEqual(BalanceSnapshot.objects.count(), 2)
+
+    def test_date_means_end_of_day(self):
+        day = timezone.localtime(self.now - timedelta(days=2)).date()
+        response = self.client.get(self.balance_url, {"as_of": day.isoformat()})
+        self.assertEqual(response.data["amount"], "30.00")
+
+    def test_invalid_as_of(self):
+        response = self.client.get(self.balance_url, {"as_of": "yesterday"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(LEDGER_MODE="journal")
+    def test_journal_mode(self):
+        self.assertEqual(self.as_of(self.now - timedelta(days=1, hours=12)), "30.00")
+        self.assertEqual(self.as_of(self.now - timedelta(hours=12)), "25.00")
+
+    def test_admin_bulk_as_of(self):
+        other = User.objects.create_user(username="asofother", password="testpassword")
+        Deposit.objects.create(user=other, amount=Decimal("7.00"))
+        admin = User.objects.create_superuser(username="admin", password="adminpass")
+        url = reverse("balance-as-of")
+        params = {"as_of": (self.now - timedelta(hours=12)).isoformat(), "users": f"{self.user.pk},{other.pk},999999"}
+
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {Token.objects.create(user=admin).key}")
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(row["user"], row["amount"]) for row in response.data],
+            [(self.user.pk, "25.00"), (other.pk, "0.00"), (999999, None)]
+        )
+
+    @override_settings(BALANCE_CHECKPOINT_EVERY=1)
+    def test_writes_take_checkpoints(self):
+        Deposit.objects.create(user=self.user, amount=Decimal("1.00"))
+        snapshot = BalanceSnapshot.objects.get(user=self.user)
+        self.assertEqual(snapshot.amount, Decimal("26.00"))
+        self.assertEqual(snapshot.last_entry_id, TransactionLog.objects.latest("id").pk)
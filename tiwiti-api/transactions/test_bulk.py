@@ -0,0 +1,96 @@
+import io
+import os
+import tempfile
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import override_settings
+from rest_framework.test import APITestCase
+from rest_framework import status
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from .models import (
+    Deposit,
+    Withdrawal,
+    Balance,
+    TransactionLog
+)
+from decimal import Decimal
+
+User = get_user_model()
+
+class BulkIngestionTestCase(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="bulkuser", password="testpassword")
+        self.other = User.objects.create_user(username="otheruser", password="testpassword")
+        self.admin = User.objects.create_superuser(username="admin", password="adminpass")
+        self.admin_token = Token.objects.create(user=self.admin)
+        self.user_token = Token.objects.create(user=self.user)
+        self.bulk_url = reverse("bulk-transactions")
+
+    def test_non_admin_cannot_post_bulk(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.user_token.key}")
+        response = self.client.post(self.bulk_url, [], format="json")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_bulk_reports_each_item(self):
+        """
+        Valid items are applied, invalid ones are reported without blocking the rest.
+        """
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.admin_token.key}")
+        operations = [
+            {"user": self.user.pk, "type": "deposit", "amount": "100.00"},
+            {"user": self.user.pk, "type": "withdrawal", "amount": "30.00"},
+            {"user": self.user.pk, "type": "withdrawal", "amount": "500.00"},
+            {"user": self.other.pk, "type": "withdrawal", "amount": "1.00"},
+            {"user": 99999, "type": "deposit", "amount": "1.00"},
+            {"user": self.other.pk, "type": "transfer", "amount": "1.00"},
+            {"user": self.other.pk, "type": "deposit", "amount": "-5"},
+            {"user": self.other.pk, "type": "deposit", "amount": "12.50"},
+        ]
+        response = self.client.post(self.bulk_url, {"operations": operations}, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["successful"], 3)
+        self.assertEqual(response.data["failed"], 5)
+        statuses = [result["status"] for result in response.data["results"]]
+        self.assertEqual(statuses, ["successful", "successful", "failed", "failed", "failed", "failed", "failed", "successful"])
+        self.assertEqual(response.data["results"][2]["error"], "Insufficient Balance")
+
+        self.assertEqual(Balance.objects.get(user=self.user).amount, Decimal("70.00"))
+        self.assertEqual(Balance.objects.get(user=self.other).amount, Decimal("12.50"))
+        self.assertEqual(Deposit.objects.count(), 2)
+        self.assertEqual(Withdrawal.objects.count(), 1)
+        self.assertEqual(TransactionLog.objects.filter(deposit_transaction__isnull=False).count(), 2)
+        self.assertEqual(TransactionLog.objects.filter(withdrawal_transaction__isnull=False).count(), 1)
+
+    @override_settings(DATA_UPLOAD_MAX_MEMORY_SIZE=1000)
+    def test_json_batch_over_the_size_cap(self):
+        """A JSON body over DATA_UPLOAD_MAX_MEMORY_SIZE gets a JSON 413, the same batch uploaded as a file goes through"""
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.admin_token.key}")
+        operations = [{"user": self.user.pk, "type": "deposit", "amount": "1.00"}] * 40
+        response = self.client.post(self.bulk_url, operations, format="json", HTTP_IDEMPOTENCY_KEY="big-batch")
+        self.assertEqual(response.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        self.assertIn("multipart", response.json()["Message"])
+        self.assertEqual(Deposit.objects.count(), 0)
+
+        csv = "user,type,amount\n" + f"{self.user.pk},deposit,1.00\n" * 100
+        self.assertGreater(len(csv), 1000)
+        response = self.client.post(self.bulk_url, {"file": SimpleUploadedFile("batch.csv", csv.encode())}, format="multipart")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["successful"], 100)
+
+    def test_ingest_command_reads_csv(self):
+        Balance.objects.create(user=self.user, amount=Decimal("10.00"))
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as settlement:
+            settlement.write("user,type,amount\n")
+            for _ in range(5):
+                settlement.write(f"{self.user.pk},deposit,2.00\n")
+            settlement.write(f"{self.user.pk},withdrawal,15.00\n")
+        self.addCleanup(os.remove, settlement.name)
+
+        call_command("ingest_operations", settlement.name, chunk_size=2, stdout=io.StringIO())
+
+        self.assertEqual(Balance.objects.get(user=self.user).amount, Decimal("5.00"))
+        self.assertEqual(TransactionLog.objects.count(), 6)
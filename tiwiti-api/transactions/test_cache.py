@@ -0,0 +1,114 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase
+from rest_framework.test import APITestCase, APITransactionTestCase
+from rest_framework import status
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from tiwiti_api.caches import default_cache
+from .cache import cached_balance, invalidate_balance
+from .models import (
+    Deposit,
+    Balance
+)
+from decimal import Decimal
+
+User = get_user_model()
+
+class BalanceCacheTestCase(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="cacheuser", password="testpassword")
+        self.balance = Balance.objects.create(user=self.user, amount=Decimal("100.00"))
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+        self.balance_url = reverse("balance")
+
+    def test_second_read_skips_the_balance_query(self):
+        """
+        Once the token and the balance are cached a poll doesn't touch the database.
+        """
+        with self.assertNumQueries(2):
+            self.client.get(self.balance_url)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.balance_url)
+        self.assertEqual(response.data["amount"], "100.00")
+
+    def test_missing_balance_is_not_found(self):
+        self.balance.delete()
+        response = self.client.get(self.balance_url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_reader_racing_a_write_cannot_pin_the_old_balance(self):
+        """
+        A reader that loaded the old row before the write committed may cache it,
+        but only under the version the write has already moved past.
+        """
+        def load_then_write():
+            old = {"amount": "100.00"}
+            Deposit.objects.create(user=self.user, amount=Decimal("5.00"))
+            return old
+
+        self.assertEqual(cached_balance(self.user.pk, load_then_write), {"amount": "100.00"})
+        response = self.client.get(self.balance_url)
+        self.assertEqual(response.data["amount"], "105.00")
+
+
+class BalanceCacheCommitTestCase(APITransactionTestCase):
+    """Runs with real commits so the on-commit invalidation is exercised"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="cacheuser", password="testpassword")
+        Balance.objects.create(user=self.user, amount=Decimal("100.00"))
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+        self.balance_url = reverse("balance")
+
+    def assertFreshBalance(self):
+        response = self.client.get(self.balance_url)
+        self.assertEqual(Decimal(response.data["amount"]), Balance.objects.get(user=self.user).amount)
+
+    def test_never_serves_a_stale_balance_after_a_write(self):
+        self.assertFreshBalance()
+
+        self.client.post(reverse("deposit"), {"amount": "50.00"})
+        self.assertFreshBalance()
+
+        self.client.post(reverse("withdrawal"), {"amount": "20.00"})
+        self.assertFreshBalance()
+
+        # Rejected withdrawal, nothing changes and nothing goes stale
+        self.client.post(reverse("withdrawal"), {"amount": "1000.00"})
+        self.assertFreshBalance()
+
+        # Admin adjustment straight on the row
+        balance = Balance.objects.get(user=self.user)
+        balance.amount = Decimal("7.00")
+        balance.save()
+        self.assertFreshBalance()
+
+        Balance.objects.credit(self.user, Decimal("3.00"))
+        self.assertFreshBalance()
+
+    def test_invalidation_outside_a_transaction(self):
+        self.assertFreshBalance()
+        Balance.objects.filter(user=self.user).update(amount=Decimal("1.00"))
+        invalidate_balance(self.user.pk)
+        self.assertFreshBalance()
+
+
+class DefaultCacheTestCase(SimpleTestCase):
+
+    def test_shared_cache_from_cache_url(self):
+        config = default_cache(False, {"CACHE_URL": "redis://cache:6379/1"})
+        self.assertEqual(config["BACKEND"], "django.core.cache.backends.redis.RedisCache")
+        self.assertEqual(config["LOCATION"], "redis://cache:6379/1")
+
+    def test_per_process_cache_only_with_debug(self):
+        """Other workers would keep a balance invalidated here until it expires"""
+        self.assertIn("LocMemCache", default_cache(True, {})["BACKEND"])
+        with self.assertRaises(ImproperlyConfigured):
+            default_cache(False, {})
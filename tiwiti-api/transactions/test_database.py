@@ -0,0 +1,45 @@
+from pathlib import Path
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+from tiwiti_api.database import database_profile
+
+
+class DatabaseProfileTestCase(SimpleTestCase):
+
+    def test_sqlite_profiles(self):
+        tuned = database_profile(Path("/srv"), {})
+        self.assertEqual(tuned["NAME"], Path("/srv/db.sqlite3"))
+        self.assertIn("PRAGMA journal_mode=WAL", tuned["OPTIONS"]["init_command"])
+        self.assertEqual(tuned["OPTIONS"]["transaction_mode"], "IMMEDIATE")
+        self.assertEqual(tuned["CONN_MAX_AGE"], 60)
+
+        plain = database_profile(Path("/srv"), {"DATABASE_PROFILE": "sqlite-plain", "SQLITE_PATH": "/tmp/x.sqlite3"})
+        self.assertEqual(plain, {"ENGINE": "django.db.backends.sqlite3", "NAME": "/tmp/x.sqlite3"})
+
+    def test_postgres_profiles(self):
+        env = {"DATABASE_PROFILE": "postgres", "POSTGRES_HOST": "db", "DATABASE_CONN_MAX_AGE": "300"}
+        persistent = database_profile(Path("/srv"), env)
+        self.assertEqual((persistent["HOST"], persistent["CONN_MAX_AGE"]), ("db", 300))
+        self.assertTrue(persistent["CONN_HEALTH_CHECKS"])
+        self.assertNotIn("pool", persistent["OPTIONS"])
+
+        pooled = database_profile(Path("/srv"), {**env, "DATABASE_PROFILE": "postgres-pooled", "DATABASE_POOL_MAX": "8"})
+        self.assertEqual(pooled["CONN_MAX_AGE"], 0)
+        self.assertEqual(pooled["OPTIONS"]["pool"]["max_size"], 8)
+
+    def test_unknown_profile(self):
+        with self.assertRaises(ImproperlyConfigured):
+            database_profile(Path("/srv"), {"DATABASE_PROFILE": "oracle"})
+
+
+class SQLitePragmaTestCase(TestCase):
+
+    def test_connection_runs_the_pragmas(self):
+        if connection.vendor != "sqlite" or not connection.settings_dict["OPTIONS"].get("init_command"):
+            self.skipTest("Not on the tuned SQLite profile")
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA synchronous")
+            self.assertEqual(cursor.fetchone()[0], 1)
+            cursor.execute("PRAGMA busy_timeout")
+            self.assertEqual(cursor.fetchone()[0], 20000)
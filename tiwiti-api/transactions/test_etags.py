@@ -0,0 +1,122 @@
+from django.contrib.auth import get_user_model
+from rest_framework.test import APITestCase
+from rest_framework import status
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from . import outbox
+from .bulk import ingest_operations
+from .cache import TOTALS, ledger_version
+from .models import (
+    Deposit,
+    Balance,
+    TotalBalance,
+    TransactionLog
+)
+from decimal import Decimal
+
+User = get_user_model()
+
+
+class ETagTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="etaguser", password="testpassword")
+        self.admin = User.objects.create_superuser(username="etagadmin", password="adminpass")
+        Balance.objects.create(user=self.user, amount=Decimal("0.00"))
+        Deposit.objects.create(user=self.user, amount=Decimal("50.00"))
+        self.login(self.user)
+
+    def login(self, user):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {Token.objects.get_or_create(user=user)[0].key}")
+
+    def assertNotModified(self, name, if_none_match, params=None):
+        response = self.client.get(reverse(name), params or {}, HTTP_IF_NONE_MATCH=if_none_match)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.content, b"")
+        self.assertIn(response["ETag"], if_none_match)
+
+    def test_balance_not_modified_without_queries(self):
+        response = self.client.get(reverse("balance"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response["ETag"]
+        self.assertIn("no-cache", response["Cache-Control"])
+        self.assertIn("private", response["Cache-Control"])
+
+        with self.assertNumQueries(0):
+            self.assertNotModified("balance", etag)
+        self.assertNotModified("balance", f"W/{etag}")
+        self.assertNotModified("balance", f'"other", {etag}')
+        self.assertEqual(self.client.get(reverse("balance"), HTTP_IF_NONE_MATCH='"other"').status_code, status.HTTP_200_OK)
+
+    def test_writes_change_the_etag(self):
+        etag = self.client.get(reverse("balance"))["ETag"]
+        Deposit.objects.create(user=self.user, amount=Decimal("5.00"))
+        response = self.client.get(reverse("balance"), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["amount"], "55.00")
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_etags_are_per_user(self):
+        other = User.objects.create_user(username="etagother", password="testpassword")
+        Balance.objects.create(user=other, amount=Decimal("0.00"))
+        etag = self.client.get(reverse("balance"))["ETag"]
+        self.login(other)
+        self.assertEqual(self.client.get(reverse("balance"), HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_200_OK)
+
+    def test_past_balances_have_no_etag(self):
+        response = self.client.get(reverse("balance"), {"as_of": "2030-01-01"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn("ETag", response)
+
+    def test_total_balance(self):
+        self.login(self.admin)
+        etag = self.client.get(reverse("total-balance"))["ETag"]
+        with self.assertNumQueries(0):
+            self.assertNotModified("total-balance", etag)
+
+        Deposit.objects.create(user=self.user, amount=Decimal("1.00"))
+        etag = self.client.get(reverse("total-balance"), HTTP_IF_NONE_MATCH=etag)["ETag"]
+        TotalBalance.recalculate()
+        self.assertEqual(self.client.get(reverse("total-balance"), HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_200_OK)
+
+    def test_transaction_history_first_page(self):
+        etag = self.client.get(reverse("transaction-history"))["ETag"]
+        with self.assertNumQueries(0):
+            self.assertNotModified("transaction-history", etag)
+
+        # Another URL or representation, another ETag
+        for params in ({"page": 1}, {"pagination": "cursor"}):
+            other = self.client.get(reverse("transaction-history"), params)["ETag"]
+            self.assertNotEqual(other, etag)
+            self.assertNotModified("transaction-history", other, params)
+        self.assertNotIn("ETag", self.client.get(reverse("transaction-history"), {"page": 2}))
+
+        # Entries logged outside a deposit or withdrawal count too
+        TransactionLog.objects.create(type="refund", user=self.user, amount=Decimal("1.00"), status="pending")
+        response = self.client.get(reverse("transaction-history"), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["count"], 2)
+
+    def test_outbox_writes_bump_the_version(self):
+        """Write-behind entries land after the deposit committed, the history ETag has to move again"""
+        version = ledger_version(self.user.pk)
+        outbox.write([{"type": "refund", "user_id": self.user.pk, "amount": Decimal("1.00"), "status": "pending"}])
+        self.assertNotEqual(ledger_version(self.user.pk), version)
+
+        version = ledger_version(TOTALS)
+        TotalBalance.apply_delta(deposits=Decimal("1.00"))
+        self.assertNotEqual(ledger_version(TOTALS), version)
+
+    def test_bulk_entries_that_net_out(self):
+        """The balance is unchanged but the history and stats aren't"""
+        history = self.client.get(reverse("transaction-history"))["ETag"]
+        stats = self.client.get(reverse("user-stats"))["ETag"]
+        ingest_operations([
+            {"user": self.user.pk, "type": "deposit", "amount": "5.00"},
+            {"user": self.user.pk, "type": "withdrawal", "amount": "5.00"},
+        ])
+        response = self.client.get(reverse("transaction-history"), HTTP_IF_NONE_MATCH=history)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["count"], 3)
+        response = self.client.get(reverse("user-stats"), HTTP_IF_NONE_MATCH=stats)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["transaction_count"], 3)
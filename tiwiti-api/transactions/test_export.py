@@ -0,0 +1,87 @@
+import csv
+import io
+import json
+from datetime import timedelta
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from rest_framework import status
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from .models import (
+    Deposit,
+    Withdrawal,
+    Balance,
+    TransactionLog
+)
+from .serializers import TransactionLogSerializer
+from decimal import Decimal
+
+User = get_user_model()
+
+class TransactionExportTestCase(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="exportuser", password="testpassword")
+        self.other = User.objects.create_user(username="otheruser", password="testpassword")
+        self.admin = User.objects.create_superuser(username="admin", password="adminpass")
+        Balance.objects.create(user=self.user, amount=Decimal("100.00"))
+        Deposit.objects.create(user=self.user, amount=Decimal("10.00"))
+        Withdrawal.objects.create(user=self.user, amount=Decimal("5.50"))
+        Deposit.objects.create(user=self.other, amount=Decimal("7.00"))
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {Token.objects.create(user=self.user).key}")
+        self.export_url = reverse("transaction-export")
+        self.admin_export_url = reverse("transaction-export-all")
+
+    def read(self, response):
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return b"".join(response.streaming_content).decode()
+
+    def test_csv_export_of_own_history(self):
+        response = self.client.get(self.export_url)
+        self.assertEqual(response["Content-Type"], "text/csv; charset=utf-8")
+        rows = list(csv.DictReader(io.StringIO(self.read(response))))
+
+        self.assertEqual([(row["type"], row["amount"]) for row in rows], [("deposit", "10.00"), ("withdrawal", "5.50")])
+        self.assertEqual({row["user"] for row in rows}, {str(self.user.pk)})
+        self.assertEqual(rows[0]["withdrawal_transaction"], "")
+
+    def test_ndjson_matches_the_history_endpoint(self):
+        """
+        Each NDJSON line carries the same values as TransactionLogSerializer, plus the entry id.
+        """
+        response = self.client.get(self.export_url, {"format": "ndjson"})
+        self.assertEqual(response["Content-Type"], "application/x-ndjson; charset=utf-8")
+        lines = [json.loads(line) for line in self.read(response).splitlines()]
+
+        logs = TransactionLog.objects.filter(user=self.user).order_by("updated_at", "id")
+        expected = [{"id": log.pk, **TransactionLogSerializer(log).data} for log in logs]
+        self.assertEqual(lines, expected)
+
+    def test_date_range(self):
+        TransactionLog.objects.filter(type="deposit").update(updated_at=timezone.now() - timedelta(days=3))
+        yesterday = (timezone.localtime() - timedelta(days=1)).date().isoformat()
+
+        rows = list(csv.DictReader(io.StringIO(self.read(self.client.get(self.export_url, {"start": yesterday})))))
+        self.assertEqual([row["type"] for row in rows], ["withdrawal"])
+        rows = list(csv.DictReader(io.StringIO(self.read(self.client.get(self.export_url, {"end": yesterday})))))
+        self.assertEqual([row["type"] for row in rows], ["deposit"])
+
+        response = self.client.get(self.export_url, {"start": "soon"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_admin_export(self):
+        response = self.client.get(self.admin_export_url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {Token.objects.create(user=self.admin).key}")
+        rows = list(csv.DictReader(io.StringIO(self.read(self.client.get(self.admin_export_url)))))
+        self.assertEqual(len(rows), 3)
+
+        rows = list(csv.DictReader(io.StringIO(self.read(self.client.get(self.admin_export_url, {"user": self.other.pk})))))
+        self.assertEqual([(row["user"], row["amount"]) for row in rows], [(str(self.other.pk), "7.00")])
+
+    def test_requires_authentication(self):
+        self.client.credentials()
+        response = self.client.get(self.export_url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
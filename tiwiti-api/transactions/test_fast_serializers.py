@@ -0,0 +1,75 @@
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase
+from rest_framework import status
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from .fast_serializers import fast_serializer
+from .models import (
+    Deposit,
+    Withdrawal,
+    Balance,
+    PersonalUsage,
+    TransactionLog
+)
+from .serializers import DepositSerializer, PersonalUsageSerializer, TransactionLogSerializer
+from .views import DepositAPIView, PersonalUsageAPIView, TransactionLogAPIView
+from decimal import Decimal
+
+User = get_user_model()
+
+
+class FastSerializerTestCase(APITestCase):
+    """The fast list path has to render exactly the bytes the ModelSerializers do"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="fastuser", password="testpassword")
+        self.admin = User.objects.create_superuser(username="fastadmin", password="adminpass")
+        Balance.objects.create(user=self.user, amount=Decimal("0.00"))
+        for amount in ("0.01", "10", "1234567.5", "99999999.99"):
+            Deposit.objects.create(user=self.user, amount=Decimal(amount))
+        Withdrawal.objects.create(user=self.user, amount=Decimal("3.30"))
+        TransactionLog.objects.create(type="refund", user=self.user, amount=Decimal("1.00"), status="pending")
+        PersonalUsage.objects.create(user=self.admin, amount=Decimal("7.25"), description="Naira fees ₦ \"quoted\"")
+        PersonalUsage.objects.create(user=self.admin, type="refund", amount=Decimal("2.00"), description=None)
+
+    def assertSameBytes(self, serializer_class, queryset):
+        fast = fast_serializer(serializer_class)
+        expected = JSONRenderer().render(serializer_class(queryset, many=True).data)
+        self.assertEqual(JSONRenderer().render(fast.serialize(queryset.values_list(*fast.columns()))), expected)
+
+    def test_same_output_as_the_model_serializers(self):
+        for serializer_class, queryset in (
+            (TransactionLogSerializer, TransactionLog.objects.order_by("id")),
+            (DepositSerializer, Deposit.objects.order_by("id")),
+            (PersonalUsageSerializer, PersonalUsage.objects.order_by("id")),
+        ):
+            self.assertSameBytes(serializer_class, queryset)
+            with timezone.override("Africa/Lagos"):
+                self.assertSameBytes(serializer_class, queryset)
+
+    def test_list_endpoints_render_the_same_pages(self):
+        requests = [
+            (self.user, "transaction-history", TransactionLogAPIView, {}),
+            (self.user, "transaction-history", TransactionLogAPIView, {"pagination": "cursor"}),
+            (self.user, "deposit", DepositAPIView, {"page": 1}),
+            (self.admin, "personal-usage", PersonalUsageAPIView, {}),
+        ]
+        for user, name, view, params in requests:
+            self.client.credentials(HTTP_AUTHORIZATION=f"Token {Token.objects.get_or_create(user=user)[0].key}")
+            fast = self.client.get(reverse(name), params)
+            with mock.patch.object(view, "fast_list", False):
+                slow = self.client.get(reverse(name), params)
+            self.assertEqual(fast.status_code, status.HTTP_200_OK)
+            self.assertEqual(fast.content, slow.content)
+
+    def test_cursor_pages_follow_on(self):
+        """Keyset pagination reads its position off the named rows"""
+        for _ in range(12):
+            Deposit.objects.create(user=self.user, amount=Decimal("1.00"))
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {Token.objects.create(user=self.user).key}")
+        first = self.client.get(reverse("transaction-history"), {"pagination": "cursor"})
+        second = self.client.get(first.data["next"])
+        self.assertEqual(len(first.data["results"]) + len(second.data["results"]), 18)
@@ -0,0 +1,99 @@
+from datetime import datetime, timezone as dt_timezone
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+from rest_framework import status
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from .management.commands.explain_endpoints import HISTORY_FILTERS, explain, full_scans
+from .models import TransactionLog
+from decimal import Decimal
+
+User = get_user_model()
+
+
+class HistoryFilterTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="filteruser", password="testpassword")
+        other = User.objects.create_user(username="filterother", password="testpassword")
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {Token.objects.create(user=self.user).key}")
+
+        entries = [
+            ("deposit", "successful", "500.00", datetime(2026, 2, 27, tzinfo=dt_timezone.utc)),
+            ("withdrawal", "successful", "12000.00", datetime(2026, 3, 1, tzinfo=dt_timezone.utc)),
+            ("withdrawal", "failed", "15000.00", datetime(2026, 3, 10, tzinfo=dt_timezone.utc)),
+            ("withdrawal", "successful", "9000.00", datetime(2026, 3, 20, tzinfo=dt_timezone.utc)),
+            ("deposit", "successful", "20000.00", datetime(2026, 3, 25, tzinfo=dt_timezone.utc)),
+            ("withdrawal", "successful", "11000.00", datetime(2026, 4, 1, tzinfo=dt_timezone.utc)),
+        ]
+        for kind, entry_status, amount, moment in entries:
+            for owner in (self.user, other):
+                entry = TransactionLog.objects.create(type=kind, user=owner, amount=Decimal(amount), status=entry_status)
+                # updated_at is auto_now, date the entry afterwards
+                TransactionLog.objects.filter(pk=entry.pk).update(updated_at=moment)
+
+    def amounts(self, params):
+        response = self.client.get(reverse("transaction-history"), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.content)
+        return [entry["amount"] for entry in response.data["results"]]
+
+    def test_withdrawals_in_march_over_10000(self):
+        params = {"type": "withdrawal", "start": "2026-03-01", "end": "2026-03-31", "min_amount": "10000"}
+        self.assertEqual(self.amounts(params), ["15000.00", "12000.00"])
+        self.assertEqual(self.amounts({**params, "status": "successful"}), ["12000.00"])
+
+    def test_filters(self):
+        self.assertEqual(self.amounts({"type": "deposit"}), ["20000.00", "500.00"])
+        self.assertEqual(self.amounts({"status": "failed"}), ["15000.00"])
+        self.assertEqual(self.amounts({"start": "2026-03-25T00:00:00Z"}), ["11000.00", "20000.00"])
+        self.assertEqual(self.amounts({"end": "2026-02-27"}), ["500.00"])
+        self.assertEqual(self.amounts({"min_amount": "9000", "max_amount": "12000"}), ["11000.00", "9000.00", "12000.00"])
+
+    def test_ordering(self):
+        self.assertEqual(self.amounts({"ordering": "-amount", "max_amount": "12000"}), ["12000.00", "11000.00", "9000.00", "500.00"])
+        self.assertEqual(self.amounts({"ordering": "amount"})[:2], ["500.00", "9000.00"])
+        self.assertEqual(self.amounts({"ordering": "updated_at"})[0], "500.00")
+
+    def test_cursor_pages_in_amount_order(self):
+        for _ in range(12):
+            TransactionLog.objects.create(type="deposit", user=self.user, amount=Decimal("9000.00"), status="successful")
+        first = self.client.get(reverse("transaction-history"), {"pagination": "cursor", "ordering": "-amount"})
+        second = self.client.get(first.data["next"])
+        amounts = [Decimal(entry["amount"]) for entry in first.data["results"] + second.data["results"]]
+        self.assertEqual(len(amounts), 18)
+        self.assertEqual(amounts, sorted(amounts, reverse=True))
+        back = self.client.get(second.data["previous"])
+        self.assertEqual(back.data["results"], first.data["results"])
+
+    def test_invalid_filters(self):
+        for params in (
+            {"type": "bonus"},
+            {"status": "done"},
+            {"start": "March"},
+            {"min_amount": "lots"},
+            {"max_amount": "NaN"},
+            {"ordering": "user"},
+        ):
+            response = self.client.get(reverse("transaction-history"), params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, params)
+            self.assertIn("Message", response.data)
+
+    def test_every_filter_is_index_backed(self):
+        """
+        No filter reads the log without an index. Whether sorting a range
+        beats walking an index depends on the data, explain_endpoints
+        checks the sorts on a seeded dataset.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        for params in HISTORY_FILTERS:
+            for query in (params, {**params, "pagination": "cursor"}):
+                with CaptureQueriesContext(connection) as captured:
+                    self.client.get(reverse("transaction-history"), query)
+                for sql in (entry["sql"] for entry in captured.captured_queries):
+                    if sql.startswith("SELECT") and "transactions_transactionlog" in sql:
+                        plan = explain(connection, sql, ())
+                        scans = [line for line in full_scans(connection.vendor, plan) if "B-TREE" not in line]
+                        self.assertEqual(scans, [], f"{query}: {sql}")
+                        self.assertTrue(any("INDEX" in line and "(user_id=?" in line for line in plan), plan)
@@ -0,0 +1,140 @@
+from datetime import timedelta
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from rest_framework import status
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from .idempotency import _owned, fingerprint, purge_expired_keys
+from .models import (
+    Deposit,
+    Withdrawal,
+    Balance,
+    TransactionLog,
+    IdempotencyKey
+)
+from decimal import Decimal
+
+User = get_user_model()
+
+class IdempotencyKeyTestCase(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="retryuser", password="testpassword")
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+        self.deposit_url = reverse("deposit")
+        self.withdraw_url = reverse("withdrawal")
+
+    def post(self, url, data, key):
+        return self.client.post(url, data, format="json", HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_replays_the_original_response(self):
+        """
+        A retried deposit returns the first response and moves no money.
+        """
+        first = self.post(self.deposit_url, {"amount": "50.00"}, "deposit-1")
+        retry = self.post(self.deposit_url, {"amount": "50.00"}, "deposit-1")
+
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.data, first.data)
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        self.assertEqual(Deposit.objects.count(), 1)
+        self.assertEqual(TransactionLog.objects.count(), 1)
+        self.assertEqual(Balance.objects.get(user=self.user).amount, Decimal("50.00"))
+
+    def test_requests_without_a_key_are_not_deduplicated(self):
+        self.client.post(self.deposit_url, {"amount": "5.00"})
+        self.client.post(self.deposit_url, {"amount": "5.00"})
+        self.assertEqual(Deposit.objects.count(), 2)
+        self.assertEqual(IdempotencyKey.objects.count(), 0)
+
+    def test_key_reused_for_a_different_request_is_refused(self):
+        self.post(self.deposit_url, {"amount": "50.00"}, "key")
+        response = self.post(self.deposit_url, {"amount": "60.00"}, "key")
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+        response = self.post(self.withdraw_url, {"amount": "50.00"}, "key")
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(Deposit.objects.count(), 1)
+
+    def test_keys_are_scoped_per_user(self):
+        self.post(self.deposit_url, {"amount": "50.00"}, "shared")
+
+        other = User.objects.create_user(username="otheruser", password="testpassword")
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {Token.objects.create(user=other).key}")
+        response = self.post(self.deposit_url, {"amount": "50.00"}, "shared")
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertNotIn("Idempotent-Replayed", response)
+        self.assertEqual(Deposit.objects.count(), 2)
+
+    def test_failed_request_releases_the_key(self):
+        """
+        A rejected withdrawal isn't remembered, the same key works once it can succeed.
+        """
+        response = self.post(self.withdraw_url, {"amount": "30.00"}, "withdraw-1")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(IdempotencyKey.objects.count(), 0)
+
+        Deposit.objects.create(user=self.user, amount=Decimal("100.00"))
+        response = self.post(self.withdraw_url, {"amount": "30.00"}, "withdraw-1")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Withdrawal.objects.count(), 1)
+
+    def test_duplicate_waits_for_the_first_request(self):
+        """
+        A duplicate arriving while the first request runs gets its response once it finishes.
+        """
+        request = self.client.post(self.deposit_url, {"amount": "50.00"}, format="json").wsgi_request
+        record = IdempotencyKey.objects.create(user=self.user, key="in-flight", fingerprint=fingerprint(request))
+
+        def first_request_finishes(delay):
+            IdempotencyKey.objects.filter(pk=record.pk).update(status_code=201, response={"amount": "50.00"})
+
+        with mock.patch("transactions.idempotency.time.sleep", side_effect=first_request_finishes) as sleep:
+            response = self.post(self.deposit_url, {"amount": "50.00"}, "in-flight")
+
+        sleep.assert_called_once()
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data, {"amount": "50.00"})
+        self.assertEqual(Deposit.objects.count(), 1)
+
+    @override_settings(IDEMPOTENCY_WAIT_TIMEOUT=0)
+    def test_duplicate_gives_up_on_a_stuck_request(self):
+        request = self.client.post(self.deposit_url, {"amount": "50.00"}, format="json").wsgi_request
+        IdempotencyKey.objects.create(user=self.user, key="stuck", fingerprint=fingerprint(request))
+
+        response = self.post(self.deposit_url, {"amount": "50.00"}, "stuck")
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+    def test_retry_takes_over_an_abandoned_request(self):
+        request = self.client.post(self.deposit_url, {"amount": "50.00"}, format="json").wsgi_request
+        abandoned = IdempotencyKey.objects.create(user=self.user, key="abandoned", fingerprint=fingerprint(request))
+        IdempotencyKey.objects.filter(pk=abandoned.pk).update(created_at=timezone.now() - timedelta(minutes=5))
+
+        response = self.post(self.deposit_url, {"amount": "50.00"}, "abandoned")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Deposit.objects.count(), 2)
+        record = IdempotencyKey.objects.get(key="abandoned")
+        self.assertEqual(record.status_code, status.HTTP_201_CREATED)
+
+        # The abandoned request finishing late no longer owns the key
+        self.assertEqual(_owned(abandoned).update(status_code=201), 0)
+        response = self.post(self.deposit_url, {"amount": "50.00"}, "abandoned")
+        self.assertEqual(response["Idempotent-Replayed"], "true")
+        self.assertEqual(Deposit.objects.count(), 2)
+
+    def test_expired_keys_are_purged_and_reusable(self):
+        self.post(self.deposit_url, {"amount": "50.00"}, "old")
+        IdempotencyKey.objects.update(created_at=timezone.now() - timedelta(days=2))
+
+        response = self.post(self.deposit_url, {"amount": "50.00"}, "old")
+        self.assertNotIn("Idempotent-Replayed", response)
+        self.assertEqual(Deposit.objects.count(), 2)
+
+        IdempotencyKey.objects.update(created_at=timezone.now() - timedelta(days=2))
+        self.assertEqual(purge_expired_keys(), 1)
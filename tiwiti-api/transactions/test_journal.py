@@ -0,0 +1,125 @@
+import io
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+from rest_framework import status
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from .bulk import ingest_operations
+from .models import (
+    Deposit,
+    Withdrawal,
+    Balance,
+    BalanceSnapshot,
+    TransactionLog
+)
+from decimal import Decimal
+
+User = get_user_model()
+
+@override_settings(LEDGER_MODE="journal", JOURNAL_SNAPSHOT_EVERY=3)
+class JournalLedgerTestCase(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="journaluser", password="testpassword")
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+        self.balance_url = reverse("balance")
+        self.withdrawal_url = reverse("withdrawal")
+
+    def test_deposit_is_insert_only(self):
+        """
+        A journal deposit inserts its rows and updates no balance.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            Deposit.objects.create(user=self.user, amount=Decimal("50.00"))
+        self.assertFalse([q for q in queries if q["sql"].startswith("UPDATE") and '"transactions_balance"' in q["sql"]])
+        self.assertFalse(Balance.objects.filter(user=self.user).exists())
+
+        response = self.client.get(self.balance_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["amount"], "50.00")
+        self.assertEqual(response.data["user"], self.user.pk)
+
+    def test_no_journal_is_not_found(self):
+        response = self.client.get(self.balance_url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_withdrawal_is_checked_against_the_journal(self):
+        Deposit.objects.create(user=self.user, amount=Decimal("30.00"))
+
+        response = self.client.post(self.withdrawal_url, {"amount": "40.00"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data["Message"], "Insufficient Balance")
+
+        response = self.client.post(self.withdrawal_url, {"amount": "20.00"})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.client.get(self.balance_url).data["amount"], "10.00")
+
+    def test_snapshot_every_n_entries(self):
+        """
+        Reading a tail of JOURNAL_SNAPSHOT_EVERY entries folds it into a snapshot.
+        """
+        for _ in range(3):
+            Deposit.objects.create(user=self.user, amount=Decimal("10.00"))
+        self.assertEqual(self.client.get(self.balance_url).data["amount"], "30.00")
+
+        snapshot = BalanceSnapshot.objects.get(user=self.user)
+        self.assertEqual(snapshot.amount, Decimal("30.00"))
+        self.assertEqual(snapshot.last_entry_id, TransactionLog.objects.latest("id").pk)
+
+        Withdrawal.objects.create(user=self.user, amount=Decimal("5.00"))
+        self.assertEqual(self.client.get(self.balance_url).data["amount"], "25.00")
+        self.assertEqual(BalanceSnapshot.objects.count(), 1)
+
+    @override_settings(JOURNAL_SNAPSHOT_INTERVAL=0)
+    def test_snapshot_after_interval(self):
+        Deposit.objects.create(user=self.user, amount=Decimal("10.00"))
+        self.client.get(self.balance_url)
+        self.assertEqual(BalanceSnapshot.objects.get(user=self.user).amount, Decimal("10.00"))
+
+    def test_saved_balance_restarts_the_journal(self):
+        """
+        Setting a Balance directly (an admin adjustment) is a snapshot the journal carries on from.
+        """
+        Deposit.objects.create(user=self.user, amount=Decimal("10.00"))
+        Balance.objects.create(user=self.user, amount=Decimal("100.00"))
+        Deposit.objects.create(user=self.user, amount=Decimal("5.00"))
+        self.assertEqual(self.client.get(self.balance_url).data["amount"], "105.00")
+
+    def test_bulk_ingestion_uses_the_journal(self):
+        Deposit.objects.create(user=self.user, amount=Decimal("10.00"))
+        results = ingest_operations([
+            {"user": self.user.pk, "type": "withdrawal", "amount": "8.00"},
+            {"user": self.user.pk, "type": "withdrawal", "amount": "8.00"},
+        ])
+        self.assertEqual([r["status"] for r in results], ["successful", "failed"])
+        self.assertEqual(results[1]["error"], "Insufficient Balance")
+        self.assertEqual(self.client.get(self.balance_url).data["amount"], "2.00")
+
+
+class SnapshotBalancesCommandTestCase(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="switchuser", password="testpassword")
+        Balance.objects.create(user=self.user, amount=Decimal("100.00"))
+        Deposit.objects.create(user=self.user, amount=Decimal("20.00"))
+
+    def test_switching_modes_keeps_the_balance(self):
+        """
+        Snapshots taken in balance mode carry the balance over to journal mode, and --write-balances back.
+        """
+        call_command("snapshot_balances", stdout=io.StringIO())
+
+        with override_settings(LEDGER_MODE="journal"):
+            self.assertEqual(BalanceSnapshot.objects.current(self.user).amount, Decimal("120.00"))
+            Withdrawal.objects.create(user=self.user, amount=Decimal("70.00"))
+            call_command("snapshot_balances", "--write-balances", stdout=io.StringIO())
+
+        self.assertEqual(Balance.objects.get(user=self.user).amount, Decimal("50.00"))
@@ -0,0 +1,177 @@
+import importlib
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from .models import (
+    Deposit,
+    Withdrawal,
+    Balance,
+    TransactionLog,
+    TotalBalance,
+    PersonalUsage,
+    InsufficientFundsError
+)
+from decimal import Decimal
+
+User = get_user_model()
+
+class LedgerMutationTestCase(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="ledgeruser", password="testpassword")
+
+    def test_first_deposit_creates_balance(self):
+        """
+        A deposit for a user without a balance row creates it with the deposited amount.
+        """
+        Deposit.objects.create(user=self.user, amount=Decimal("25.50"))
+        self.assertEqual(Balance.objects.get(user=self.user).amount, Decimal("25.50"))
+
+    def test_resaving_deposit_does_not_credit_twice(self):
+        """
+        Only the insert of a deposit moves money.
+        """
+        deposit = Deposit.objects.create(user=self.user, amount=Decimal("10.00"))
+        deposit.save()
+        self.assertEqual(Balance.objects.get(user=self.user).amount, Decimal("10.00"))
+        self.assertEqual(TransactionLog.objects.count(), 1)
+
+    def test_insufficient_withdrawal_raises(self):
+        """
+        A withdrawal the balance can't cover raises and leaves no trace.
+        """
+        Balance.objects.create(user=self.user, amount=Decimal("5.00"))
+
+        with self.assertRaises(InsufficientFundsError):
+            Withdrawal.objects.create(user=self.user, amount=Decimal("5.01"))
+
+        self.assertEqual(Balance.objects.get(user=self.user).amount, Decimal("5.00"))
+        self.assertEqual(Withdrawal.objects.count(), 0)
+        self.assertEqual(TransactionLog.objects.count(), 0)
+
+    def test_withdrawal_without_balance_raises(self):
+        with self.assertRaisesMessage(InsufficientFundsError, "No Balance Record found for this user"):
+            Withdrawal.objects.create(user=self.user, amount=Decimal("1.00"))
+
+    def test_withdrawal_can_empty_balance(self):
+        Balance.objects.create(user=self.user, amount=Decimal("5.00"))
+        Withdrawal.objects.create(user=self.user, amount=5)
+        self.assertEqual(Balance.objects.get(user=self.user).amount, Decimal("0.00"))
+
+    def test_deposit_is_a_single_balance_statement(self):
+        """
+        An existing balance is credited with one UPDATE, no read beforehand.
+        """
+        Balance.objects.create(user=self.user, amount=Decimal("1.00"))
+        with self.assertNumQueries(1):
+            Balance.objects.credit(self.user, Decimal("2.00"))
+        self.assertEqual(Balance.objects.get(user=self.user).amount, Decimal("3.00"))
+
+
+class TotalBalanceTestCase(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="totaluser", password="testpassword")
+        self.admin = User.objects.create_superuser(username="admin", password="adminpass")
+
+    def assertTotals(self, deposits, withdrawals, usage):
+        total = TotalBalance.current()
+        self.assertEqual(total.total_deposits, Decimal(deposits))
+        self.assertEqual(total.total_withdrawals, Decimal(withdrawals))
+        self.assertEqual(total.personal_usage, Decimal(usage))
+        self.assertEqual(total.displayed_total_balance, Decimal(deposits) - Decimal(withdrawals))
+        self.assertEqual(total.admin_total_balance, Decimal(deposits) - Decimal(withdrawals) - Decimal(usage))
+
+    def test_ledger_events_move_totals(self):
+        """
+        Deposits, withdrawals, deductions and refunds all keep the totals current.
+        """
+        Deposit.objects.create(user=self.user, amount=Decimal("100.00"))
+        Withdrawal.objects.create(user=self.user, amount=Decimal("30.00"))
+        self.assertTotals("100.00", "30.00", "0.00")
+
+        usage = PersonalUsage.objects.create(user=self.admin, type="deduction", amount=Decimal("20.00"))
+        PersonalUsage.objects.create(user=self.admin, type="refund", amount=Decimal("5.00"))
+        self.assertTotals("100.00", "30.00", "15.00")
+
+        usage.amount = Decimal("25.00")
+        usage.save()
+        self.assertTotals("100.00", "30.00", "20.00")
+
+        usage.delete()
+        self.assertTotals("100.00", "30.00", "-5.00")
+
+    def test_deduction_beyond_deposits_is_rolled_back(self):
+        Deposit.objects.create(user=self.user, amount=Decimal("10.00"))
+
+        with self.assertRaises(ValueError):
+            PersonalUsage.objects.create(user=self.admin, type="deduction", amount=Decimal("10.00"))
+
+        self.assertEqual(PersonalUsage.objects.count(), 0)
+        self.assertTotals("10.00", "0.00", "0.00")
+
+    def test_deposit_does_not_aggregate_history(self):
+        """
+        Updating the totals is a single statement whatever the history size.
+        """
+        Deposit.objects.create(user=self.user, amount=Decimal("1.00"))
+        with self.assertNumQueries(1):
+            TotalBalance.apply_delta(deposits=Decimal("2.00"), user_id=self.user.pk)
+
+    def test_recalculate_matches_incremental_totals(self):
+        Deposit.objects.create(user=self.user, amount=Decimal("50.00"))
+        Withdrawal.objects.create(user=self.user, amount=Decimal("20.00"))
+        PersonalUsage.objects.create(user=self.admin, type="deduction", amount=Decimal("5.00"))
+        TotalBalance.objects.update(admin_total_balance=Decimal("0.00"))
+
+        TotalBalance.recalculate()
+        self.assertTotals("50.00", "20.00", "5.00")
+
+    @override_settings(TOTAL_BALANCE_SHARDS=4)
+    def test_totals_are_summed_over_shards(self):
+        """
+        Writers spread over the shard rows, reads add them back up.
+        """
+        for user_id in range(8):
+            TotalBalance.apply_delta(deposits=Decimal("10.00"), withdrawals=Decimal("1.00"), user_id=user_id)
+
+        self.assertEqual(TotalBalance.objects.count(), 4)
+        self.assertEqual(set(TotalBalance.objects.values_list("shard", flat=True)), {0, 1, 2, 3})
+        self.assertTotals("80.00", "8.00", "0.00")
+
+    @override_settings(TOTAL_BALANCE_SHARDS=1)
+    def test_single_shard(self):
+        for user_id in range(3):
+            TotalBalance.apply_delta(deposits=Decimal("5.00"), user_id=user_id)
+        TotalBalance.apply_delta(deposits=Decimal("5.00"))
+
+        self.assertEqual(TotalBalance.objects.count(), 1)
+        self.assertTotals("20.00", "0.00", "0.00")
+
+    @override_settings(TOTAL_BALANCE_SHARDS=4)
+    def test_deduction_checks_every_shard(self):
+        TotalBalance.apply_delta(deposits=Decimal("10.00"), user_id=1)
+        TotalBalance.apply_delta(deposits=Decimal("10.00"), user_id=2)
+
+        # Shard 0 holds no deposits, the deduction is still covered by the others
+        TotalBalance.apply_delta(personal_usage=Decimal("15.00"), user_id=0)
+        self.assertTotals("20.00", "0.00", "15.00")
+
+        with self.assertRaises(ValueError):
+            TotalBalance.apply_delta(personal_usage=Decimal("5.00"), user_id=0)
+
+    def test_shard_migration_recalculates_the_totals(self):
+        """
+        The pre-shard row only ever saw personal usage, 0005 rebuilds it from
+        the history before apply_delta() starts moving it
+        """
+        migration = importlib.import_module("transactions.migrations.0005_totalbalance_shard")
+        Deposit.objects.create(user=self.user, amount=Decimal("50.00"))
+        Withdrawal.objects.create(user=self.user, amount=Decimal("20.00"))
+        TotalBalance.objects.all().delete()
+        TotalBalance.objects.create(shard=0, total_deposits=Decimal("3.00"), admin_total_balance=Decimal("3.00"))
+
+        migration.recalculate_totals(apps, None)
+        self.assertTotals("50.00", "20.00", "0.00")
+        Deposit.objects.create(user=self.user, amount=Decimal("5.00"))
+        self.assertTotals("55.00", "20.00", "0.00")
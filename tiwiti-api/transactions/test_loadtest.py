@@ -0,0 +1,24 @@
+from django.test import SimpleTestCase
+from .loadtest import parse_mix, summarize
+
+
+class LoadTestTestCase(SimpleTestCase):
+
+    def test_parse_mix(self):
+        self.assertEqual(parse_mix("deposit=1, balance=3"), {"deposit": 1, "balance": 3})
+        for mix in ("refund=1", "deposit=x", "deposit=0", "deposit=-1"):
+            with self.assertRaises(ValueError):
+                parse_mix(mix)
+
+    def test_summary_per_endpoint_and_overall(self):
+        samples = {
+            "balance": [(float(ms), 200) for ms in range(1, 101)],
+            "deposit": [(50.0, 201), (70.0, 400)],
+        }
+        summary = summarize(samples, elapsed=2.0)
+
+        self.assertEqual(summary["balance"]["p50"], 51.0)
+        self.assertEqual(summary["balance"]["p99"], 100.0)
+        self.assertEqual(summary["balance"]["throughput"], 50.0)
+        self.assertEqual(summary["deposit"]["errors"], 1)
+        self.assertEqual((summary["all"]["requests"], summary["all"]["errors"]), (102, 1))
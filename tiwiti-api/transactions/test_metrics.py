@@ -0,0 +1,110 @@
+import os
+import tempfile
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase
+from rest_framework.test import APITestCase
+from rest_framework import status
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from tiwiti_api import metrics
+from .metrics import LEDGER_ENTRIES, REJECTED_WITHDRAWALS, TOTAL_BALANCE_RECALCULATIONS
+from .models import (
+    Balance,
+    TotalBalance
+)
+from decimal import Decimal
+
+User = get_user_model()
+
+
+class MetricsStoreTestCase(SimpleTestCase):
+
+    def tearDown(self):
+        for name in [name for name in metrics.REGISTRY if name.startswith("test_")]:
+            del metrics.REGISTRY[name]
+
+    def test_prometheus_text_format(self):
+        counter = metrics.Counter("test_events_total", "Events", labels=("kind",))
+        histogram = metrics.Histogram("test_latency_seconds", "Latency", buckets=(0.1, 1.0))
+        counter.inc(kind='a "b"')
+        counter.inc(2, kind='a "b"')
+        histogram.observe(0.05)
+        histogram.observe(0.5)
+        histogram.observe(5)
+
+        text = metrics.render()
+        self.assertIn('# TYPE test_events_total counter\ntest_events_total{kind="a \\"b\\""} 3.0\n', text)
+        self.assertIn(
+            'test_latency_seconds_bucket{le="0.1"} 1.0\n'
+            'test_latency_seconds_bucket{le="1.0"} 2.0\n'
+            'test_latency_seconds_bucket{le="+Inf"} 3.0\n'
+            'test_latency_seconds_sum 5.55\n'
+            'test_latency_seconds_count 3.0\n',
+            text
+        )
+        with self.assertRaises(ValueError):
+            counter.inc(other="label")
+
+    def test_file_store_adds_up_processes(self):
+        """Counters keep the counts of exited processes, gauges only report live ones"""
+        counter = metrics.Counter("test_shared_total", "Shared")
+        gauge = metrics.Gauge("test_depth", "Depth")
+        with tempfile.TemporaryDirectory() as directory:
+            store = metrics.FileStore(directory)
+            # An exited worker's file, pid 2**22 + 1 is above Linux's pid_max
+            os.rename(store.path, os.path.join(directory, f"metrics_{2 ** 22 + 1}.db"))
+            store.inc(counter._key({}), 5)
+            store.set(gauge._key({}), 7)
+            # Grows past the initial file size
+            for index in range(3000):
+                store.inc(counter._key({}, "_filler", (("n", str(index)),)), 1)
+
+            current = metrics.FileStore(directory)
+            current.inc(counter._key({}), 2)
+            current.set(gauge._key({}), 3)
+
+            samples = current.collect()
+            self.assertEqual(len(samples), 2)
+            original, metrics._store = metrics._store, current
+            try:
+                collected = metrics.collect()
+            finally:
+                metrics._store = original
+            self.assertEqual(collected[("test_shared_total", ())], 7)
+            self.assertEqual(collected[("test_depth", ())], 3)
+
+
+class LedgerMetricsTestCase(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="metricsuser", password="testpassword")
+        self.admin = User.objects.create_superuser(username="metricsadmin", password="adminpass")
+        Balance.objects.create(user=self.user, amount=Decimal("10.00"))
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {Token.objects.create(user=self.user).key}")
+
+    def test_ledger_counters(self):
+        deposits = LEDGER_ENTRIES.value(type="deposit", source="api")
+        rejected = REJECTED_WITHDRAWALS.value(reason="insufficient_balance", source="api")
+        recalculations = TOTAL_BALANCE_RECALCULATIONS.value()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse("deposit"), {"amount": "5.00"}, format="json")
+        response = self.client.post(reverse("withdrawal"), {"amount": "500.00"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        TotalBalance.recalculate()
+
+        self.assertEqual(LEDGER_ENTRIES.value(type="deposit", source="api"), deposits + 1)
+        self.assertEqual(REJECTED_WITHDRAWALS.value(reason="insufficient_balance", source="api"), rejected + 1)
+        self.assertEqual(TOTAL_BALANCE_RECALCULATIONS.value(), recalculations + 1)
+
+    def test_metrics_endpoint(self):
+        self.client.get(reverse("balance"))
+        self.assertEqual(self.client.get(reverse("metrics")).status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {Token.objects.create(user=self.admin).key}")
+        response = self.client.get(reverse("metrics"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response["Content-Type"].startswith("text/plain; version=0.0.4"))
+        text = response.content.decode()
+        self.assertIn('tiwiti_http_request_duration_seconds_count{view="BalanceAPIView",method="GET",status="200"}', text)
+        self.assertIn("# TYPE tiwiti_withdrawals_rejected_total counter", text)
@@ -0,0 +1,121 @@
+from datetime import timedelta
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from . import outbox, partitions, reconcile
+from .models import (
+    Deposit,
+    Withdrawal,
+    Balance,
+    TotalBalance,
+    TransactionLog
+)
+from decimal import Decimal
+
+User = get_user_model()
+
+@override_settings(TRANSACTION_LOG_OUTBOX=True, BALANCE_CHECKPOINT_EVERY=None)
+class TransactionLogOutboxTestCase(TransactionTestCase):
+    """
+    Real commits, the entries are queued on commit and written by the flusher
+    thread. The test database is in-memory SQLite where a second connection
+    fails instead of waiting on a lock, so every write is flushed before the next.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="outboxuser", password="testpassword")
+        Balance.objects.create(user=self.user, amount=Decimal("100.00"))
+
+    def tearDown(self):
+        # Nothing may still be in flight when the tables are flushed
+        outbox.flush()
+
+    def test_entries_are_written_behind(self):
+        deposit = Deposit.objects.create(user=self.user, amount=Decimal("10.00"))
+        outbox.flush()
+        withdrawal = Withdrawal.objects.create(user=self.user, amount=Decimal("4.00"))
+        outbox.flush()
+        self.assertEqual(Balance.objects.get(user=self.user).amount, Decimal("106.00"))
+        self.assertEqual(TransactionLog.objects.get(deposit_transaction=deposit).amount, Decimal("10.00"))
+        self.assertEqual(TransactionLog.objects.get(withdrawal_transaction=withdrawal).type, "withdrawal")
+
+    def test_recover_rebuilds_lost_entries(self):
+        """
+        Entries lost with a crashed process come back from the deposit/withdrawal rows, dated when the money moved.
+        """
+        deposit = Deposit.objects.create(user=self.user, amount=Decimal("10.00"))
+        outbox.flush()
+        withdrawal = Withdrawal.objects.create(user=self.user, amount=Decimal("4.00"))
+        outbox.flush()
+        TransactionLog.objects.all().delete()
+        Deposit.objects.filter(pk=deposit.pk).update(created_at=timezone.now() - timedelta(days=2))
+
+        self.assertEqual(outbox.recover(), 2)
+        self.assertEqual(outbox.recover(), 0)
+        log = TransactionLog.objects.get(deposit_transaction=deposit)
+        self.assertEqual(log.updated_at, Deposit.objects.get(pk=deposit.pk).created_at)
+        self.assertTrue(TransactionLog.objects.filter(withdrawal_transaction=withdrawal).exists())
+
+    def test_replayed_entries_are_skipped(self):
+        deposit = Deposit.objects.create(user=self.user, amount=Decimal("10.00"))
+        outbox.flush()
+        outbox.write([{
+            "type": "deposit", "user_id": self.user.pk, "amount": Decimal("10.00"),
+            "deposit_transaction_id": deposit.pk, "status": "successful"
+        }])
+        self.assertEqual(TransactionLog.objects.filter(deposit_transaction=deposit).count(), 1)
+
+    def test_startup_recovery_with_entries_queued(self):
+        """
+        A starting flusher recovers the last hour while entries are still
+        queued, then writes them. recover() dates an entry when the deposit
+        was made and the flush dates it now: on a partitioned Postgres log
+        the unique constraints include updated_at and both would be inserted.
+        """
+        if connection.vendor == "postgresql":
+            self.assertTrue(partitions.is_partitioned(connection))
+        deposit = Deposit.objects.create(user=self.user, amount=Decimal("10.00"))
+        withdrawal = Withdrawal.objects.create(user=self.user, amount=Decimal("4.00"))
+        outbox.flush()
+        queued = list(TransactionLog.objects.values(*[
+            field.attname for field in TransactionLog._meta.concrete_fields if not field.primary_key
+        ]))
+        TransactionLog.objects.all().delete()
+        Deposit.objects.filter(pk=deposit.pk).update(created_at=timezone.now() - timedelta(minutes=30))
+
+        self.assertEqual(outbox.recover(since=timezone.now() - timedelta(hours=1)), 2)
+        with CaptureQueriesContext(connection) as captured:
+            outbox.write(queued)
+        self.assertFalse([query for query in captured.captured_queries if query["sql"].startswith("INSERT")])
+        self.assertEqual(TransactionLog.objects.filter(deposit_transaction=deposit).count(), 1)
+        self.assertEqual(TransactionLog.objects.filter(withdrawal_transaction=withdrawal).count(), 1)
+
+        # And the other way round, a flush that got there first
+        TransactionLog.objects.all().delete()
+        outbox.write(queued)
+        self.assertEqual(outbox.recover(since=timezone.now() - timedelta(hours=1)), 0)
+        self.assertEqual(TransactionLog.objects.count(), 2)
+
+    def test_queued_entries_count_towards_the_totals(self):
+        """
+        The totals move when the money does, an entry still queued for the
+        log is neither drift nor dropped by a recalculation.
+        """
+        Deposit.objects.create(user=self.user, amount=Decimal("10.00"))
+        Withdrawal.objects.create(user=self.user, amount=Decimal("4.00"))
+        outbox.flush()
+        TransactionLog.objects.all().delete()
+
+        self.assertEqual(reconcile.total_mismatches(), {})
+        totals = TotalBalance.recalculate()
+        self.assertEqual(totals.total_deposits, Decimal("10.00"))
+        self.assertEqual(totals.total_withdrawals, Decimal("4.00"))
+        self.assertEqual(totals.displayed_total_balance, Decimal("6.00"))
+
+    @override_settings(LEDGER_MODE="journal")
+    def test_not_with_the_journal_ledger(self):
+        with self.assertRaises(ImproperlyConfigured):
+            outbox.enabled()
@@ -0,0 +1,82 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+from rest_framework import status
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from .models import Deposit
+from decimal import Decimal
+
+User = get_user_model()
+
+class KeysetPaginationTestCase(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="pageuser", password="testpassword")
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+
+        # Distinct amounts so the pages can be told apart, newest deposit has the biggest amount
+        for i in range(1, 26):
+            Deposit.objects.create(user=self.user, amount=Decimal(i))
+
+        self.history_url = reverse("transaction-history")
+
+    def amounts(self, response):
+        return [Decimal(row["amount"]) for row in response.data["results"]]
+
+    def test_page_number_mode_is_still_the_default(self):
+        response = self.client.get(self.history_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["count"], 25)
+        self.assertEqual(len(response.data["results"]), 10)
+
+    def test_cursor_mode_walks_every_row_once(self):
+        """
+        Following the next links returns every row, newest first, with no repeats.
+        """
+        response = self.client.get(self.history_url, {"pagination": "cursor"})
+        self.assertNotIn("count", response.data)
+        self.assertIsNone(response.data["previous"])
+
+        seen = self.amounts(response)
+        while response.data["next"]:
+            response = self.client.get(response.data["next"])
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            seen += self.amounts(response)
+
+        self.assertEqual(seen, [Decimal(i) for i in range(25, 0, -1)])
+
+    def test_previous_link_returns_the_page_before(self):
+        first = self.client.get(self.history_url, {"pagination": "cursor"})
+        second = self.client.get(first.data["next"])
+        back = self.client.get(second.data["previous"])
+
+        self.assertEqual(self.amounts(back), self.amounts(first))
+        self.assertIsNone(back.data["previous"])
+        self.assertEqual(self.client.get(back.data["next"]).data["results"], second.data["results"])
+
+    def test_deep_page_costs_the_same_as_the_first(self):
+        """
+        No COUNT(*) and no OFFSET, a later page runs the same queries as page 1.
+        """
+        with CaptureQueriesContext(connection) as first_page:
+            response = self.client.get(self.history_url, {"pagination": "cursor"})
+        response = self.client.get(response.data["next"])
+
+        with CaptureQueriesContext(connection) as last_page:
+            self.client.get(response.data["next"])
+
+        self.assertEqual(len(first_page), len(last_page))
+        for query in last_page.captured_queries:
+            self.assertNotIn("COUNT(", query["sql"].upper())
+            self.assertNotIn("OFFSET", query["sql"].upper())
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get(self.history_url, {"cursor": "not-a-cursor"})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_deposit_list_supports_cursor_mode(self):
+        response = self.client.get(reverse("deposit"), {"pagination": "cursor"})
+        self.assertEqual(self.amounts(response), [Decimal(i) for i in range(25, 15, -1)])
@@ -0,0 +1,56 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import StringIO
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from . import partitions
+from .models import TransactionLog
+
+User = get_user_model()
+
+
+class TransactionLogPartitionTestCase(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="partitionuser", password="testpassword")
+
+    def log(self, updated_at):
+        entry = TransactionLog.objects.create(type="deposit", user=self.user, amount=Decimal("1.00"), status="successful")
+        TransactionLog.objects.filter(pk=entry.pk).update(updated_at=updated_at)
+        entry.refresh_from_db()
+        return entry
+
+    def test_monthly_partition_names_and_bounds(self):
+        start = datetime(2025, 11, 20, tzinfo=dt_timezone.utc)
+        end = datetime(2026, 2, 1, tzinfo=dt_timezone.utc)
+        self.assertEqual(
+            [partitions.partition_name(month) for month in partitions.months(start, end)],
+            [
+                "transactions_transactionlog_y2025m11",
+                "transactions_transactionlog_y2025m12",
+                "transactions_transactionlog_y2026m01",
+            ]
+        )
+        self.assertEqual(partitions.months_ahead(2, now=start), datetime(2026, 2, 1, tzinfo=dt_timezone.utc))
+
+    def test_between_and_recent_bound_the_log_by_date(self):
+        """between() is start inclusive and end exclusive, recent() starts at the current month"""
+        now = timezone.now()
+        this_month = partitions.month_start(now)
+        old = self.log(this_month - timedelta(days=40))
+        last_month = self.log(this_month - timedelta(seconds=1))
+        current = self.log(now)
+
+        self.assertEqual(list(TransactionLog.objects.recent()), [current])
+        self.assertEqual(set(TransactionLog.objects.recent(months=2)), {last_month, current})
+        self.assertEqual(
+            list(TransactionLog.objects.between(start=old.updated_at, end=this_month).order_by("id")), [old, last_month]
+        )
+        self.assertEqual(list(TransactionLog.objects.between(end=old.updated_at)), [])
+
+    def test_log_partitions_command_without_native_partitioning(self):
+        out = StringIO()
+        call_command("log_partitions", stdout=out)
+        self.assertIn("not partitioned on sqlite", out.getvalue())
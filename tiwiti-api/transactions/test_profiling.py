@@ -0,0 +1,104 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import override_settings
+from rest_framework.test import APITestCase
+from rest_framework import status
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from tiwiti_api import profiling
+from tiwiti_api.testing import QueryBudgetMixin
+from .models import (
+    Deposit,
+    Withdrawal,
+    Balance
+)
+from decimal import Decimal
+
+User = get_user_model()
+
+
+class QueryBudgetTestCase(QueryBudgetMixin, APITestCase):
+    """Cold cache query counts of the ledger endpoints, an N+1 shows up as a blown budget"""
+
+    query_budgets = {
+        # Balance, TotalBalance and UserStats UPDATEs, the row and its log entry
+        "deposit": 8,
+        "withdrawal": 8,
+        "balance": 2,
+        "total-balance": 2,
+        "transaction-history": 3,
+        "personal-usage": 2,
+        "user-stats": 2,
+    }
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="budgetuser", password="testpassword")
+        self.admin = User.objects.create_superuser(username="budgetadmin", password="adminpass")
+        Balance.objects.create(user=self.user, amount=Decimal("1000.00"))
+        for _ in range(15):
+            Deposit.objects.create(user=self.user, amount=Decimal("10.00"))
+            Withdrawal.objects.create(user=self.user, amount=Decimal("1.00"))
+        self.token = Token.objects.create(user=self.user)
+        self.admin_token = Token.objects.create(user=self.admin)
+        cache.clear()
+
+    def request(self, url_name, method="get", data=None, admin=False):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {(self.admin_token if admin else self.token).key}")
+        cache.clear()
+        with self.assertQueryBudget(url_name):
+            response = getattr(self.client, method)(reverse(url_name), data, format="json")
+        self.assertLess(response.status_code, 400, response.content)
+
+    def test_writes(self):
+        self.request("deposit", "post", {"amount": "5.00"})
+        self.request("withdrawal", "post", {"amount": "5.00"})
+
+    def test_reads(self):
+        for name in ("deposit", "withdrawal", "balance", "transaction-history", "user-stats"):
+            self.request(name)
+        self.request("transaction-history", data={"pagination": "cursor"})
+        self.request("total-balance", admin=True)
+        self.request("personal-usage", admin=True)
+
+
+@override_settings(SQL_PROFILING=True)
+class SQLProfilingTestCase(APITestCase):
+
+    def setUp(self):
+        profiling.clear()
+        cache.clear()
+        self.user = User.objects.create_user(username="profileuser", password="testpassword")
+        self.admin = User.objects.create_superuser(username="profileadmin", password="adminpass")
+        for _ in range(3):
+            Deposit.objects.create(user=self.user, amount=Decimal("10.00"))
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {Token.objects.create(user=self.user).key}")
+
+    def test_headers_and_admin_report(self):
+        response = self.client.get(reverse("transaction-history"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["X-DB-Queries"], "3")
+        self.assertEqual(response["X-DB-Duplicate-Queries"], "0")
+        self.assertGreaterEqual(float(response["X-DB-Time-Ms"]), 0)
+
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {Token.objects.create(user=self.admin).key}")
+        report = self.client.get(reverse("sql-profile")).data
+        history = next(entry for entry in report["endpoints"] if entry["url_name"] == "transaction-history")
+        self.assertEqual((history["method"], history["requests"], history["max_queries"]), ("GET", 1, 3))
+
+        self.assertEqual(self.client.delete(reverse("sql-profile")).status_code, status.HTTP_204_NO_CONTENT)
+        # Only the DELETE itself is left
+        self.assertEqual(
+            [(entry["url_name"], entry["method"]) for entry in profiling.report()["endpoints"]], [("sql-profile", "DELETE")]
+        )
+
+    def test_repeated_statements_are_reported(self):
+        """The same statement with different parameters counts as a duplicate"""
+        with profiling.QueryRecorder() as recorder:
+            for deposit in Deposit.objects.all():
+                list(Deposit.objects.filter(id__in=[deposit.id] * deposit.id))
+        [(sql, count)] = recorder.duplicates().items()
+        self.assertEqual(count, 3)
+        self.assertIn("IN (...)", sql)
+
+    def test_report_is_admin_only(self):
+        self.assertEqual(self.client.get(reverse("sql-profile")).status_code, status.HTTP_403_FORBIDDEN)
@@ -0,0 +1,73 @@
+import io
+import json
+import os
+import tempfile
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+from .models import (
+    Deposit,
+    Withdrawal,
+    Balance,
+    TotalBalance
+)
+from decimal import Decimal
+
+User = get_user_model()
+
+class ReconcileLedgerTestCase(TestCase):
+
+    def setUp(self):
+        self.users = [User.objects.create_user(username=f"reconcile{i}", password="testpassword") for i in range(5)]
+        for user in self.users:
+            Deposit.objects.create(user=user, amount=Decimal("50.00"))
+            Withdrawal.objects.create(user=user, amount=Decimal("20.00"))
+        self.checkpoint = os.path.join(tempfile.mkdtemp(), "progress.json")
+
+    def reconcile(self, *args):
+        out = io.StringIO()
+        call_command("reconcile_ledger", "--workers", "0", "--batch-size", "2", "--checkpoint", self.checkpoint, *args, stdout=out)
+        return out.getvalue()
+
+    def test_clean_ledger(self):
+        output = self.reconcile()
+        self.assertIn("5 balances checked, 0 mismatched", output)
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+    def test_reports_and_repairs_drift(self):
+        """
+        A drifted balance, a missing balance row and drifted totals are reported, then repaired.
+        """
+        Balance.objects.filter(user=self.users[1]).update(amount=Decimal("99.00"))
+        Balance.objects.filter(user=self.users[3]).delete()
+        TotalBalance.objects.update(total_deposits=Decimal("0.00"))
+
+        with self.assertRaises(CommandError):
+            self.reconcile()
+
+        output = self.reconcile("--repair")
+        self.assertIn(f"user {self.users[1].pk}: balance 99.00, transaction log 30.00", output)
+        self.assertIn(f"user {self.users[3].pk}: balance None, transaction log 30.00", output)
+        self.assertIn("TotalBalance.total_deposits: 0.00, history 250.00", output)
+        self.assertEqual(Balance.objects.get(user=self.users[1]).amount, Decimal("30.00"))
+        self.assertEqual(Balance.objects.get(user=self.users[3]).amount, Decimal("30.00"))
+        self.assertEqual(TotalBalance.current().total_deposits, Decimal("250.00"))
+
+        self.assertIn("0 mismatched", self.reconcile())
+
+    def test_resume_skips_done_ranges(self):
+        first = self.users[0].pk
+        Balance.objects.filter(user=self.users[0]).update(amount=Decimal("1.00"))
+        with open(self.checkpoint, "w") as f:
+            json.dump({"batch_size": 2, "done": [first], "checked": 2, "mismatches": 0, "repaired": 0}, f)
+
+        output = self.reconcile("--resume")
+        self.assertIn("Resuming, 1 ranges already done", output)
+        self.assertIn("5 balances checked, 0 mismatched", output)
+
+    def test_resume_needs_the_same_batch_size(self):
+        with open(self.checkpoint, "w") as f:
+            json.dump({"batch_size": 1000, "done": [], "checked": 0, "mismatches": 0, "repaired": 0}, f)
+        with self.assertRaises(CommandError):
+            self.reconcile("--resume")
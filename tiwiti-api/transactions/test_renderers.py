@@ -0,0 +1,129 @@
+import io
+import unittest
+import uuid
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase
+from django.urls import reverse
+from django.utils.translation import gettext_lazy
+from rest_framework.exceptions import ErrorDetail, ParseError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from tiwiti_api.parsers import MessagePackParser, ORJSONParser
+from tiwiti_api.renderers import MessagePackRenderer, ORJSONRenderer, encode_default, msgpack
+from .models import Balance, Deposit
+
+User = get_user_model()
+
+
+class ORJSONRendererTestCase(SimpleTestCase):
+    """ORJSONRenderer has to write what DRF's JSONRenderer writes"""
+
+    def assertSameBytes(self, data, accepted_media_type=None):
+        self.assertEqual(
+            ORJSONRenderer().render(data, accepted_media_type),
+            JSONRenderer().render(data, accepted_media_type)
+        )
+
+    def test_same_output_as_drf(self):
+        self.assertSameBytes({
+            "results": [{"id": 1, "amount": "10.00", "user": 2, "status": "successful"}],
+            "next": None,
+            "Message": ErrorDetail("Insufficient funds ₦", code="invalid"),
+            "lazy": gettext_lazy("Not found."),
+            "separators": "  and  ",
+            "updated_at": datetime(2026, 1, 2, 3, 4, 5, 123456, tzinfo=dt_timezone.utc),
+            "lagos": datetime(2026, 1, 2, 3, 4, 5, tzinfo=dt_timezone(timedelta(hours=1))),
+            "naive": datetime(2026, 1, 2, 3, 4, 5),
+            "date": date(2026, 1, 2),
+            "time": time(3, 4, 5),
+            "duration": timedelta(seconds=90),
+            "uuid": uuid.UUID(int=1),
+            "tuple": (1, 2.5, True),
+            7: "int key",
+        })
+        self.assertSameBytes([])
+        self.assertSameBytes({"big": 2 ** 70})
+        self.assertSameBytes({"a": [1]}, "application/json; indent=4")
+        self.assertEqual(ORJSONRenderer().render(None), b"")
+
+    def test_non_finite_floats_render_as_null(self):
+        """DRF's strict encoder raises on them, orjson still writes valid JSON"""
+        self.assertEqual(ORJSONRenderer().render({"ratio": float("nan")}), b'{"ratio":null}')
+
+    def test_decimals_are_exact_strings(self):
+        rendered = ORJSONRenderer().render({
+            "amount": Decimal("0.10"),
+            "large": Decimal("12345678901234567890.12"),
+            "exponent": Decimal("1E+2"),
+            "negative": Decimal("-0.01"),
+        })
+        self.assertEqual(
+            rendered, b'{"amount":"0.10","large":"12345678901234567890.12","exponent":"100","negative":"-0.01"}'
+        )
+
+    def test_raw_decimals_differ_from_drf(self):
+        """The one deliberate difference, DRF writes a raw Decimal as a float and loses the cents"""
+        data = {"amount": Decimal("1.10")}
+        self.assertEqual(ORJSONRenderer().render(data), b'{"amount":"1.10"}')
+        self.assertEqual(JSONRenderer().render(data), b'{"amount":1.1}')
+        self.assertEqual(encode_default(Decimal("1.10")), "1.10")
+
+
+class ORJSONParserTestCase(SimpleTestCase):
+    def test_parse(self):
+        data = ORJSONParser().parse(io.BytesIO('{"amount": 10.5, "note": "₦"}'.encode()))
+        self.assertEqual(data, {"amount": 10.5, "note": "₦"})
+
+    def test_invalid_json(self):
+        for body in (b"{", b'{"amount": NaN}', b"\xff"):
+            with self.assertRaises(ParseError):
+                ORJSONParser().parse(io.BytesIO(body))
+
+    def test_other_encodings_use_the_stdlib(self):
+        body = '{"note": "é"}'.encode("latin-1")
+        self.assertEqual(ORJSONParser().parse(io.BytesIO(body), parser_context={"encoding": "latin-1"}), {"note": "é"})
+
+
+class JSONEndpointTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="renderuser", password="testpassword")
+        Balance.objects.create(user=self.user, amount=Decimal("0.00"))
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {Token.objects.create(user=self.user).key}")
+
+    def test_json_round_trip(self):
+        response = self.client.post(reverse("deposit"), '{"amount": "25.50"}', content_type="application/json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response["Content-Type"], "application/json")
+        self.assertEqual(self.client.get(reverse("balance")).json()["amount"], "25.50")
+
+    def test_malformed_json(self):
+        response = self.client.post(reverse("deposit"), '{"amount": ', content_type="application/json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("JSON parse error", response.json()["detail"])
+
+
+@unittest.skipIf(msgpack is None, "msgpack is not installed")
+class MessagePackTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="msgpackuser", password="testpassword")
+        Balance.objects.create(user=self.user, amount=Decimal("0.00"))
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {Token.objects.create(user=self.user).key}")
+
+    def test_round_trip(self):
+        data = {"amount": Decimal("10.00"), "at": datetime(2026, 1, 2, tzinfo=dt_timezone.utc), "items": [1, "a"]}
+        parsed = MessagePackParser().parse(io.BytesIO(MessagePackRenderer().render(data)))
+        self.assertEqual(parsed, {"amount": "10.00", "at": "2026-01-02T00:00:00Z", "items": [1, "a"]})
+
+    def test_selected_by_accept_header(self):
+        response = self.client.post(
+            reverse("deposit"), msgpack.packb({"amount": "12.00"}),
+            content_type="application/msgpack", HTTP_ACCEPT="application/msgpack"
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response["Content-Type"], "application/msgpack")
+        self.assertEqual(msgpack.unpackb(response.content)["amount"], "12.00")
+        self.assertEqual(Deposit.objects.get(user=self.user).amount, Decimal("12.00"))
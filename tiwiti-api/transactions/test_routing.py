@@ -0,0 +1,181 @@
+import os
+import tempfile
+from io import StringIO
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase, APITransactionTestCase
+from rest_framework import status
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from tiwiti_api.database import sqlite
+from tiwiti_api.routers import ReadYourWritesMiddleware, ReplicaRouter, is_pinned, set_user, use_primary
+from .models import (
+    Deposit,
+    Balance
+)
+from decimal import Decimal
+
+User = get_user_model()
+
+
+@override_settings(DATABASE_REPLICAS=["replica"])
+class ReplicaRouterTestCase(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.router = ReplicaRouter()
+        self.factory = RequestFactory()
+
+    def route(self, method, user_id=None, write=False):
+        """Where a Balance read goes at the end of a request, as seen from inside it"""
+        seen = []
+
+        def view(request):
+            if user_id is not None:
+                set_user(user_id)
+            if write:
+                self.router.db_for_write(Deposit)
+            seen.append(self.router.db_for_read(Balance))
+            return HttpResponse()
+
+        ReadYourWritesMiddleware(view)(getattr(self.factory, method)("/"))
+        return seen[0]
+
+    def test_reads_go_to_the_replica_and_writes_to_the_primary(self):
+        self.assertEqual(self.router.db_for_read(Balance), "replica")
+        self.assertEqual(self.router.db_for_write(Balance), "default")
+        self.assertEqual(self.router.db_for_read(Token), "default")
+        with use_primary():
+            self.assertEqual(self.router.db_for_read(Balance), "default")
+
+    def test_no_replicas_configured(self):
+        with override_settings(DATABASE_REPLICAS=[]):
+            self.assertEqual(self.router.db_for_read(Balance), "default")
+
+    def test_writer_reads_from_the_primary_afterwards(self):
+        """
+        A request that isn't a safe method reads from the primary, and a
+        user who wrote keeps doing so on the next requests.
+        """
+        self.assertEqual(self.route("get", user_id=1), "replica")
+        self.assertEqual(self.route("post", user_id=1, write=True), "default")
+        self.assertTrue(is_pinned(1))
+        self.assertEqual(self.route("get", user_id=1), "default")
+        self.assertEqual(self.route("get", user_id=2), "replica")
+
+    def test_reads_without_a_write_do_not_pin(self):
+        self.route("post", user_id=1)
+        self.route("get", user_id=1)
+        self.assertFalse(is_pinned(1))
+
+
+class ReadYourWritesTestCase(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="routinguser", password="testpassword")
+        Balance.objects.create(user=self.user, amount=Decimal("100.00"))
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {Token.objects.create(user=self.user).key}")
+
+    def test_deposit_pins_the_user_to_the_primary(self):
+        with override_settings(DATABASE_REPLICAS=["replica"]):
+            self.assertEqual(self.client.get(reverse("balance")).status_code, status.HTTP_200_OK)
+            self.assertFalse(is_pinned(self.user.pk))
+
+            response = self.client.post(reverse("deposit"), {"amount": "10.00"}, format="json")
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            self.assertTrue(is_pinned(self.user.pk))
+
+
+@override_settings(DATABASE_REPLICAS=["replica"])
+class ReplicaRoutingTestCase(APITransactionTestCase):
+    """
+    Routing against a real second database: the replica is a SQLite file
+    that sync_replica fills with a copy of the test database, and that
+    lags behind it like a replica until the next sync.
+    """
+    # Resolved when the class is set up, by then "replica" is a connection
+    databases = "__all__"
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        config = sqlite(os.path.join(cls.directory.name, "replica.sqlite3"), tuned=False)
+        # connections.settings is settings.DATABASES, sync_replica finds the file there too
+        connections.settings["replica"] = connections.configure_settings({
+            DEFAULT_DB_ALIAS: dict(connections.settings[DEFAULT_DB_ALIAS]), "replica": config
+        })["replica"]
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections["replica"].close()
+        del connections["replica"]
+        del connections.settings["replica"]
+        cls.directory.cleanup()
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="replicauser", password="testpassword")
+        Balance.objects.create(user=self.user, amount=Decimal("0.00"))
+        Deposit.objects.create(user=self.user, amount=Decimal("100.00"))
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {Token.objects.create(user=self.user).key}")
+        self.sync()
+
+    def sync(self):
+        call_command("sync_replica", stdout=StringIO())
+
+    def get(self, name):
+        """GET the endpoint, returns the response and the tables each alias was read from"""
+        with CaptureQueriesContext(connections["default"]) as primary, CaptureQueriesContext(connections["replica"]) as replica:
+            response = self.client.get(reverse(name))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        tables = lambda captured: {
+            table for query in captured.captured_queries
+            for table in ("transactions_deposit", "transactions_balance", "transactions_transactionlog")
+            if table in query["sql"]
+        }
+        return response, tables(primary), tables(replica)
+
+    def test_reads_go_to_the_replica(self):
+        response, primary, replica = self.get("deposit")
+        self.assertEqual(replica, {"transactions_deposit"})
+        self.assertEqual(primary, set())
+        self.assertEqual(len(response.data["results"]), 1)
+
+    def test_replica_lags_until_synced(self):
+        Deposit.objects.create(user=self.user, amount=Decimal("5.00"))
+        self.assertEqual(len(self.get("deposit")[0].data["results"]), 1)
+        self.sync()
+        self.assertEqual(len(self.get("deposit")[0].data["results"]), 2)
+
+    def test_writer_reads_the_primary(self):
+        response = self.client.post(reverse("deposit"), {"amount": "5.00"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        response, primary, replica = self.get("deposit")
+        self.assertEqual((primary, replica), ({"transactions_deposit"}, set()))
+        self.assertEqual(len(response.data["results"]), 2)
+
+    def test_cache_and_etag_fills_read_the_primary(self):
+        """
+        Someone else's write (an admin, a repair) doesn't pin the user, but it
+        bumps their ledger version. Whatever gets cached or tagged under the
+        new version has to come from the primary, not the lagging replica.
+        """
+        self.assertEqual(self.client.get(reverse("balance")).data["amount"], "100.00")
+        etag = self.client.get(reverse("transaction-history"))["ETag"]
+        Deposit.objects.create(user=self.user, amount=Decimal("5.00"))
+
+        response, primary, replica = self.get("balance")
+        self.assertEqual(response.data["amount"], "105.00")
+        self.assertEqual((primary, replica), ({"transactions_balance"}, set()))
+
+        response = self.client.get(reverse("transaction-history"), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["count"], 2)
@@ -0,0 +1,107 @@
+import io
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from rest_framework.test import APITestCase
+from rest_framework import status
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from .bulk import ingest_operations
+from .models import (
+    Deposit,
+    Withdrawal,
+    Balance,
+    UserStats
+)
+from decimal import Decimal
+
+User = get_user_model()
+
+
+class UserStatsTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="statsuser", password="testpassword")
+        self.admin = User.objects.create_superuser(username="statsadmin", password="adminpass")
+        Balance.objects.create(user=self.user, amount=Decimal("0.00"))
+        self.login(self.user)
+
+    def login(self, user):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {Token.objects.get_or_create(user=user)[0].key}")
+
+    def expected(self, user):
+        """The figures aggregated from the history, what the stats row has to match"""
+        events = list(Deposit.objects.filter(user=user)) + list(Withdrawal.objects.filter(user=user))
+        return {
+            "total_deposits": sum((d.amount for d in Deposit.objects.filter(user=user)), Decimal("0.00")),
+            "total_withdrawals": sum((w.amount for w in Withdrawal.objects.filter(user=user)), Decimal("0.00")),
+            "transaction_count": len(events),
+            "largest_transaction": max(event.amount for event in events),
+            "first_activity": min(event.created_at for event in events),
+            "last_activity": max(event.created_at for event in events),
+        }
+
+    def stats(self, user):
+        row = UserStats.objects.get(pk=user.pk)
+        return {field: getattr(row, field) for field in UserStats.STAT_FIELDS}
+
+    def test_updated_with_every_ledger_event(self):
+        Deposit.objects.create(user=self.user, amount=Decimal("100.00"))
+        Deposit.objects.create(user=self.user, amount=Decimal("20.50"))
+        Withdrawal.objects.create(user=self.user, amount=Decimal("70.25"))
+        self.assertEqual(self.stats(self.user), self.expected(self.user))
+
+    def test_rejected_withdrawals_are_not_counted(self):
+        Deposit.objects.create(user=self.user, amount=Decimal("10.00"))
+        response = self.client.post(reverse("withdrawal"), {"amount": "50.00"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(UserStats.objects.get(pk=self.user.pk).transaction_count, 1)
+
+    def test_bulk_ingestion(self):
+        Deposit.objects.create(user=self.user, amount=Decimal("5.00"))
+        ingest_operations([
+            {"user": self.user.pk, "type": "deposit", "amount": "300.00"},
+            {"user": self.user.pk, "type": "withdrawal", "amount": "12.00"},
+            {"user": self.user.pk, "type": "withdrawal", "amount": "9999.00"},
+        ])
+        self.assertEqual(self.stats(self.user), self.expected(self.user))
+
+    def test_endpoint(self):
+        response = self.client.get(reverse("user-stats"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["transaction_count"], 0)
+        self.assertIsNone(response.data["first_activity"])
+
+        Deposit.objects.create(user=self.user, amount=Decimal("40.00"))
+        Withdrawal.objects.create(user=self.user, amount=Decimal("15.00"))
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("user-stats"))
+        self.assertEqual(response.data["total_deposits"], "40.00")
+        self.assertEqual(response.data["total_withdrawals"], "15.00")
+        self.assertEqual(response.data["largest_transaction"], "40.00")
+        self.assertEqual(response.data["transaction_count"], 2)
+        self.assertEqual(self.client.get(reverse("user-stats"), HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 304)
+
+    def test_admins_read_any_user(self):
+        Deposit.objects.create(user=self.user, amount=Decimal("40.00"))
+        self.assertEqual(self.client.get(reverse("user-stats"), {"user": self.admin.pk}).status_code, status.HTTP_403_FORBIDDEN)
+        self.login(self.admin)
+        response = self.client.get(reverse("user-stats"), {"user": self.user.pk})
+        self.assertEqual(response.data["user"], self.user.pk)
+        self.assertEqual(response.data["total_deposits"], "40.00")
+
+    def test_rebuild(self):
+        other = User.objects.create_user(username="statsother", password="testpassword")
+        Balance.objects.create(user=other, amount=Decimal("0.00"))
+        for amount in ("10.00", "250.00", "3.00"):
+            Deposit.objects.create(user=self.user, amount=Decimal(amount))
+            Deposit.objects.create(user=other, amount=Decimal(amount))
+        Withdrawal.objects.create(user=self.user, amount=Decimal("7.00"))
+
+        # Drifted, missing and orphaned rows
+        UserStats.objects.filter(pk=self.user.pk).update(total_deposits=Decimal("1.00"), transaction_count=99)
+        UserStats.objects.filter(pk=other.pk).delete()
+        UserStats.objects.create(user=self.admin, transaction_count=5)
+
+        call_command("rebuild_user_stats", batch_size=1, stdout=io.StringIO())
+        self.assertEqual(self.stats(self.user), self.expected(self.user))
+        self.assertEqual(self.stats(other), self.expected(other))
+        self.assertFalse(UserStats.objects.filter(pk=self.admin.pk).exists())
@@ -165,6 +165,31 @@ class TransactionAPITestCase(APITestCase):
         response = self.client.get(self.total_balance_url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
+    def test_total_balance_sums_user_activity(self):
+        """
+        Test that the total balance reflects deposits and withdrawals from every user.
+        """
+        other = User.objects.create_user(username="otheruser", password="otherpass")
+        Deposit.objects.create(user=self.user, amount=Decimal("40.00"))
+        Deposit.objects.create(user=other, amount=Decimal("60.00"))
+        Withdrawal.objects.create(user=other, amount=Decimal("25.00"))
+
+        self.authenticate_admin()
+        response = self.client.get(self.total_balance_url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(response.data), {
+            "total_deposits",
+            "total_withdrawals",
+            "displayed_total_balance",
+            "personal_usage",
+            "admin_total_balance",
+            "updated_at"
+        })
+        self.assertEqual(response.data["total_deposits"], "100.00")
+        self.assertEqual(response.data["total_withdrawals"], "25.00")
+        self.assertEqual(response.data["displayed_total_balance"], "75.00")
+
     def test_admin_can_view_personal_usage(self):
         """
         Test that only an admin can access the personal usage API.
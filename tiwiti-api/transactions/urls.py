@@ -3,10 +3,14 @@ from .views import (
     DepositAPIView,
     WithdrawalAPIView,
     BalanceAPIView,
+    BalanceAsOfAPIView,
+    UserStatsAPIView,
     TotalBalanceAPIView,
     PersonalUsageAPIView,
-    TransactionLogAPIView
-    
+    TransactionLogAPIView,
+    TransactionExportAPIView,
+    TransactionExportAdminAPIView,
+    BulkTransactionAPIView
 )
 
 
@@ -14,7 +18,12 @@ urlpatterns = [
     path("deposit/", DepositAPIView.as_view(), name="deposit"),
     path("withdraw/", WithdrawalAPIView.as_view(), name="withdrawal"),
     path("balance/", BalanceAPIView.as_view(), name="balance"),
+    path("balance/as-of/", BalanceAsOfAPIView.as_view(), name="balance-as-of"),
+    path("stats/", UserStatsAPIView.as_view(), name="user-stats"),
     path("total/", TotalBalanceAPIView.as_view(), name="total-balance"),
     path("personal/", PersonalUsageAPIView.as_view(), name="personal-usage"),
     path("transactions/", TransactionLogAPIView.as_view(), name="transaction-history"),
+    path("transactions/export/", TransactionExportAPIView.as_view(), name="transaction-export"),
+    path("transactions/export/all/", TransactionExportAdminAPIView.as_view(), name="transaction-export-all"),
+    path("bulk/", BulkTransactionAPIView.as_view(), name="bulk-transactions"),
 ]
\ No newline at end of file
@@ -1,108 +1,382 @@
-from rest_framework import generics, pagination
+from datetime import datetime, time, timedelta
+from decimal import Decimal, InvalidOperation
+from rest_framework import generics, status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from django.http import Http404, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 from .serializers import (
     DepositSerializer,
     WithdrawalSerializer,
     BalanceSerializer,
+    BalanceAsOfSerializer,
     TotalBalanceSerializer,
     PersonalUsageSerializer,
-    TransactionLogSerializer
+    TransactionLogSerializer,
+    UserStatsSerializer
 )
 from .models import (
     Deposit,
     Withdrawal,
     Balance,
+    BalanceSnapshot,
     TotalBalance,
     PersonalUsage,
-    TransactionLog 
+    TransactionLog,
+    UserStats,
+    InsufficientFundsError,
+    balance_ledger
 )
+from .bulk import ingest_operations, read_operations
+from .cache import TOTALS, cached_balance
+from .etags import LedgerETagMixin
+from .export import CSVExportRenderer, NDJSONExportRenderer, export_chunks
+from .fast_serializers import FastListMixin
+from .idempotency import IdempotencyMixin
+from .pagination import LedgerPagination
 from rest_framework import permissions
-from rest_framework.exceptions import ValidationError
+from rest_framework.exceptions import APIException, PermissionDenied, ValidationError
+from django.conf import settings
 
 # Authenticated Users can make deposits
-class DepositAPIView(generics.ListCreateAPIView):
+class DepositAPIView(IdempotencyMixin, FastListMixin, generics.ListCreateAPIView):
     """Users can make deposits"""
     serializer_class = DepositSerializer
     permission_classes = [permissions.IsAuthenticated]
-    pagination_class = pagination.PageNumberPagination
+    pagination_class = LedgerPagination
+    keyset_ordering = ("-created_at", "-id")
 
     # Ensure authenticated users can only get his/her own info/make deposit to his or her account
     def get_queryset(self):
-        return Deposit.objects.select_related("user").filter(user=self.request.user)
+        return Deposit.objects.filter(user=self.request.user).order_by("-created_at", "-id")
     
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
 # Authenticated Users can make withdrawals
-class WithdrawalAPIView(generics.ListCreateAPIView):
+class WithdrawalAPIView(IdempotencyMixin, FastListMixin, generics.ListCreateAPIView):
     """Users can place withdrawals"""
     serializer_class = WithdrawalSerializer
     permission_classes = [permissions.IsAuthenticated]
-    pagination_class = pagination.PageNumberPagination
+    pagination_class = LedgerPagination
+    keyset_ordering = ("-created_at", "-id")
 
     # Ensure authenticated users can only get his/her own info/make withdrawal from his or her account
     def get_queryset(self):
-        return Withdrawal.objects.select_related("user").filter(user=self.request.user)
+        return Withdrawal.objects.filter(user=self.request.user).order_by("-created_at", "-id")
     
+    # The balance check happens inside the conditional debit, no separate read needed
     def perform_create(self, serializer):
-        user = self.request.user
-        amount = serializer.validated_data.get("amount")
-
         try:
-            user_balance = Balance.objects.get(user=user)
+            serializer.save(user=self.request.user)
+        except InsufficientFundsError as e:
+            raise ValidationError({"Message": str(e)})
 
-        except Balance.DoesNotExist:
-            raise ValidationError({"Message": "No Balance Record found for this user"})
+    
 
-        if amount > user_balance.amount:
-            raise ValidationError({"Message": "Insufficient Balance"})
+def parse_moment(value, param="as_of", end_of_day=True):
+    """An ISO 8601 datetime, or a date meaning the end (or the start) of that day"""
+    try:
+        day = parse_date(value)
+        if day and end_of_day:
+            day += timedelta(days=1)
+        moment = datetime.combine(day, time.min) if day else parse_datetime(value)
+        if moment is None:
+            raise ValueError
+    except ValueError:
+        raise ValidationError({"Message": f"{param} must be an ISO 8601 date or datetime"})
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
 
-        serializer.save(user=user)
-
-    
 
 # Authenticated Users can see their balance:
-class BalanceAPIView(generics.RetrieveAPIView):
-    """Authenticated Users can view their balance"""
-    queryset = Balance.objects.select_related("user").all()
+class BalanceAPIView(LedgerETagMixin, generics.RetrieveAPIView):
+    """
+    Authenticated Users can view their balance, served from the balance
+    cache. Polling clients send the ETag back in If-None-Match.
+    """
+    queryset = Balance.objects.all()
     serializer_class = BalanceSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+    def etag_owner(self, request):
+        # A past balance is computed from the history, no ETag for those
+        if "as_of" in request.query_params:
+            return None
+        return request.user.pk
     
-    # Display the most recent balance(a single instance)
+    # Display the most recent balance(a single instance), the Balance row or the journal's snapshot + tail
     def get_object(self):
-        return self.queryset.get(user=self.request.user)
-        
+        try:
+            return balance_ledger().current(self.request.user)
+        except Balance.DoesNotExist:
+            raise Http404("No Balance matches the given query.")
+
+    def retrieve(self, request, *args, **kwargs):
+        # ?as_of=<timestamp> answers with the balance at that point in time instead
+        if "as_of" in request.query_params:
+            moment = parse_moment(request.query_params["as_of"])
+            try:
+                amount = BalanceSnapshot.objects.balance_at(request.user.pk, moment)
+            except Balance.DoesNotExist:
+                raise Http404("No Balance matches the given query.")
+            return Response(BalanceAsOfSerializer({"user": request.user.pk, "amount": amount, "as_of": moment}).data)
+
+        data = cached_balance(request.user.pk, lambda: dict(self.get_serializer(self.get_object()).data))
+        return Response(data)
+
+
+# Lifetime figures for dashboards
+class UserStatsAPIView(LedgerETagMixin, generics.RetrieveAPIView):
+    """
+    The user's lifetime deposits, withdrawals, transaction count, first
+    and last activity and largest transaction, one primary key lookup.
+    Admins can read anyone's with ?user=<id>.
+    """
+    serializer_class = UserStatsSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def etag_owner(self, request):
+        user = request.query_params.get("user")
+        if not user:
+            return request.user.pk
+        if not request.user.is_staff:
+            raise PermissionDenied("Only admins can read other users' stats")
+        if not user.isdigit():
+            raise ValidationError({"Message": "user must be a user id"})
+        return int(user)
+
+    def get_object(self):
+        user_id = self.etag_owner(self.request)
+        # No ledger events yet, all zeros
+        return UserStats.objects.filter(pk=user_id).first() or UserStats(user_id=user_id)
+
 
 """Admin-View of Balances"""
+# Balances of many users at one point in time
+class BalanceAsOfAPIView(generics.ListAPIView):
+    """
+    Admin only, ?as_of=<timestamp>&users=1,2,3 lists the balance of each
+    user at that time, null for a user without a balance
+    """
+    serializer_class = BalanceAsOfSerializer
+    permission_classes = [permissions.IsAdminUser, permissions.IsAuthenticated]
+    pagination_class = None
+    max_users = 500
+
+    def get_queryset(self):
+        params = self.request.query_params
+        if "as_of" not in params or not params.get("users"):
+            raise ValidationError({"Message": "as_of and users are required"})
+        moment = parse_moment(params["as_of"])
+        try:
+            user_ids = list(dict.fromkeys(int(user_id) for user_id in params["users"].split(",")))
+        except ValueError:
+            raise ValidationError({"Message": "users must be a comma separated list of user ids"})
+        if len(user_ids) > self.max_users:
+            raise ValidationError({"Message": f"At most {self.max_users} users per request"})
+
+        balances = []
+        for user_id in user_ids:
+            try:
+                amount = BalanceSnapshot.objects.balance_at(user_id, moment)
+            except Balance.DoesNotExist:
+                amount = None
+            balances.append({"user": user_id, "amount": amount, "as_of": moment})
+        return balances
+
+
+class RequestTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_code = "request_too_large"
+
+
+# Bulk ingestion of settlement files
+class BulkTransactionAPIView(IdempotencyMixin, APIView):
+    """
+    Admin-only batch endpoint for deposits and withdrawals.
+    Takes a JSON list of {"user", "type", "amount"} operations (optionally
+    wrapped as {"operations": [...]}) or an uploaded csv/json/ndjson `file`,
+    and reports success or failure per item. A JSON body is read into memory
+    and capped at DATA_UPLOAD_MAX_MEMORY_SIZE, larger batches go as a file.
+    """
+    permission_classes = [permissions.IsAdminUser, permissions.IsAuthenticated]
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        # Django would refuse the body with an HTML 400 the first time it's read, answer in JSON instead
+        limit = settings.DATA_UPLOAD_MAX_MEMORY_SIZE
+        if (
+            limit is not None
+            and not request.content_type.startswith("multipart/form-data")
+            and int(request.META.get("CONTENT_LENGTH") or 0) > limit
+        ):
+            raise RequestTooLarge({
+                "Message": f"A JSON batch can be at most {limit} bytes, upload larger ones as a multipart `file` (csv, json or ndjson)"
+            })
+
+    def post(self, request):
+        upload = request.FILES.get("file")
+        if upload:
+            format = request.data.get("format") or upload.name.rsplit(".", 1)[-1].lower()
+            try:
+                operations = read_operations(upload, format)
+            except ValueError as e:
+                raise ValidationError({"Message": str(e)})
+        else:
+            operations = request.data
+            if isinstance(operations, dict):
+                operations = operations.get("operations")
+
+        if not isinstance(operations, list):
+            raise ValidationError({"Message": "Expected a list of operations"})
+
+        results = ingest_operations(operations)
+        successful = sum(1 for result in results if result["status"] == "successful")
+        return Response(
+            {"successful": successful, "failed": len(results) - successful, "results": results},
+            status=status.HTTP_200_OK
+        )
+
+
 # Total Balance
-class TotalBalanceAPIView(generics.RetrieveAPIView):
+class TotalBalanceAPIView(LedgerETagMixin, generics.RetrieveAPIView):
     """Admin view of the all user balance"""
     queryset = TotalBalance.objects.all()
     serializer_class = TotalBalanceSerializer
     permission_classes = [permissions.IsAdminUser, permissions.IsAuthenticated]
 
-    # Display the most recent balance(a single instance)
+    def etag_owner(self, request):
+        return TOTALS
+
+    # Display the totals summed over every shard (a single instance)
     def get_object(self):
-        return TotalBalance.objects.order_by("-updated_at").first() or TotalBalance()
+        return TotalBalance.current()
 
-class PersonalUsageAPIView(generics.ListCreateAPIView):
-    queryset = PersonalUsage.objects.order_by("-updated_at").all()
+class PersonalUsageAPIView(IdempotencyMixin, FastListMixin, generics.ListCreateAPIView):
+    queryset = PersonalUsage.objects.order_by("-updated_at", "-id")
     serializer_class = PersonalUsageSerializer
     permission_classes = [permissions.IsAdminUser, permissions.IsAuthenticated]
-    pagination_class = pagination.PageNumberPagination
+    pagination_class = LedgerPagination
+    keyset_ordering = ("-updated_at", "-id")
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
 
-class TransactionLogAPIView(generics.ListAPIView):
+class TransactionLogAPIView(LedgerETagMixin, FastListMixin, generics.ListAPIView):
+    """
+    The user's transaction history, newest first. Filters: ?type=,
+    ?status=, ?start= / ?end= (dates or datetimes, end exclusive),
+    ?min_amount= / ?max_amount= (inclusive) and ?ordering= (one of
+    `orderings`). Every combination is index backed, explain_endpoints
+    checks them.
+    """
     serializer_class = TransactionLogSerializer
     permission_classes = [permissions.IsAuthenticated]
-    pagination_class = pagination.PageNumberPagination
+    pagination_class = LedgerPagination
+    orderings = {
+        "-updated_at": ("-updated_at", "-id"),
+        "updated_at": ("updated_at", "id"),
+        "-amount": ("-amount", "-id"),
+        "amount": ("amount", "id"),
+    }
+
+    @property
+    def keyset_ordering(self):
+        ordering = self.request.query_params.get("ordering", "-updated_at")
+        if ordering not in self.orderings:
+            raise ValidationError({"Message": f"ordering must be one of {', '.join(self.orderings)}"})
+        return self.orderings[ordering]
+
+    def choice(self, param, choices):
+        value = self.request.query_params.get(param)
+        if value and value not in dict(choices):
+            raise ValidationError({"Message": f"{param} must be one of {', '.join(dict(choices))}"})
+        return value
+
+    def amount(self, param):
+        value = self.request.query_params.get(param)
+        if not value:
+            return None
+        try:
+            amount = Decimal(value)
+            if not amount.is_finite():
+                raise ValueError
+            return amount.quantize(Decimal("0.01"))
+        except (InvalidOperation, ValueError):
+            raise ValidationError({"Message": f"{param} must be an amount"})
+
+    def filter_queryset(self, queryset):
+        params = self.request.query_params
+        entry_type = self.choice("type", TransactionLog.TRANSACTION_TYPE)
+        entry_status = self.choice("status", TransactionLog.STATUS_TYPE)
+        if entry_type:
+            queryset = queryset.filter(type=entry_type)
+        if entry_status:
+            queryset = queryset.filter(status=entry_status)
+        queryset = queryset.between(
+            start=parse_moment(params["start"], "start", end_of_day=False) if params.get("start") else None,
+            end=parse_moment(params["end"], "end") if params.get("end") else None,
+        ).amount_between(self.amount("min_amount"), self.amount("max_amount"))
+        return queryset.order_by(*self.keyset_ordering)
+
+    # Only the first page is polled, the others go without an ETag
+    def etag_owner(self, request):
+        params = request.query_params
+        if params.get(self.paginator.keyset_class.cursor_query_param) or params.get(self.paginator.page_query_param, "1") != "1":
+            return None
+        return request.user.pk
 
     # Ensure authenticated users can only get his/her own transaction info from his or her account
     def get_queryset(self):
-        return TransactionLog.objects.select_related("user").prefetch_related("deposit_transaction", "withdrawal_transaction").filter(user=self.request.user)
+        # The serializer only outputs the deposit/withdrawal ids, no need to load them
+        return TransactionLog.objects.filter(user=self.request.user).order_by("-updated_at", "-id")
     
     # def get_object(self):
-    #     return self.request.user
\ No newline at end of file
+    #     return self.request.user
+
+# Full statements, streamed instead of paged
+class TransactionExportAPIView(APIView):
+    """
+    Stream the user's whole transaction history as csv (default) or
+    ndjson (?format=ndjson), oldest first. Optional ?start= and ?end=
+    (dates or datetimes, end exclusive) limit it to a date range.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    renderer_classes = [CSVExportRenderer, NDJSONExportRenderer]
+
+    def get_queryset(self):
+        return TransactionLog.objects.filter(user=self.request.user)
+
+    def filter_queryset(self, queryset):
+        params = self.request.query_params
+        return queryset.between(
+            start=parse_moment(params["start"], "start", end_of_day=False) if params.get("start") else None,
+            end=parse_moment(params["end"], "end") if params.get("end") else None,
+        )
+
+    def get(self, request, *args, **kwargs):
+        renderer = request.accepted_renderer
+        response = StreamingHttpResponse(
+            export_chunks(self.filter_queryset(self.get_queryset()), renderer.format),
+            content_type=f"{renderer.media_type}; charset=utf-8"
+        )
+        response["Content-Disposition"] = f'attachment; filename="transactions.{renderer.format}"'
+        return response
+
+
+class TransactionExportAdminAPIView(TransactionExportAPIView):
+    """Admin export of every user's transactions, or one user's with ?user=<id>"""
+    permission_classes = [permissions.IsAdminUser, permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        queryset = TransactionLog.objects.all()
+        user = self.request.query_params.get("user")
+        if user:
+            if not user.isdigit():
+                raise ValidationError({"Message": "user must be a user id"})
+            queryset = queryset.filter(user_id=int(user))
+        return queryset
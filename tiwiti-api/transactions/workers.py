@@ -0,0 +1,12 @@
+"""
+Process pool initializer. Kept free of model imports, a spawned worker
+unpickles it before Django is set up.
+"""
+import django
+from django.conf import settings
+
+
+def init_worker(databases):
+    """Workers use the parent's DATABASES (a benchmark's throwaway database included)"""
+    settings.DATABASES = databases
+    django.setup()